@@ -0,0 +1,69 @@
+import os
+import secrets
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import FileResponse
+from typing import Annotated, Optional
+from app.schemas import ProfileRequest
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.central_inference import central_client
+from app.services.executor import inference_executor
+from app.services.model_registry import model_registry
+from app.services.inference_engine import acquire_backend, release_backend
+from app.services.profiler import profiling_service, ProfilerBusy
+import structlog
+
+logger = structlog.get_logger()
+
+async def verify_admin_token(x_admin_token: Annotated[Optional[str], Header()] = None):
+    """Admin routes are hidden unless ADMIN_TOKEN is configured."""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing admin token")
+
+router = APIRouter(dependencies=[Depends(verify_admin_token)], include_in_schema=False)
+
+@router.post("/profile")
+async def profile(request: ProfileRequest):
+    """
+    Profile the worker process that serves this request: sample Python
+    stacks (collapsed format, for flamegraphs) and optionally capture ONNX
+    Runtime per-operator timings. Blocks for the profiling duration.
+    """
+    if request.onnx_versions and central_client.enabled:
+        # Models run in the central inference process, not in this worker
+        raise HTTPException(status_code=409, detail="ONNX profiling is unavailable with CENTRAL_INFERENCE")
+    if inference_executor.kind == "process":
+        # Models run in the executor's worker processes, which neither profiler can see
+        raise HTTPException(status_code=409, detail="Profiling is unavailable with INFERENCE_EXECUTOR=process")
+    try:
+        return await profiling_service.profile(
+            request.seconds, request.interval_ms, request.onnx_versions, acquire_backend, release_backend,
+            idle=request.idle
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/profile/artifacts/{name}")
+async def profile_artifact(name: str):
+    """Download a collapsed-stack or ONNX profile written by /profile"""
+    path = os.path.join(settings.PROFILE_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return FileResponse(path)
+
+@router.post("/cache/{model_version}/invalidate")
+async def invalidate_cache(model_version: str):
+    """
+    Stop serving every cached prediction of a version, e.g. after replacing
+    its artifact in place. Old entries are left to expire.
+    """
+    if model_version not in model_registry.versions:
+        raise HTTPException(status_code=404, detail=f"Unknown model version {model_version}")
+    try:
+        generation = await cache_service.invalidate(model_version)
+    except Exception as e:
+        logger.error("cache_invalidate_failed", model_version=model_version, error=str(e))
+        raise HTTPException(status_code=503, detail="Cache invalidation failed")
+    return {"model_version": model_version, "generation": generation}
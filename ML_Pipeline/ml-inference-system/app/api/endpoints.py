@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Request
-from typing import Annotated, Optional, List, Dict
+import time
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import Response
+from typing import Annotated, Optional, Dict
 from app.schemas import PredictionRequest, PredictionResponse, HealthResponse
-from app.services.inference_engine import inference_engine, MODELS
+from app.services.inference_engine import inference_engine, MODELS, loaded_versions, token_input_info
+from app.services.central_inference import central_client
+from app.services.executor import inference_executor
 from app.core.config import settings
-from app.core.metrics import ACTIVE_MODELS
+from app.core import tracing
+from app.services.model_registry import model_registry, UnknownModelVersion
+from app.services.router import model_router
+from app.services.admission import Overloaded
+from app.services.deadlines import DeadlineExceeded
+from app.services.streaming import DuplexStreamingResponse, stream_predictions
+from app.services.serialization import MSGPACK, encode_prediction, negotiate
+from app.services.token_input import TokenInputError, parse_token_request, split_rows
 import structlog
 
 logger = structlog.get_logger()
 router = APIRouter()
 
-async def verify_auth_token(x_token: Annotated[Optional[str], Header()] = None):
+async def verify_auth_token(request: Request, x_token: Annotated[Optional[str], Header()] = None):
     """Verify authentication token from request header."""
+    start_time = time.perf_counter()
     try:
         if x_token is None or x_token != settings.AUTH_TOKEN:
             raise HTTPException(status_code=401, detail="Invalid or missing auth token")
@@ -19,6 +32,22 @@ async def verify_auth_token(x_token: Annotated[Optional[str], Header()] = None):
     except Exception as e:
         logger.error("auth_error", error=str(e))
         raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        request.state.auth_seconds = time.perf_counter() - start_time
+
+def record_request_stages(http_request: Request, model_version: str, batch_size: int):
+    """
+    Attribute the time before the endpoint ran: the auth check, and reading,
+    parsing and validating the body (everything else since arrival).
+    """
+    received_at = getattr(http_request.state, "received_at", None)
+    if received_at is None:
+        return
+    auth_seconds = getattr(http_request.state, "auth_seconds", 0.0)
+    tracing.record_stage("auth", model_version, batch_size, auth_seconds)
+    tracing.record_stage(
+        "validation", model_version, batch_size, max(0.0, time.perf_counter() - received_at - auth_seconds)
+    )
 
 @router.get("/models", response_model=Dict)
 async def list_models():
@@ -39,27 +68,114 @@ async def list_models():
         logger.error("list_models_error", error=str(e))
         return {"total": 0, "models": []}
 
-@router.post("/predict", response_model=PredictionResponse, dependencies=[Depends(verify_auth_token)])
-async def predict_sentiment(request: PredictionRequest):
-    """Predict sentiment for given texts."""
+@router.post("/predict", response_model=PredictionResponse, dependencies=[Depends(verify_auth_token)],
+             responses={200: {"content": {MSGPACK: {}}}})
+async def predict_sentiment(request: PredictionRequest, http_request: Request,
+                            x_deadline_ms: Annotated[Optional[float], Header()] = None,
+                            accept: Annotated[Optional[str], Header()] = None):
+    """Predict sentiment for given texts. Responds with msgpack when Accept prefers it."""
     try:
-        return await inference_engine.predict(request)
+        record_request_stages(http_request, model_registry.resolve(request.model_version), len(request.texts))
+        if request.deadline_ms is None and x_deadline_ms is not None and x_deadline_ms > 0:
+            request.deadline_ms = x_deadline_ms
+        response = await inference_engine.predict(request)
+        media_type = negotiate(accept)
+        with tracing.stage("serialization", model_registry.resolve(response.model_version), len(request.texts)):
+            return Response(content=encode_prediction(response, media_type), media_type=media_type)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": e.retry_after_header}
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except UnknownModelVersion:
+        raise HTTPException(status_code=404, detail="Unknown model version")
     except Exception as e:
         logger.error("predict_error", error=str(e), exc_info=True)
         return PredictionResponse(
             request_id=request.id,
-            model_version=request.model_version or "v1",
+            model_version=model_registry.resolve(request.model_version),
             results=[],
             latency_ms=0
         )
 
+@router.get("/models/{model_version}/tokenizer", response_model=Dict)
+async def tokenizer_info(model_version: str):
+    """Vocabulary fingerprint and limits for sending pre-tokenized input to a version."""
+    if model_version not in MODELS:
+        raise HTTPException(status_code=404, detail="Unknown model version")
+    info = await inference_executor.run(token_input_info, model_version)
+    if info is None:
+        raise HTTPException(status_code=400, detail="Model does not accept token ids")
+    return {"model_version": model_version, **info}
+
+@router.post("/predict/tokens", response_model=PredictionResponse, dependencies=[Depends(verify_auth_token)],
+             responses={200: {"content": {MSGPACK: {}}}})
+async def predict_tokens(http_request: Request, content_type: Annotated[Optional[str], Header()] = None,
+                         accept: Annotated[Optional[str], Header()] = None):
+    """
+    Predict from token ids the caller already computed, sent as a msgpack
+    body (see app/services/token_input.py). Skips server-side tokenization.
+    """
+    if (content_type or "").split(";")[0].strip().lower() not in ("application/msgpack", "application/x-msgpack"):
+        raise HTTPException(status_code=415, detail="Body must be application/msgpack")
+    if central_client.enabled:
+        raise HTTPException(status_code=501, detail="Pre-tokenized input is unavailable with CENTRAL_INFERENCE")
+    try:
+        request, input_ids, attention_mask = parse_token_request(await http_request.body())
+        if request.model_version not in MODELS:
+            raise HTTPException(status_code=404, detail="Unknown model version")
+        info = await inference_executor.run(token_input_info, request.model_version)
+        if info is None:
+            raise HTTPException(status_code=400, detail="Model does not accept token ids")
+        if request.vocab != info["vocab_fingerprint"]:
+            raise HTTPException(status_code=409, detail="Token ids were produced by a different tokenizer")
+        rows = split_rows(input_ids, attention_mask, info["vocab_size"], info["max_length"])
+
+        record_request_stages(http_request, request.model_version, len(rows))
+        response = await inference_engine.predict_tokens(request, rows)
+        media_type = negotiate(accept)
+        with tracing.stage("serialization", request.model_version, len(rows)):
+            return Response(content=encode_prediction(response, media_type), media_type=media_type)
+    except TokenInputError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": e.retry_after_header}
+        )
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+@router.post("/predict/stream", dependencies=[Depends(verify_auth_token)])
+async def predict_stream(request: Request, model_version: Optional[str] = None, id: Optional[str] = None,
+                         return_probabilities: bool = False, top_k: Optional[int] = Query(None, ge=1)):
+    """
+    Bulk prediction over NDJSON: one JSON string (or {"text": ...} object) per
+    input line, one result line per input streamed back as batches complete.
+    return_probabilities and top_k work as on /predict.
+    """
+    request_id = id or str(uuid.uuid4())
+    try:
+        served_version = model_router.route(request_id, model_version).version
+    except UnknownModelVersion:
+        raise HTTPException(status_code=404, detail="Unknown model version")
+    return DuplexStreamingResponse(
+        stream_predictions(request.stream(), served_version, return_probabilities, top_k),
+        media_type="application/x-ndjson",
+        headers={"X-Request-ID": request_id, "X-Model-Version": served_version}
+    )
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """Check health status."""
     try:
         return HealthResponse(
-            status="active",
-            active_models=list(MODELS.keys())
+            status="active" if inference_engine.is_ready() else "warming",
+            active_models=loaded_versions()
         )
     except Exception as e:
         logger.error("health_check_error", error=str(e))
@@ -1,3 +1,4 @@
+from typing import List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,9 +6,101 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     MODEL_REGISTRY_PATH: str = "model_registry.yaml"
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_CACHE_TTL: int = 3600
+    # How stale a worker's view of a version's cache generation may get
+    CACHE_GENERATION_REFRESH_S: float = 1.0
+    # Most a cache read may add to a request; read timeouts are this budget and
+    # writes, which run off the request path, get REDIS_WRITE_BUDGET_FACTOR times it
+    REDIS_LATENCY_BUDGET_MS: float = 5.0
+    REDIS_WRITE_BUDGET_FACTOR: float = 4.0
+    REDIS_POOL_SIZE: int = 32
+    REDIS_MAX_PENDING_WRITES: int = 64
+    # Consecutive failures or timeouts that open the breaker, then how it probes to close
+    REDIS_BREAKER_FAILURES: int = 5
+    REDIS_BREAKER_PROBE_INTERVAL_S: float = 1.0
+    REDIS_BREAKER_PROBE_SUCCESSES: int = 3
+
+    # In-process L1 prediction cache
+    L1_CACHE_ENABLED: bool = True
+    L1_CACHE_MAX_ITEMS: int = 10000
+    L1_CACHE_MAX_MB: int = 64
+    L1_CACHE_TTL: int = 60
     AUTH_TOKEN: str = "secret-token"
     LOG_LEVEL: str = "INFO"
 
+    # Admin API (/admin); disabled while ADMIN_TOKEN is empty
+    ADMIN_TOKEN: str = ""
+    PROFILE_DIR: str = "profiles"
+    PROFILER_MAX_SECONDS: float = 60.0
+    PROFILER_MAX_OVERHEAD: float = 0.05
+
+    # OpenTelemetry spans per request and stage: "none", "memory", "file" (JSON lines) or "console"
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "traces.jsonl"
+    TRACING_SAMPLE_RATIO: float = 1.0
+
+    # Dynamic batching
+    MAX_BATCH_SIZE: int = 32
+    MAX_BATCH_WAIT_MS: float = 5.0
+
+    # Inference executor: "thread" or "process"
+    INFERENCE_EXECUTOR: str = "thread"
+    INFERENCE_THREAD_WORKERS: int = 2
+    INFERENCE_PROCESS_WORKERS: int = 2
+
+    # Serving backend: "auto" (ONNX when the registry artifact exists), "onnx" or "transformers"
+    INFERENCE_BACKEND: str = "auto"
+
+    # ONNX Runtime session options
+    ONNX_GRAPH_OPTIMIZATION_LEVEL: str = "all"  # disable, basic, extended, all
+    ONNX_EXECUTION_MODE: str = "sequential"  # sequential, parallel
+    ONNX_INTRA_OP_THREADS: int = 0
+    ONNX_INTER_OP_THREADS: int = 0
+    ONNX_USE_IO_BINDING: bool = True
+    MAX_SEQUENCE_LENGTH: int = 512
+
+    # Token-length bucketing: texts are padded to the smallest bucket that fits
+    # and each forward pass is capped at MAX_BATCH_TOKENS padded tokens
+    BUCKET_LENGTHS: List[int] = [16, 32, 64, 128, 256, 512]
+    MAX_BATCH_TOKENS: int = 8192
+
+    # Startup: versions loaded and warmed before /ready turns green
+    PRELOAD_MODEL_VERSIONS: List[str] = ["v1"]
+    WARMUP_SEQUENCE_LENGTHS: List[int] = [8, 32, 128]
+    WARMUP_BATCH_SIZE: int = 4
+
+    # Model residency: LRU-evict idle models above the budget; pinned versions are never evicted.
+    # The budget covers the whole server: prefork splits it between the processes running models
+    MODEL_MEMORY_BUDGET_MB: int = 768
+    PINNED_MODEL_VERSIONS: List[str] = ["v1"]
+
+    # Shadow traffic queue; requests beyond it are dropped, never waited on
+    SHADOW_QUEUE_SIZE: int = 100
+
+    # Admission control: concurrent requests per model, waiting room, and the
+    # estimated wait above which requests are shed with 429
+    ADMISSION_CONTROL_ENABLED: bool = True
+    MAX_CONCURRENT_REQUESTS_PER_MODEL: int = 8
+    MAX_QUEUED_REQUESTS_PER_MODEL: int = 64
+    MAX_QUEUE_WAIT_MS: float = 1000.0
+
+    # Streaming bulk endpoint: texts per chunk and chunks in flight before reading pauses;
+    # chunks are admitted as batch traffic and retried this many times when shed
+    STREAM_CHUNK_SIZE: int = 64
+    STREAM_MAX_INFLIGHT_CHUNKS: int = 4
+    STREAM_OVERLOAD_RETRIES: int = 5
+
+    # Preload-and-fork serving (app.prefork): worker processes sharing the parent's loaded models
+    SERVER_WORKERS: int = 1
+
+    # Prefork only: run inference in one process fed by per-worker shared-memory rings
+    CENTRAL_INFERENCE: bool = False
+    RING_SLOTS: int = 64
+    RING_SLOT_KB: int = 256
+    CENTRAL_INFERENCE_TIMEOUT_S: float = 30.0
+    # Most the inference process waits per batch for full response rings
+    CENTRAL_RESPONSE_WAIT_MS: float = 20.0
+
     class Config:
         env_file = ".env"
 
@@ -1,5 +1,9 @@
 from prometheus_client import Counter, Histogram, Gauge
 
+# Gauges declare how they aggregate across workers in prefork mode
+# (PROMETHEUS_MULTIPROC_DIR set); the mode is ignored in a single process.
+# Model memory is shared copy-on-write, so it is reported as a max, not a sum.
+
 # Standard Metrics
 REQUEST_COUNT = Counter(
     "http_requests_total",
@@ -14,6 +18,45 @@ REQUEST_LATENCY = Histogram(
     buckets=[0.01, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
 )
 
+# Per-stage latency: auth, validation, cache_lookup, admission_wait, batch_wait,
+# tokenize, forward, postprocess, cache_write, serialization. batch_bucket is the
+# request's text count for request stages and the forward batch size for
+# batch_wait/tokenize/forward/postprocess.
+STAGE_LATENCY = Histogram(
+    "inference_stage_seconds",
+    "Time spent in each stage of the prediction pipeline",
+    ["stage", "model_version", "batch_bucket"],
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0]
+)
+
+# Admission control
+REQUESTS_SHED = Counter(
+    "requests_shed_total",
+    "Requests rejected with 429 by admission control",
+    ["model_version", "priority", "reason"]
+)
+
+ADMISSION_QUEUE_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Time a request waits for an inference slot",
+    ["model_version", "priority"],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0]
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for an inference slot",
+    ["model_version"],
+    multiprocess_mode="livesum"
+)
+
+# Request deadlines
+DEADLINE_SKIPPED = Counter(
+    "deadline_skipped_texts_total",
+    "Texts dropped without inference because their deadline had passed",
+    ["model_version", "stage"]
+)
+
 # ML Specific Metrics
 MODEL_INFERENCE_TIME = Histogram(
     "model_inference_seconds",
@@ -22,16 +65,53 @@ MODEL_INFERENCE_TIME = Histogram(
     buckets=[0.001, 0.005, 0.01, 0.02, 0.05, 0.1, 0.5]
 )
 
+INFERENCE_BATCH_SIZE = Histogram(
+    "inference_batch_size",
+    "Number of texts per batched forward pass",
+    ["model_version"],
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128]
+)
+
+BATCH_QUEUE_WAIT = Histogram(
+    "batch_queue_wait_seconds",
+    "Time a text waits in the batching queue before its forward pass",
+    ["model_version"],
+    buckets=[0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1]
+)
+
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "inference_executor_queue_depth",
+    "Inference jobs waiting for a free executor worker",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+
+EXECUTOR_ACTIVE_WORKERS = Gauge(
+    "inference_executor_active_workers",
+    "Executor workers currently running inference",
+    ["pool"],
+    multiprocess_mode="livesum"
+)
+
+EXECUTOR_OCCUPANCY = Gauge(
+    "inference_executor_occupancy_ratio",
+    "Fraction of executor workers currently busy",
+    ["pool"],
+    multiprocess_mode="livemax"
+)
+
 MODEL_LOAD_TIME = Gauge(
     "model_load_seconds",
     "Time taken to load the model into memory",
-    ["model_name", "model_version"]
+    ["model_name", "model_version"],
+    multiprocess_mode="max"
 )
 
 ACTIVE_MODELS = Gauge(
     "active_models_count",
     "Number of models currently loaded",
-    ["model_name", "version"]
+    ["model_name", "version"],
+    multiprocess_mode="livemax"
 )
 
 CACHE_HITS = Counter(
@@ -45,3 +125,165 @@ CACHE_MISSES = Counter(
     "Total number of cache misses",
     ["model_version"]
 )
+
+L1_CACHE_HITS = Counter(
+    "l1_cache_hits_total",
+    "Cache hits served from the in-process L1 cache",
+    ["model_version"]
+)
+
+L1_CACHE_MISSES = Counter(
+    "l1_cache_misses_total",
+    "Lookups not found in the in-process L1 cache",
+    ["model_version"]
+)
+
+L2_CACHE_HITS = Counter(
+    "l2_cache_hits_total",
+    "Cache hits served from Redis after an L1 miss",
+    ["model_version"]
+)
+
+L2_CACHE_MISSES = Counter(
+    "l2_cache_misses_total",
+    "Lookups not found in Redis after an L1 miss",
+    ["model_version"]
+)
+
+L1_CACHE_EVICTIONS = Counter(
+    "l1_cache_evictions_total",
+    "Entries evicted from the L1 cache by size or memory budget",
+    ["model_version"]
+)
+
+L1_CACHE_ITEMS = Gauge(
+    "l1_cache_items",
+    "Entries currently held in the L1 cache",
+    multiprocess_mode="livesum"
+)
+
+L1_CACHE_BYTES = Gauge(
+    "l1_cache_bytes",
+    "Approximate memory held by the L1 cache",
+    multiprocess_mode="livesum"
+)
+
+REDIS_OPERATION_LATENCY = Histogram(
+    "redis_operation_seconds",
+    "Latency of Redis operations that completed within their timeout",
+    ["operation"],
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1]
+)
+
+REDIS_OPERATION_FAILURES = Counter(
+    "redis_operation_failures_total",
+    "Redis operations that timed out or failed",
+    ["operation", "reason"]
+)
+
+REDIS_OPERATIONS_SKIPPED = Counter(
+    "redis_operations_skipped_total",
+    "Redis operations not attempted, because the circuit is open or too many writes are pending",
+    ["operation", "reason"]
+)
+
+REDIS_CIRCUIT_OPEN = Gauge(
+    "redis_circuit_open",
+    "1 while Redis is bypassed by the circuit breaker (max across workers)",
+    multiprocess_mode="livemax"
+)
+
+REDIS_CIRCUIT_TRANSITIONS = Counter(
+    "redis_circuit_transitions_total",
+    "Circuit breaker state changes",
+    ["state"]
+)
+
+PREDICTIONS_COALESCED = Counter(
+    "predictions_coalesced_total",
+    "Predictions served by joining an identical in-flight inference",
+    ["model_version"]
+)
+
+MODEL_RESIDENT_BYTES = Gauge(
+    "model_resident_bytes",
+    "Estimated resident memory of each loaded model",
+    ["model_version"],
+    multiprocess_mode="livemax"
+)
+
+MODEL_MEMORY_USED_BYTES = Gauge(
+    "model_memory_used_bytes",
+    "Estimated resident memory of all loaded models",
+    multiprocess_mode="livemax"
+)
+
+MODEL_MEMORY_BUDGET_BYTES = Gauge(
+    "model_memory_budget_bytes",
+    "Configured memory budget for loaded models",
+    multiprocess_mode="livemax"
+)
+
+MODEL_EVICTIONS = Counter(
+    "model_evictions_total",
+    "Models unloaded to stay within the memory budget",
+    ["model_version"]
+)
+
+ROUTED_REQUESTS = Counter(
+    "routed_requests_total",
+    "Requests routed to each model version by rollout strategy",
+    ["model_version", "strategy"]
+)
+
+VERSION_LATENCY = Histogram(
+    "model_version_latency_seconds",
+    "Prediction latency per model version, for primary and shadow traffic",
+    ["model_version", "role"],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+)
+
+SHADOW_DROPPED = Counter(
+    "shadow_requests_dropped_total",
+    "Shadow requests dropped because the shadow queue was full or admission control shed them",
+    ["model_version"]
+)
+
+SHADOW_QUEUE_DEPTH = Gauge(
+    "shadow_queue_depth",
+    "Shadow requests waiting to run",
+    multiprocess_mode="livesum"
+)
+
+MODEL_AGREEMENT = Counter(
+    "model_agreement_total",
+    "Per-item agreement between primary and shadow predictions",
+    ["primary_version", "shadow_version", "outcome"]
+)
+
+STREAM_ITEMS = Counter(
+    "stream_items_total",
+    "Result lines written by the streaming prediction endpoint",
+    ["model_version"]
+)
+
+STREAM_INFLIGHT_CHUNKS = Gauge(
+    "stream_inflight_chunks",
+    "Streaming chunks queued or running for the most recently read stream",
+    multiprocess_mode="livesum"
+)
+
+# Central inference process (shared-memory rings)
+RING_SLOTS_USED = Gauge(
+    "inference_ring_slots_used",
+    "Occupied slots across all worker rings",
+    ["ring"],
+    multiprocess_mode="livesum"
+)
+
+RING_HANDOFF_LATENCY = Histogram(
+    "inference_ring_handoff_seconds",
+    "Time a record spends in a shared-memory ring before the other side reads it",
+    ["direction"],
+    buckets=[0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05]
+)
@@ -0,0 +1,58 @@
+import time
+from app.core import tracing
+from app.core.metrics import REQUEST_COUNT, REQUEST_LATENCY
+
+
+class RequestMetricsMiddleware:
+    """
+    Records REQUEST_COUNT and REQUEST_LATENCY for every HTTP request and
+    wraps it in a server span when tracing is on. A plain ASGI middleware,
+    so streamed request and response bodies pass through untouched.
+
+    The arrival time is stored in the request state (received_at) so the
+    endpoint can attribute body parsing and validation time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        scope.setdefault("state", {})["received_at"] = start_time
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        with tracing.request_span(f"{method} {scope['path']}", {"http.method": method, "http.target": scope["path"]}):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                endpoint = self._endpoint_label(scope)
+                REQUEST_COUNT.labels(method=method, endpoint=endpoint, status=str(status)).inc()
+                REQUEST_LATENCY.labels(method=method, endpoint=endpoint).observe(time.perf_counter() - start_time)
+
+    @staticmethod
+    def _endpoint_label(scope) -> str:
+        """
+        Route template such as /api/v1/models/{model_version}/tokenizer, so
+        neither path parameters nor unmatched URLs can grow the label set
+        """
+        if scope.get("route") is None:
+            return "unmatched"
+        segments = scope["path"].split("/")
+        for name, value in scope.get("path_params", {}).items():
+            # Parameters follow the prefix, so match from the end
+            for i in range(len(segments) - 1, -1, -1):
+                if segments[i] == str(value):
+                    segments[i] = f"{{{name}}}"
+                    break
+        return "/".join(segments)
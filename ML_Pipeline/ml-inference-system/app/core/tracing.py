@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import STAGE_LATENCY
+import structlog
+
+logger = structlog.get_logger()
+
+# Set by setup_tracing() when TRACING_EXPORTER is not "none"; stages then
+# also emit OpenTelemetry spans. Histograms are recorded either way.
+_tracer = None
+_memory_exporter = None
+
+# In process-executor workers stage timings are buffered here instead, and
+# recorded by the parent process that exports the metrics
+_stage_buffer: Optional[List[Tuple[str, str, int, float]]] = None
+
+
+def buffer_stages():
+    global _stage_buffer
+    _stage_buffer = []
+
+
+def drain_stages() -> List[Tuple[str, str, int, float]]:
+    global _stage_buffer
+    if _stage_buffer is None:
+        return []
+    stages, _stage_buffer = _stage_buffer, []
+    return stages
+
+
+def batch_bucket(batch_size: int) -> str:
+    """Power-of-two bucket label for a batch size, so the label set stays small"""
+    if batch_size > 128:
+        return "128+"
+    return str(1 << max(0, batch_size - 1).bit_length())
+
+
+@contextmanager
+def stage(name: str, model_version: str, batch_size: int):
+    """Time a block as one pipeline stage, inside a span when tracing is on"""
+    span = _tracer.start_as_current_span(name, attributes=_attributes(model_version, batch_size)) \
+        if _tracer is not None else nullcontext()
+    start_time = time.perf_counter()
+    with span:
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start_time
+            if _stage_buffer is not None:
+                _stage_buffer.append((name, model_version, batch_size, duration))
+            else:
+                STAGE_LATENCY.labels(
+                    stage=name, model_version=model_version, batch_bucket=batch_bucket(batch_size)
+                ).observe(duration)
+
+
+def record_stage(name: str, model_version: str, batch_size: int, duration: float):
+    """Record a stage that has already finished, e.g. time spent waiting in a queue"""
+    if _stage_buffer is not None:
+        _stage_buffer.append((name, model_version, batch_size, duration))
+        return
+    STAGE_LATENCY.labels(
+        stage=name, model_version=model_version, batch_bucket=batch_bucket(batch_size)
+    ).observe(duration)
+    if _tracer is not None:
+        end_ns = time.time_ns()
+        span = _tracer.start_span(
+            name, attributes=_attributes(model_version, batch_size), start_time=end_ns - int(duration * 1e9)
+        )
+        span.end(end_time=end_ns)
+
+
+def _attributes(model_version: str, batch_size: int) -> dict:
+    return {"model.version": model_version, "batch.size": batch_size}
+
+
+def current_span_context():
+    """Context of the active span, to link batched work back to its requests"""
+    if _tracer is None:
+        return None
+    from opentelemetry import trace
+    context = trace.get_current_span().get_span_context()
+    return context if context.is_valid else None
+
+
+def batch_span(model_version: str, batch_size: int, request_contexts: List):
+    """
+    Root span for one coalesced forward pass. A batch serves several requests,
+    so instead of a parent it carries a link to each request's span.
+    """
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry import context, trace
+    unique = {c.span_id: c for c in request_contexts if c is not None}
+    links = [trace.Link(c) for c in unique.values()]
+    return _tracer.start_as_current_span(
+        "inference_batch", context=context.Context(), links=links,
+        attributes=_attributes(model_version, batch_size)
+    )
+
+
+def request_span(name: str, attributes: dict):
+    """Server span around one HTTP request"""
+    if _tracer is None:
+        return nullcontext()
+    from opentelemetry import trace
+    return _tracer.start_as_current_span(name, kind=trace.SpanKind.SERVER, attributes=attributes)
+
+
+def finished_spans() -> list:
+    """Spans collected by the "memory" exporter"""
+    return list(_memory_exporter.get_finished_spans()) if _memory_exporter is not None else []
+
+
+def setup_tracing():
+    """
+    Configure OpenTelemetry from TRACING_EXPORTER:
+    "memory" keeps spans in process (finished_spans()), "file" appends one
+    JSON span per line to TRACING_FILE, "console" prints them.
+    """
+    global _tracer, _memory_exporter
+    exporter_name = settings.TRACING_EXPORTER.lower()
+    if exporter_name == "none":
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    except ImportError:
+        logger.warn("tracing_unavailable", exporter=exporter_name, reason="opentelemetry-sdk not installed")
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.PROJECT_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATIO)),
+    )
+    if exporter_name == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        _memory_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(_memory_exporter))
+    elif exporter_name == "file":
+        provider.add_span_processor(BatchSpanProcessor(_file_exporter(settings.TRACING_FILE)))
+    else:
+        provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("app")
+    logger.info("tracing_enabled", exporter=exporter_name, sample_ratio=settings.TRACING_SAMPLE_RATIO)
+
+
+def shutdown_tracing():
+    """Flush spans still buffered by the batch processor"""
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+def _file_exporter(path: str):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        """Appends spans to a file, one JSON object per line"""
+
+        def __init__(self):
+            self._lock = threading.Lock()
+
+        def export(self, spans) -> SpanExportResult:
+            lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+            with self._lock, open(path, "a") as f:
+                f.write(lines)
+            return SpanExportResult.SUCCESS
+
+    return JsonLinesSpanExporter()
@@ -4,14 +4,23 @@ import os
 # Ensure we're using the correct path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import structlog
 from app.core.logging import setup_logging
+from app.core.middleware import RequestMetricsMiddleware
+from app.core.tracing import setup_tracing, shutdown_tracing
 
 from app.api.endpoints import router as api_router
+from app.api.admin import router as admin_router
 from app.core.config import settings
 from app.services.cache_service import cache_service
+from app.services.batcher import stop_schedulers
+from app.services.executor import inference_executor
+from app.services.inference_engine import inference_engine
+from app.services.router import shadow_runner
 
 logger = structlog.get_logger()
 
@@ -19,8 +28,15 @@ logger = structlog.get_logger()
 async def lifespan(app: FastAPI):
     try:
         setup_logging()
+        setup_tracing()
         logger.info("startup")
         await cache_service.connect()
+        cache_service.prepare(settings.PRELOAD_MODEL_VERSIONS)
+        # Load and warm models in the background so /health answers during startup;
+        # /ready stays 503 until they are warm
+        app.state.warmup_task = asyncio.create_task(
+            inference_engine.warm_up(settings.PRELOAD_MODEL_VERSIONS)
+        )
     except Exception as e:
         logger.error("startup_error", error=str(e), exc_info=True)
     
@@ -28,6 +44,14 @@ async def lifespan(app: FastAPI):
     
     try:
         logger.info("shutdown")
+        warmup_task = getattr(app.state, "warmup_task", None)
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        shadow_runner.stop()
+        await stop_schedulers()
+        await cache_service.close()
+        inference_executor.shutdown()
+        shutdown_tracing()
     except Exception as e:
         logger.error("shutdown_error", error=str(e))
 
@@ -38,14 +62,33 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(RequestMetricsMiddleware)
 app.include_router(api_router, prefix=settings.API_V1_STR)
+app.include_router(admin_router, prefix=f"{settings.API_V1_STR}/admin")
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 only when preloaded models are loaded and warm"""
+    is_ready = inference_engine.is_ready()
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "warming",
+            "models": inference_engine.model_states
+        }
+    )
+
 @app.get("/metrics")
 async def metrics():
-    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, multiprocess
     from fastapi import Response
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Prefork mode: aggregate the samples every worker wrote to the shared directory
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
     return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,269 @@
+"""
+Preload-and-fork serving mode.
+
+The parent process loads and warms the preloaded model versions once, freezes
+the heap and forks SERVER_WORKERS uvicorn workers that accept on one shared
+socket. Model weights are shared copy-on-write instead of being loaded once
+per worker. Metrics are aggregated across workers through
+prometheus_client's multiprocess mode.
+
+With CENTRAL_INFERENCE the workers only handle HTTP, caching and routing;
+inference runs in one extra forked process that batches across all workers,
+fed through a pair of shared-memory rings per worker.
+
+Forking is only safe while no runtime thread pool exists: a child inherits
+the parent's pool state but not its threads, and the first parallel op then
+deadlocks. The parent therefore preloads only when each process gets one
+ONNX Runtime thread (ORT creates no pool for one thread) and with torch
+limited to one thread (OpenMP never starts its team). With more threads per
+process it skips the preload, and every process loads its models after the
+fork instead. Running at least as many workers as the CPUs available to the
+server (its cgroup CPU limit or affinity, not the host's core count) keeps
+the sharing.
+
+MODEL_MEMORY_BUDGET_MB covers the whole server. Models loaded after the fork
+are private to a process, so each process may add an equal share of what
+the shared preload leaves: budget = shared + (total - shared) / processes.
+
+Usage:
+    python -m app.prefork --host 0.0.0.0 --port 8000 --workers 4
+"""
+import argparse
+import gc
+import math
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+import structlog
+
+logger = structlog.get_logger()
+
+# children slot of the central inference process
+INFERENCE_SLOT = -1
+
+
+def prepare_metrics_dir() -> str:
+    """
+    Point prometheus_client at a clean multiprocess directory. Must run before
+    prometheus_client is first imported, which app.core.metrics does.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="prometheus_multiproc_")
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process may use: its affinity, capped by the cgroup CPU quota
+    (a container's CPU limit), which os.cpu_count() ignores
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: quota is -1 when unlimited
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
+
+
+def limit_runtime_threads():
+    """Keep torch from starting an OpenMP team in this process and its children"""
+    os.environ["OMP_NUM_THREADS"] = "1"
+    os.environ["MKL_NUM_THREADS"] = "1"
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(1)
+
+
+def set_memory_budget(processes: int):
+    """Split MODEL_MEMORY_BUDGET_MB between the processes that load models after the fork"""
+    from app.services.inference_engine import model_residency
+
+    total = settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+    shared = model_residency.used_bytes()
+    budget = shared + max(0, total - shared) // processes
+    model_residency.set_budget(budget)
+    logger.info("prefork_memory_budget", total_mb=settings.MODEL_MEMORY_BUDGET_MB,
+                shared_mb=round(shared / 2**20, 1), per_process_mb=round(budget / 2**20, 1),
+                processes=processes)
+
+
+def preload_models():
+    """Load and warm the preloaded versions so forked processes inherit them"""
+    from app.services.inference_engine import MODELS, load_and_warm
+
+    for version in settings.PRELOAD_MODEL_VERSIONS:
+        if version not in MODELS:
+            continue
+        try:
+            load_and_warm(version)
+        except Exception as e:
+            # Workers retry the load in their own warmup and stay unready if it fails
+            logger.error("preload_failed", model_version=version, error=str(e))
+
+
+def _reset_child():
+    # Undo the parent's handlers; uvicorn installs its own for graceful shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+
+
+def _run_worker(app, sock, host: str, port: int, channel=None, generation: int = 0):
+    import uvicorn
+    from app.services.central_inference import central_client
+
+    _reset_child()
+    if channel is not None:
+        central_client.attach(channel, generation)
+    config = uvicorn.Config(app, host=host, port=port, log_level=settings.LOG_LEVEL.lower())
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve(host: str, port: int, workers: int):
+    prepare_metrics_dir()
+
+    import uvicorn
+    from prometheus_client import multiprocess
+    from app.core.logging import setup_logging
+
+    setup_logging()
+    # Processes that run models: every worker, or only the central inference process
+    inference_processes = 1 if settings.CENTRAL_INFERENCE else workers
+    if settings.ONNX_INTRA_OP_THREADS == 0:
+        # Split the CPUs between workers instead of each session using all of them
+        settings.ONNX_INTRA_OP_THREADS = max(1, available_cpus() // inference_processes)
+    # See the module docstring: only preload while it starts no thread pools
+    preload_in_parent = settings.ONNX_INTRA_OP_THREADS == 1
+    if preload_in_parent:
+        settings.ONNX_INTER_OP_THREADS = 1
+        limit_runtime_threads()
+
+    from app.main import app
+
+    if preload_in_parent:
+        start_time = time.time()
+        preload_models()
+        logger.info("prefork_models_loaded", versions=settings.PRELOAD_MODEL_VERSIONS,
+                    duration=time.time() - start_time)
+    else:
+        logger.info("prefork_preload_skipped", threads_per_process=settings.ONNX_INTRA_OP_THREADS,
+                    reason="more than one runtime thread per process; models load after the fork")
+    set_memory_budget(inference_processes)
+
+    sock = uvicorn.Config(app, host=host, port=port).bind_socket()
+
+    channels = []
+    if settings.CENTRAL_INFERENCE:
+        from app.services.shm_ring import RingChannel
+        channels = [RingChannel(settings.RING_SLOTS, settings.RING_SLOT_KB * 1024) for _ in range(workers)]
+
+    # Move everything allocated so far out of the collector's reach so that
+    # collections in the workers don't write to (and un-share) those pages
+    gc.disable()
+    gc.freeze()
+
+    children: Dict[int, int] = {}
+    # Workers started per slot, so a respawned worker ignores its predecessor's responses
+    generations: Dict[int, int] = defaultdict(int)
+    stopping = False
+
+    def spawn(slot: int):
+        generations[slot] += 1
+        pid = os.fork()
+        if pid == 0:
+            try:
+                if slot == INFERENCE_SLOT:
+                    from app.services.central_inference import serve_channels
+                    _reset_child()
+                    sock.close()
+                    # Loads what the parent skipped; workers wait on it in their warmup
+                    preload_models()
+                    serve_channels(channels)
+                else:
+                    _run_worker(app, sock, host, port, channels[slot] if channels else None, generations[slot])
+            finally:
+                os._exit(0)
+        children[pid] = slot
+        logger.info("worker_started", pid=pid, slot=slot)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if channels:
+        spawn(INFERENCE_SLOT)
+    for slot in range(workers):
+        spawn(slot)
+    logger.info("prefork_serving", host=host, port=port, workers=workers)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        slot = children.pop(pid, None)
+        multiprocess.mark_process_dead(pid)
+        if slot is None or stopping:
+            continue
+        logger.warn("worker_exited", pid=pid, slot=slot, status=status)
+        # Back off a little so a worker that dies on startup doesn't spin
+        time.sleep(1)
+        if not stopping:
+            spawn(slot)
+
+    sock.close()
+    for channel in channels:
+        channel.close(unlink=True)
+    logger.info("prefork_stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from forked workers sharing preloaded models")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    args = parser.parse_args()
+    serve(args.host, args.port, max(1, args.workers))
+
+
+if __name__ == "__main__":
+    main()
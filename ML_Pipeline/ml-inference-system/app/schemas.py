@@ -1,17 +1,53 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Dict
+from typing import List, Literal, Optional, Union, Dict
 
 class PredictionRequest(BaseModel):
     id: str = Field(..., description="Unique Request ID")
     texts: List[str] = Field(..., description="List of texts to classify", min_length=1)
     model_version: Optional[str] = Field(None, description="Specific model version to use")
+    priority: Literal["interactive", "batch"] = Field(
+        "interactive", description="Queueing priority under load; batch traffic is shed first"
+    )
+    deadline_ms: Optional[float] = Field(
+        None, gt=0, description="Time budget in ms; texts not finished by then are skipped"
+    )
+    echo_text: bool = Field(True, description="Include each input text in its result")
+    return_probabilities: bool = Field(False, description="Include the probability of every class")
+    top_k: Optional[int] = Field(
+        None, ge=1, description="Include the probabilities of the k most likely classes only"
+    )
+
+class TokenPredictionRequest(BaseModel):
+    """Fields of a pre-tokenized request; the token arrays travel beside them (see token_input)"""
+    id: str = Field(..., description="Unique Request ID")
+    model_version: str = Field(..., description="Model version the ids were tokenized for")
+    vocab: str = Field(..., description="Tokenizer fingerprint from /models/{version}/tokenizer")
+    priority: Literal["interactive", "batch"] = Field(
+        "interactive", description="Queueing priority under load; batch traffic is shed first"
+    )
+    deadline_ms: Optional[float] = Field(
+        None, gt=0, description="Time budget in ms; rows not finished by then are skipped"
+    )
+    return_probabilities: bool = Field(False, description="Include the probability of every class")
+    top_k: Optional[int] = Field(
+        None, ge=1, description="Include the probabilities of the k most likely classes only"
+    )
 
 class PredictionResponse(BaseModel):
     request_id: str
     model_version: str
-    results: List[Dict[str, Union[str, float]]]
+    results: List[Dict[str, Union[str, float, bool, Dict[str, float]]]]
     latency_ms: float
     cached: bool = False
+    partial: bool = False
+
+class ProfileRequest(BaseModel):
+    seconds: float = Field(10.0, gt=0, description="How long to profile; capped at PROFILER_MAX_SECONDS")
+    interval_ms: float = Field(10.0, ge=1, description="Stack sampling interval; stretched if sampling gets expensive")
+    idle: bool = Field(False, description="Keep samples of threads blocked waiting for work")
+    onnx_versions: List[str] = Field(
+        default_factory=list, description="Model versions to capture ONNX Runtime per-operator profiles for"
+    )
 
 class HealthResponse(BaseModel):
     status: str
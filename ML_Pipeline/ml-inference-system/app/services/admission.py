@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.core.metrics import REQUESTS_SHED, ADMISSION_QUEUE_WAIT, ADMISSION_QUEUE_DEPTH
+from app.services.deadlines import Deadline, DeadlineExceeded, remaining
+import structlog
+
+logger = structlog.get_logger()
+
+# Lower rank is served first; "shadow" is internal, for replayed shadow traffic
+PRIORITIES = {"interactive": 0, "batch": 1, "shadow": 2}
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; retry_after is a hint in seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"model overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "priority", "future")
+
+    def __init__(self, rank: int, seq: int, priority: str, future: asyncio.Future):
+        self.rank = rank
+        self.seq = seq
+        self.priority = priority
+        self.future = future
+
+    def key(self):
+        return (self.rank, self.seq)
+
+
+class _Gate:
+    """Concurrency slots and waiting room for one model version"""
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.waiters: List[_Waiter] = []
+        # EWMA of how long an admitted request holds its slot
+        self.service_time = 0.0
+
+    def estimated_wait(self) -> float:
+        return self.service_time * (len(self.waiters) // self.limit + 1)
+
+    def record(self, duration: float):
+        self.service_time = duration if self.service_time == 0.0 else 0.8 * self.service_time + 0.2 * duration
+
+
+class AdmissionController:
+    """
+    Bounds the inference work each model accepts. Up to
+    MAX_CONCURRENT_REQUESTS_PER_MODEL requests run at once; the rest wait in
+    a bounded queue ordered by priority. Requests are shed (Overloaded) when
+    the queue is full or their estimated wait exceeds MAX_QUEUE_WAIT_MS, and
+    a full queue gives up its newest lower-priority waiter to make room for
+    a higher-priority request.
+    """
+
+    def __init__(self, enabled: bool, limit: int, max_queue: int, max_wait_ms: float):
+        self.enabled = enabled
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait_ms / 1000
+        self._gates: Dict[str, _Gate] = {}
+        self._seq = itertools.count()
+
+    def _gate(self, model_version: str) -> _Gate:
+        if model_version not in self._gates:
+            self._gates[model_version] = _Gate(self.limit, self.max_queue)
+        return self._gates[model_version]
+
+    def _shed(self, model_version: str, priority: str, reason: str, retry_after: float) -> Overloaded:
+        REQUESTS_SHED.labels(model_version=model_version, priority=priority, reason=reason).inc()
+        if priority != "shadow":
+            logger.warn("request_shed", model_version=model_version, priority=priority, reason=reason)
+        return Overloaded(reason, retry_after)
+
+    @asynccontextmanager
+    async def admit(self, model_version: str, priority: str = "interactive",
+                    deadline: Optional[Deadline] = None):
+        """
+        Hold a concurrency slot for the body of the block, or raise Overloaded.
+        Raises DeadlineExceeded if the deadline passes while still queued.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        gate = self._gate(model_version)
+        rank = PRIORITIES.get(priority, PRIORITIES["interactive"])
+        start_time = time.perf_counter()
+
+        if gate.active < gate.limit and not gate.waiters:
+            gate.active += 1
+        else:
+            estimated = gate.estimated_wait()
+            if estimated > self.max_wait:
+                raise self._shed(model_version, priority, "wait_estimate", estimated)
+            if len(gate.waiters) >= gate.max_queue:
+                worst = max(gate.waiters, key=_Waiter.key, default=None)
+                if worst is None or worst.rank <= rank:
+                    raise self._shed(model_version, priority, "queue_full", estimated)
+                gate.waiters.remove(worst)
+                worst.future.set_exception(self._shed(model_version, worst.priority, "preempted", estimated))
+
+            waiter = _Waiter(rank, next(self._seq), priority, asyncio.get_running_loop().create_future())
+            gate.waiters.append(waiter)
+            ADMISSION_QUEUE_DEPTH.labels(model_version=model_version).set(len(gate.waiters))
+            try:
+                await asyncio.wait({waiter.future}, timeout=remaining(deadline))
+                if not waiter.future.done():
+                    gate.waiters.remove(waiter)
+                    raise DeadlineExceeded()
+                # Raises Overloaded if we were preempted
+                waiter.future.result()
+            except asyncio.CancelledError:
+                if waiter in gate.waiters:
+                    gate.waiters.remove(waiter)
+                elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                    # The slot was handed to us just before we were cancelled
+                    self._release(model_version, gate)
+                raise
+            finally:
+                ADMISSION_QUEUE_DEPTH.labels(model_version=model_version).set(len(gate.waiters))
+
+        admitted_at = time.perf_counter()
+        ADMISSION_QUEUE_WAIT.labels(model_version=model_version, priority=priority).observe(
+            admitted_at - start_time
+        )
+        try:
+            yield
+        finally:
+            gate.record(time.perf_counter() - admitted_at)
+            self._release(model_version, gate)
+
+    def _release(self, model_version: str, gate: _Gate):
+        """Hand the slot to the best waiter, or free it"""
+        while gate.waiters:
+            best = min(gate.waiters, key=_Waiter.key)
+            gate.waiters.remove(best)
+            if not best.future.done():
+                best.future.set_result(None)
+                ADMISSION_QUEUE_DEPTH.labels(model_version=model_version).set(len(gate.waiters))
+                return
+        gate.active -= 1
+
+
+admission_controller = AdmissionController(
+    enabled=settings.ADMISSION_CONTROL_ENABLED,
+    limit=settings.MAX_CONCURRENT_REQUESTS_PER_MODEL,
+    max_queue=settings.MAX_QUEUED_REQUESTS_PER_MODEL,
+    max_wait_ms=settings.MAX_QUEUE_WAIT_MS,
+)
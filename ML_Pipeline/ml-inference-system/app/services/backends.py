@@ -0,0 +1,362 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from transformers import AutoTokenizer
+from app.core.config import settings
+from app.core.tracing import stage
+from app.services.model_loader import model_loader, create_profiling_session
+from app.services.bucketing import plan_batches
+from app.services.postprocessing import LabelMap, postprocess, softmax
+import structlog
+
+logger = structlog.get_logger()
+
+
+def _next_power_of_two(n: int) -> int:
+    return 1 << max(0, n - 1).bit_length()
+
+
+def tokenizer_max_length(tokenizer) -> int:
+    """Tokens kept per text: the model's limit, capped by MAX_SEQUENCE_LENGTH"""
+    return min(tokenizer.model_max_length, settings.MAX_SEQUENCE_LENGTH)
+
+
+def load_tokenizer(spec: dict, backend: str):
+    """
+    The tokenizer a version's backend tokenizes with, loaded without the
+    model, or None for raw-text ONNX models, which ship no tokenizer.
+    """
+    if backend == "onnx":
+        model_dir = os.path.dirname(spec["path"])
+        if not os.path.exists(os.path.join(model_dir, "tokenizer_config.json")):
+            return None
+        return AutoTokenizer.from_pretrained(model_dir)
+    return AutoTokenizer.from_pretrained(spec["model_id"])
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Short digest of a tokenizer's vocabulary, so clients that send token ids can prove they match"""
+    vocab = json.dumps(tokenizer.get_vocab(), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(vocab.encode()).hexdigest()[:16]
+
+
+class TokenizedBackend:
+    """
+    Shared path for models fed with token ids: tokenize the whole batch first,
+    group texts into fixed length buckets, and run one forward pass per
+    bucket chunk capped by MAX_BATCH_TOKENS padded tokens. Results are
+    scattered back into the original order.
+
+    Items may also be pre-tokenized: a 1-D numpy array of token ids is
+    used as is and only the str items are tokenized.
+    """
+
+    tokenizer = None
+    input_names: List[str] = []
+    max_length = settings.MAX_SEQUENCE_LENGTH
+    config_labels: Optional[List[str]] = None
+    registry_labels: Optional[List[str]] = None
+    registry_classes: Optional[List[str]] = None
+    _label_map: Optional[LabelMap] = None
+    _vocab_fingerprint: Optional[str] = None
+
+    @property
+    def accepts_token_ids(self) -> bool:
+        return self.tokenizer is not None and "input_ids" in self.input_names
+
+    @property
+    def vocab_fingerprint(self) -> str:
+        if self._vocab_fingerprint is None:
+            self._vocab_fingerprint = tokenizer_fingerprint(self.tokenizer)
+        return self._vocab_fingerprint
+
+    def token_input_info(self) -> dict:
+        """What a client needs to send token ids for this model"""
+        return {
+            "vocab_fingerprint": self.vocab_fingerprint,
+            "vocab_size": len(self.tokenizer),
+            "max_length": self.max_length,
+            "pad_token_id": self.tokenizer.pad_token_id or 0,
+        }
+
+    def forward(self, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+    def label_map(self, num_classes: int) -> LabelMap:
+        """Labels and classes of the model's outputs, built once from the registry and model config"""
+        if self._label_map is None or len(self._label_map) != num_classes:
+            self._label_map = LabelMap.build(
+                num_classes, self.registry_labels, self.config_labels, self.registry_classes
+            )
+        return self._label_map
+
+    def predict_probabilities(self, texts: List) -> Tuple[np.ndarray, LabelMap]:
+        """Class probabilities for the batch; result items are built by the caller"""
+        logits = self.predict_logits(texts)
+        with stage("postprocess", self.model_version, len(texts)):
+            probs = softmax(logits)
+        return probs, self.label_map(probs.shape[1])
+
+    def predict_batch(self, texts: List) -> List[dict]:
+        logits = self.predict_logits(texts)
+        with stage("postprocess", self.model_version, len(texts)):
+            probs = softmax(logits)
+            return postprocess(probs, self.label_map(probs.shape[1]))
+
+    def predict_logits(self, texts: List) -> np.ndarray:
+        encoded = {"input_ids": self._encode(texts)}
+        input_ids = encoded["input_ids"]
+        lengths = [len(ids) for ids in input_ids]
+        pad_id = self.tokenizer.pad_token_id or 0
+
+        logits = None
+        # Padding and every bucket chunk's forward pass
+        with stage("forward", self.model_version, len(texts)):
+            for padded_length, indices in plan_batches(
+                lengths, settings.BUCKET_LENGTHS, settings.MAX_BATCH_TOKENS, self.max_length
+            ):
+                chunk = self._run_chunk(encoded, indices, padded_length, pad_id)
+                if logits is None:
+                    logits = np.empty((len(texts), chunk.shape[1]), dtype=np.float32)
+                logits[indices] = chunk
+        return logits
+
+    def _encode(self, items: List) -> List:
+        """Token ids per item; pre-tokenized items pass through untouched"""
+        texts = [(i, item) for i, item in enumerate(items) if isinstance(item, str)]
+        if not texts:
+            return items
+        with stage("tokenize", self.model_version, len(texts)):
+            encoded = self.tokenizer([text for _, text in texts], truncation=True, max_length=self.max_length)
+        if len(texts) == len(items):
+            return encoded["input_ids"]
+        input_ids = list(items)
+        for (i, _), ids in zip(texts, encoded["input_ids"]):
+            input_ids[i] = ids
+        return input_ids
+
+    def _run_chunk(self, encoded, indices: List[int], padded_length: int, pad_id: int) -> np.ndarray:
+        return self.forward(self._pad(encoded, indices, padded_length, pad_id))
+
+    def _pad(self, encoded, indices: List[int], padded_length: int, pad_id: int,
+             allocate=None) -> Dict[str, np.ndarray]:
+        """Pad the selected rows to padded_length, optionally into caller-provided buffers"""
+        n = len(indices)
+        if allocate is None:
+            allocate = lambda name, rows, cols: np.empty((rows, cols), dtype=np.int64)
+
+        feeds = {name: allocate(name, n, padded_length) for name in self.input_names}
+        for name, values in feeds.items():
+            values.fill(pad_id if name == "input_ids" else 0)
+
+        input_ids = feeds.get("input_ids")
+        attention_mask = feeds.get("attention_mask")
+        for row, i in enumerate(indices):
+            ids = encoded["input_ids"][i]
+            if input_ids is not None:
+                input_ids[row, :len(ids)] = ids
+            if attention_mask is not None:
+                attention_mask[row, :len(ids)] = 1
+        # Any other inputs (token_type_ids, ...) stay zero: single segment
+        return feeds
+
+
+class TransformersBackend(TokenizedBackend):
+    """PyTorch model for versions without an ONNX artifact."""
+
+    name = "transformers"
+
+    def __init__(self, model_version: str, spec: dict):
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        self.model_version = model_version
+        self._torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(spec["model_id"])
+        self.model = AutoModelForSequenceClassification.from_pretrained(spec["model_id"])
+        self.model.eval()
+        self.input_names = list(self.tokenizer.model_input_names)
+        self.max_length = tokenizer_max_length(self.tokenizer)
+        id2label = self.model.config.id2label or {}
+        self.config_labels = [id2label[k] for k in sorted(id2label)] or None
+        self.registry_labels = spec.get("labels")
+        self.registry_classes = spec.get("classes")
+
+    def memory_bytes(self) -> int:
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def forward(self, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        torch = self._torch
+        with torch.inference_mode():
+            outputs = self.model(**{name: torch.from_numpy(values) for name, values in feeds.items()})
+        return outputs.logits.float().numpy()
+
+
+class OnnxBackend(TokenizedBackend):
+    """
+    ONNX Runtime backend for registry artifacts. Handles both raw-text models
+    (string tensor input, e.g. scripts/create_dummy_model.py) and tokenized
+    transformer exports (input_ids/attention_mask, tokenizer next to the model).
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_version: str, spec: dict):
+        self.model_version = model_version
+        self.path = spec["path"]
+        self.session = model_loader.get_model(self.path, model_version)
+        self.model_dir = os.path.dirname(spec["path"])
+
+        inputs = self.session.get_inputs()
+        self.input_names = [i.name for i in inputs]
+        self.text_input = inputs[0].type == "tensor(string)"
+
+        if not self.text_input:
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            self.max_length = tokenizer_max_length(self.tokenizer)
+
+        output = self.session.get_outputs()[0]
+        self.output_name = output.name
+        self.config_labels = self._read_config_labels()
+        self.registry_labels = spec.get("labels")
+        self.registry_classes = spec.get("classes")
+        self.num_labels = output.shape[-1] if isinstance(output.shape[-1], int) else None
+        if self.num_labels is None and self.config_labels:
+            self.num_labels = len(self.config_labels)
+
+        # Preallocated IO binding buffers, grown on demand and reused across batches
+        self._lock = threading.Lock()
+        self._binding = self.session.io_binding() if not self.text_input else None
+        self._input_buffers: Dict[str, np.ndarray] = {}
+        self._output_buffer: Optional[np.ndarray] = None
+        self._served_session = None
+
+    def memory_bytes(self) -> int:
+        return os.path.getsize(self.path)
+
+    def close(self):
+        """Drop the session so its memory can be reclaimed"""
+        model_loader.unload(self.path)
+        self.session = None
+        self._binding = None
+        self._input_buffers.clear()
+        self._output_buffer = None
+
+    def start_profiling(self, profile_prefix: str):
+        """Serve from a profiling copy of the session until stop_profiling()"""
+        session = create_profiling_session(self.path, profile_prefix)
+        with self._lock:
+            self._served_session = self.session
+            self._swap_session(session)
+        logger.info("onnx_profiling_started", model_version=self.model_version)
+
+    def stop_profiling(self) -> str:
+        """Switch back to the served session; returns the profile JSON path"""
+        with self._lock:
+            session = self.session
+            self._swap_session(self._served_session)
+            self._served_session = None
+        # A run still in flight on the profiling session may be missing from the profile
+        path = session.end_profiling()
+        logger.info("onnx_profiling_stopped", model_version=self.model_version, profile=path)
+        return path
+
+    def _swap_session(self, session):
+        self.session = session
+        if self._binding is not None:
+            self._binding = session.io_binding()
+
+    def _read_config_labels(self) -> Optional[List[str]]:
+        config_path = os.path.join(self.model_dir, "config.json")
+        if not os.path.exists(config_path):
+            return None
+        with open(config_path) as f:
+            id2label = json.load(f).get("id2label") or {}
+        return [id2label[k] for k in sorted(id2label, key=int)] or None
+
+    def predict_probabilities(self, texts: List) -> Tuple[np.ndarray, LabelMap]:
+        if not self.text_input:
+            return super().predict_probabilities(texts)
+        outputs = self._run_text(texts)
+        with stage("postprocess", self.model_version, len(texts)):
+            probs = self._text_probabilities(outputs)
+        return probs, self.label_map(probs.shape[1])
+
+    def predict_batch(self, texts: List) -> List[dict]:
+        if not self.text_input:
+            return super().predict_batch(texts)
+        outputs = self._run_text(texts)
+        with stage("postprocess", self.model_version, len(texts)):
+            probs = self._text_probabilities(outputs)
+            return postprocess(probs, self.label_map(probs.shape[1]))
+
+    def _run_text(self, texts: List[str]) -> list:
+        # Raw-text models tokenize inside the graph, so there is no tokenize stage
+        feeds = {self.input_names[0]: np.array(texts, dtype=object).reshape(-1, 1)}
+        with stage("forward", self.model_version, len(texts)):
+            return self.session.run(None, feeds)
+
+    def _text_probabilities(self, outputs: list) -> np.ndarray:
+        for output in outputs:
+            if isinstance(output, np.ndarray) and output.ndim == 2 and output.dtype.kind == "f":
+                return output
+        # ZipMap output: one {class: probability} dict per row
+        probabilities = outputs[-1]
+        return np.array([[row[k] for k in sorted(row)] for row in probabilities], dtype=np.float32)
+
+    def forward(self, feeds: Dict[str, np.ndarray]) -> np.ndarray:
+        return self.session.run([self.output_name], feeds)[0]
+
+    def _run_chunk(self, encoded, indices: List[int], padded_length: int, pad_id: int) -> np.ndarray:
+        if not settings.ONNX_USE_IO_BINDING:
+            return super()._run_chunk(encoded, indices, padded_length, pad_id)
+
+        # Pad straight into the preallocated buffers and bind them
+        with self._lock:
+            feeds = self._pad(encoded, indices, padded_length, pad_id, allocate=self._input_view)
+            return self._run_with_binding(feeds, len(indices))
+
+    def _input_view(self, name: str, n: int, seq_len: int) -> np.ndarray:
+        size = n * seq_len
+        buffer = self._input_buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(_next_power_of_two(size), dtype=np.int64)
+            self._input_buffers[name] = buffer
+        return buffer[:size].reshape(n, seq_len)
+
+    def _output_view(self, n: int) -> np.ndarray:
+        size = n * self.num_labels
+        if self._output_buffer is None or self._output_buffer.size < size:
+            self._output_buffer = np.empty(_next_power_of_two(size), dtype=np.float32)
+        return self._output_buffer[:size].reshape(n, self.num_labels)
+
+    def _run_with_binding(self, feeds: Dict[str, np.ndarray], n: int) -> np.ndarray:
+        """Run with inputs/outputs bound to buffers; caller holds self._lock"""
+        binding = self._binding
+        binding.clear_binding_inputs()
+        binding.clear_binding_outputs()
+        for name, values in feeds.items():
+            binding.bind_cpu_input(name, values)
+
+        if self.num_labels is None:
+            binding.bind_output(self.output_name, "cpu")
+            self.session.run_with_iobinding(binding)
+            return binding.copy_outputs_to_cpu()[0]
+
+        output = self._output_view(n)
+        binding.bind_output(
+            self.output_name, "cpu", 0, np.float32, list(output.shape), output.ctypes.data
+        )
+        self.session.run_with_iobinding(binding)
+        return output.copy()
+
+
+def create_backend(model_version: str, spec: dict, backend: str):
+    """Instantiate the serving backend for a model version"""
+    if backend == "onnx":
+        return OnnxBackend(model_version, spec)
+    return TransformersBackend(model_version, spec)
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.metrics import INFERENCE_BATCH_SIZE, BATCH_QUEUE_WAIT, DEADLINE_SKIPPED
+from app.core import tracing
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.executor import inference_executor
+import structlog
+
+logger = structlog.get_logger()
+
+
+class BatchScheduler:
+    """
+    Coalesces texts from concurrent requests for one model into batched
+    forward passes, bounded by max batch size and max queue wait. Up to
+    max_concurrent batches run at once; while all are busy, waiting texts
+    keep joining the next batch.
+    """
+
+    def __init__(self, model_version: str, run_batch: Callable[[str, List[str]], List[Any]],
+                 max_batch_size: int, max_wait_ms: float, max_concurrent: int = 1):
+        self.model_version = model_version
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = asyncio.Queue()
+        self._worker = None
+        self._slots = asyncio.Semaphore(max(1, max_concurrent))
+        self._running: Set[asyncio.Task] = set()
+
+    async def submit(self, texts: List[str], deadlines: Optional[List[Optional[Deadline]]] = None) -> List[Any]:
+        """
+        Enqueue texts and wait for their predictions. Failed items are
+        returned as exception instances in place of a prediction; items whose
+        deadline passes before their batch runs fail with DeadlineExceeded.
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        # The batch span links back to each request's span
+        span_context = tracing.current_span_context()
+        for i, text in enumerate(texts):
+            future = loop.create_future()
+            deadline = deadlines[i] if deadlines else None
+            self._queue.put_nowait((text, future, time.perf_counter(), deadline, span_context))
+            futures.append(future)
+
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = [await self._queue.get()]
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = loop.create_task(self._execute(batch))
+            self._running.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def stop(self):
+        """Stop forming batches and wait for the ones already running"""
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _execute(self, batch):
+        # Drop items whose caller has already gone away or whose deadline has
+        # passed, before they cost tokenization or a forward pass
+        live = []
+        skipped = 0
+        for item in batch:
+            future, deadline = item[1], item[3]
+            if future.done():
+                continue
+            if deadline is not None and deadline.expired():
+                future.set_exception(DeadlineExceeded())
+                skipped += 1
+                continue
+            live.append(item)
+        if skipped:
+            DEADLINE_SKIPPED.labels(model_version=self.model_version, stage="batch").inc(skipped)
+        batch = live
+        if not batch:
+            return
+
+        now = time.perf_counter()
+        INFERENCE_BATCH_SIZE.labels(model_version=self.model_version).observe(len(batch))
+
+        texts = [text for text, _, _, _, _ in batch]
+        try:
+            with tracing.batch_span(self.model_version, len(batch), [item[4] for item in batch]):
+                for _, _, enqueued_at, _, _ in batch:
+                    BATCH_QUEUE_WAIT.labels(model_version=self.model_version).observe(now - enqueued_at)
+                    tracing.record_stage("batch_wait", self.model_version, len(batch), now - enqueued_at)
+                predictions = await inference_executor.run(self.run_batch, self.model_version, texts)
+        except Exception as e:
+            logger.error("batch_inference_failed", model_version=self.model_version,
+                         batch_size=len(batch), error=str(e))
+            for _, future, _, _, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _, _, _), prediction in zip(batch, predictions):
+            if not future.done():
+                future.set_result(prediction)
+
+
+# One scheduler per model version
+_schedulers: Dict[str, BatchScheduler] = {}
+
+
+def get_scheduler(model_version: str, run_batch: Callable[[str, List[str]], List[Any]]) -> BatchScheduler:
+    """Get or create the batch scheduler for a model version"""
+    if model_version not in _schedulers:
+        _schedulers[model_version] = BatchScheduler(
+            model_version,
+            run_batch,
+            max_batch_size=settings.MAX_BATCH_SIZE,
+            max_wait_ms=settings.MAX_BATCH_WAIT_MS,
+            # Batches of one version can use every executor worker
+            max_concurrent=inference_executor.max_workers,
+        )
+    return _schedulers[model_version]
+
+
+async def stop_schedulers():
+    """Drain every scheduler's running batches, before the executor shuts down"""
+    await asyncio.gather(*(scheduler.stop() for scheduler in _schedulers.values()))
@@ -0,0 +1,30 @@
+from collections import defaultdict
+from typing import List, Sequence, Tuple
+
+
+def bucket_length(length: int, buckets: Sequence[int], max_length: int) -> int:
+    """Smallest configured bucket that fits the sequence, capped at max_length"""
+    for bucket in buckets:
+        if length <= bucket:
+            return min(bucket, max_length)
+    return max_length
+
+
+def plan_batches(lengths: Sequence[int], buckets: Sequence[int], max_tokens: int,
+                 max_length: int) -> List[Tuple[int, List[int]]]:
+    """
+    Group item indices into (padded_length, indices) forward passes.
+    Items are bucketed by token length and each pass is capped so that
+    len(indices) * padded_length stays within max_tokens.
+    """
+    groups = defaultdict(list)
+    for i, length in enumerate(lengths):
+        groups[bucket_length(length, buckets, max_length)].append(i)
+
+    batches = []
+    for padded_length in sorted(groups):
+        indices = groups[padded_length]
+        per_batch = max(1, max_tokens // padded_length)
+        for start in range(0, len(indices), per_batch):
+            batches.append((padded_length, indices[start:start + per_batch]))
+    return batches
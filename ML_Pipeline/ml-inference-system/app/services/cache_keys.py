@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import re
+from typing import Callable, List, Optional
+import structlog
+
+# Fast non-cryptographic digest when available; keys only need to be well distributed
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+logger = structlog.get_logger()
+
+# Pre-tokenizers that split on whitespace and drop it, so runs of whitespace
+# tokenize the same as a single space
+WHITESPACE_PRE_TOKENIZERS = {"BertPreTokenizer", "Whitespace", "WhitespaceSplit"}
+
+TOKENIZER_FILES = ("tokenizer.json", "tokenizer_config.json", "vocab.txt")
+
+# Unicode White_Space, what those pre-tokenizers split on. str.split() agrees
+# on ASCII except for \x1c-\x1f and is several times faster than the regex.
+WHITESPACE_RUN = re.compile("[\t\n\x0b\x0c\r \x85\xa0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+")
+ASCII_WHITESPACE = "\t\n\x0b\x0c\r "
+ASCII_SEPARATORS = ("\x1c", "\x1d", "\x1e", "\x1f")
+
+# BertNormalizer clean_text on ASCII: drop control characters, tabs and newlines become spaces
+ASCII_CLEAN_TEXT = {c: None for c in [*range(0, 9), 11, 12, *range(14, 32), 127]}
+ASCII_CLEAN_TEXT.update({9: " ", 10: " ", 13: " "})
+
+
+def text_digest(text: str) -> str:
+    if xxhash is not None:
+        return xxhash.xxh3_128_hexdigest(text.encode("utf-8"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _file_digest(path: str) -> str:
+    digest = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_fingerprint(spec: dict, backend: str) -> str:
+    """
+    Digest of what a version's predictions depend on: the ONNX artifact's
+    bytes (or the hub model id and revision), the backend, and the label map.
+    """
+    parts = [backend, json.dumps([spec.get("labels"), spec.get("classes")])]
+    path = spec.get("path")
+    if backend == "onnx" and path and os.path.exists(path):
+        parts.append(_file_digest(path))
+        config_path = os.path.join(os.path.dirname(path), "config.json")
+        if os.path.exists(config_path):
+            parts.append(_file_digest(config_path))
+    else:
+        parts += [spec.get("model_id", ""), spec.get("revision") or ""]
+    return text_digest("\n".join(parts))[:16]
+
+
+def _ascii_steps(config: Optional[dict]) -> Optional[List[Callable[[str], str]]]:
+    """
+    Pure Python equivalent of a tokenizer normalizer for ASCII input, or None
+    if it has steps without one. Unicode forms and accent stripping leave
+    ASCII unchanged.
+    """
+    if config is None:
+        return []
+    kind = config.get("type")
+    if kind == "Sequence":
+        steps = []
+        for child in config.get("normalizers", []):
+            child_steps = _ascii_steps(child)
+            if child_steps is None:
+                return None
+            steps += child_steps
+        return steps
+    if kind in ("NFC", "NFD", "NFKC", "NFKD", "StripAccents"):
+        return []
+    if kind == "Lowercase":
+        return [str.lower]
+    if kind == "Strip":
+        left, right = config.get("strip_left", True), config.get("strip_right", True)
+        return [lambda text: text.lstrip(ASCII_WHITESPACE) if left else text,
+                lambda text: text.rstrip(ASCII_WHITESPACE) if right else text]
+    if kind == "BertNormalizer":
+        steps = [lambda text: text.translate(ASCII_CLEAN_TEXT)] if config.get("clean_text", True) else []
+        return steps + ([str.lower] if config.get("lowercase", True) else [])
+    return None
+
+
+def load_normalizer(spec: dict, backend: str) -> Optional[Callable[[str], str]]:
+    """
+    The tokenizer's own normalization (e.g. NFKC and lowercasing), plus
+    whitespace collapsing where the pre-tokenizer discards whitespace. None
+    for raw-text models and tokenizers without a fast backend.
+    """
+    if backend == "onnx":
+        source = os.path.dirname(spec.get("path") or "")
+        if not any(os.path.exists(os.path.join(source, name)) for name in TOKENIZER_FILES):
+            return None
+    else:
+        source = spec.get("model_id")
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(source)
+    except Exception as e:
+        logger.warn("cache_normalizer_unavailable", source=source, error=str(e))
+        return None
+    backend_tokenizer = getattr(tokenizer, "backend_tokenizer", None)
+    if backend_tokenizer is None:
+        return None
+    normalizer = backend_tokenizer.normalizer
+    # Calling into the tokenizer costs ~15us per text, most of it binding overhead
+    ascii_steps = _ascii_steps(json.loads(backend_tokenizer.to_str())["normalizer"])
+    collapse = type(backend_tokenizer.pre_tokenizer).__name__ in WHITESPACE_PRE_TOKENIZERS
+
+    def normalize(text: str) -> str:
+        is_ascii = text.isascii()
+        if ascii_steps is not None and is_ascii:
+            for step in ascii_steps:
+                text = step(text)
+        elif normalizer is not None:
+            text = normalizer.normalize_str(text)
+        if not collapse:
+            return text
+        if is_ascii and not any(separator in text for separator in ASCII_SEPARATORS):
+            return " ".join(text.split())
+        return WHITESPACE_RUN.sub(" ", text).strip(" ")
+    return normalize
+
+
+class KeySpace:
+    """
+    Cache keys of one model version:
+    pred:{version}:{fingerprint}:{generation}:{digest of normalized text}.
+    A new artifact changes the fingerprint and an invalidation bumps the
+    generation, so stale entries are never read again and expire by TTL.
+    """
+
+    def __init__(self, version: str, fingerprint: str, normalize: Optional[Callable[[str], str]],
+                 value_format: str):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.normalize = normalize
+        self.value_format = value_format
+        self.generation = 0
+        self.generation_checked_at = float("-inf")
+
+    @property
+    def generation_key(self) -> str:
+        return f"pred-generation:{self.version}"
+
+    def keys(self, texts: List[str]) -> List[str]:
+        prefix = f"pred:{self.version}:{self.value_format}{self.fingerprint}:{self.generation}:"
+        normalize = self.normalize
+        if normalize is None:
+            return [prefix + text_digest(text) for text in texts]
+        return [prefix + text_digest(normalize(text)) for text in texts]
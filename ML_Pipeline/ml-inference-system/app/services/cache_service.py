@@ -1,53 +1,365 @@
+import asyncio
+import json
+import time
 import redis.asyncio as redis
 from app.core.config import settings
-from app.core.metrics import CACHE_HITS, CACHE_MISSES
-import hashlib
-import json
+from app.core.metrics import (
+    CACHE_HITS, CACHE_MISSES,
+    L1_CACHE_HITS, L1_CACHE_MISSES,
+    L2_CACHE_HITS, L2_CACHE_MISSES,
+    REDIS_OPERATION_LATENCY, REDIS_OPERATION_FAILURES, REDIS_OPERATIONS_SKIPPED,
+    REDIS_CIRCUIT_OPEN, REDIS_CIRCUIT_TRANSITIONS,
+)
+from app.services.cache_keys import KeySpace, artifact_fingerprint, load_normalizer
+from app.services.circuit_breaker import CircuitBreaker, OPEN
+from app.services.local_cache import LocalCache
+from app.services.model_registry import model_registry
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 import structlog
 
+# In requirements.txt; without it values are stored as JSON under separate keys
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 logger = structlog.get_logger()
 
+# Stored positionally; the input text is not stored, callers add their own
+VALUE_FIELDS = ("label", "confidence", "class", "raw_label", "probabilities")
+VALUE_FORMAT = "m" if msgpack is not None else "j"
+
+
+def encode_value(result: dict) -> bytes:
+    values = [result.get(field) for field in VALUE_FIELDS]
+    if msgpack is not None:
+        # Scores come out of the model as float32, so packing them as float32 loses nothing
+        return msgpack.packb(values, use_single_float=True)
+    return json.dumps(values, separators=(",", ":")).encode()
+
+
+def decode_value(raw: bytes) -> dict:
+    values = msgpack.unpackb(raw) if msgpack is not None else json.loads(raw)
+    return {field: value for field, value in zip(VALUE_FIELDS, values) if value is not None}
+
+class RedisUnavailable(Exception):
+    """A Redis operation was skipped, timed out or failed; callers treat it as a miss"""
+
 class CacheService:
     def __init__(self):
         self.redis = None
+        # In-process L1 in front of Redis for hot keys
+        self.local = None
+        if settings.L1_CACHE_ENABLED:
+            self.local = LocalCache(
+                max_items=settings.L1_CACHE_MAX_ITEMS,
+                max_bytes=settings.L1_CACHE_MAX_MB * 1024 * 1024,
+                ttl=settings.L1_CACHE_TTL,
+            )
+        self._key_spaces: Dict[str, KeySpace] = {}
+        self._key_space_tasks: Dict[str, asyncio.Future] = {}
+        self.breaker = CircuitBreaker("redis", settings.REDIS_BREAKER_FAILURES, on_change=self._breaker_changed)
+        self._probe_task: Optional[asyncio.Task] = None
+        self._pending_writes: Set[asyncio.Task] = set()
+
+    @property
+    def read_timeout(self) -> float:
+        return settings.REDIS_LATENCY_BUDGET_MS / 1000
+
+    @property
+    def write_timeout(self) -> float:
+        return self.read_timeout * settings.REDIS_WRITE_BUDGET_FACTOR
+
+    @property
+    def probe_timeout(self) -> float:
+        # Probes are off the request path and may have to open a connection first
+        return max(settings.REDIS_BREAKER_PROBE_INTERVAL_S, self.write_timeout)
     
     async def connect(self):
+        """
+        Create the client over a bounded connection pool. If Redis is down
+        at startup the breaker opens, and the probe connects once it is up.
+        """
         try:
-            self.redis = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-            await self.redis.ping()
-            logger.info("connected_to_redis", url=settings.REDIS_URL)
+            pool = redis.BlockingConnectionPool.from_url(
+                settings.REDIS_URL,
+                max_connections=settings.REDIS_POOL_SIZE,
+                # Waiting for a free connection counts against the operation's budget
+                timeout=self.read_timeout,
+                socket_connect_timeout=self.probe_timeout,
+                socket_timeout=self.probe_timeout,
+            )
+            # Values are binary, so responses are not decoded
+            self.redis = redis.Redis.from_pool(pool)
         except Exception as e:
-            logger.error("redis_connection_failed", error=str(e))
+            logger.error("redis_client_failed", error=str(e))
             self.redis = None
+            return
+        if await self._ping() is not None:
+            logger.info("connected_to_redis", url=settings.REDIS_URL, pool_size=settings.REDIS_POOL_SIZE,
+                        budget_ms=settings.REDIS_LATENCY_BUDGET_MS)
+        else:
+            logger.error("redis_connection_failed", url=settings.REDIS_URL)
+            self.breaker.trip("unreachable at startup")
 
-    async def get_prediction(self, model_version: str, input_text: str):
-        if not self.redis:
-            return None
-        
-        key = self._generate_key(model_version, input_text)
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+        for task in list(self._pending_writes):
+            task.cancel()
+        if self.redis is not None:
+            try:
+                await self.redis.aclose()
+            except Exception as e:
+                logger.warn("redis_close_failed", error=str(e))
+
+    async def _call(self, operation: str, command: Callable[[], Awaitable], timeout: float):
+        """
+        Run one Redis command within its timeout, through the breaker. Raises
+        RedisUnavailable instead of waiting on a Redis that is slow or down.
+        """
+        if self.redis is None:
+            raise RedisUnavailable("redis is not configured")
+        if self.breaker.is_open:
+            REDIS_OPERATIONS_SKIPPED.labels(operation=operation, reason="circuit_open").inc()
+            raise RedisUnavailable("redis circuit is open")
+        start_time = time.perf_counter()
         try:
-            cached = await self.redis.get(key)
-            if cached:
-                CACHE_HITS.labels(model_version=model_version).inc()
-                return json.loads(cached)
-            CACHE_MISSES.labels(model_version=model_version).inc()
+            result = await asyncio.wait_for(command(), timeout)
+        except asyncio.TimeoutError:
+            self._record_failure(operation, "timeout", f"no reply within {timeout * 1000:.1f}ms")
+            raise RedisUnavailable(f"redis {operation} timed out")
         except Exception as e:
-            logger.warn("cache_get_failed", error=str(e))
-        return None
+            self._record_failure(operation, "error", str(e))
+            raise RedisUnavailable(str(e))
+        REDIS_OPERATION_LATENCY.labels(operation=operation).observe(time.perf_counter() - start_time)
+        self.breaker.record_success()
+        return result
+
+    def _record_failure(self, operation: str, reason: str, error: str):
+        REDIS_OPERATION_FAILURES.labels(operation=operation, reason=reason).inc()
+        logger.warn("redis_operation_failed", operation=operation, reason=reason, error=error)
+        self.breaker.record_failure(f"{operation} {reason}")
+
+    def _breaker_changed(self, state: str):
+        REDIS_CIRCUIT_OPEN.set(1 if state == OPEN else 0)
+        REDIS_CIRCUIT_TRANSITIONS.labels(state=state).inc()
+        if state == OPEN and (self._probe_task is None or self._probe_task.done()):
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe())
+
+    async def _ping(self) -> Optional[float]:
+        """Round trip time of a PING, or None if it failed"""
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.redis.ping(), self.probe_timeout)
+        except Exception:
+            return None
+        latency = time.perf_counter() - start_time
+        REDIS_OPERATION_LATENCY.labels(operation="ping").observe(latency)
+        return latency
+
+    async def _probe(self):
+        """
+        While the breaker is open, ping Redis in the background and close the
+        breaker after REDIS_BREAKER_PROBE_SUCCESSES consecutive pings within
+        the read budget. Requests never wait on this.
+        """
+        successes = 0
+        while self.breaker.is_open:
+            await asyncio.sleep(settings.REDIS_BREAKER_PROBE_INTERVAL_S)
+            latency = await self._ping()
+            successes = successes + 1 if latency is not None and latency <= self.read_timeout else 0
+            if successes >= settings.REDIS_BREAKER_PROBE_SUCCESSES:
+                self.breaker.close()
+
+    def _build_key_space(self, model_version: str) -> KeySpace:
+        spec = model_registry.get(model_version)
+        backend = model_registry.backend_for(model_version)
+        space = KeySpace(model_version, artifact_fingerprint(spec, backend), load_normalizer(spec, backend),
+                         VALUE_FORMAT)
+        logger.info("cache_key_space_ready", model_version=model_version, fingerprint=space.fingerprint,
+                    normalized=space.normalize is not None)
+        return space
+
+    def prepare(self, versions: List[str]):
+        """Start building key spaces ahead of the first request"""
+        for model_version in versions:
+            if model_version in model_registry.versions:
+                self._key_space_task(model_version)
+
+    def _key_space_task(self, model_version: str) -> asyncio.Future:
+        # Built once off the event loop: hashing the artifact and loading the tokenizer take a while
+        task = self._key_space_tasks.get(model_version)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = asyncio.ensure_future(loop.run_in_executor(None, self._build_key_space, model_version))
+            task.add_done_callback(lambda done: self._key_space_built(model_version, done))
+            self._key_space_tasks[model_version] = task
+        return task
 
-    async def set_prediction(self, model_version: str, input_text: str, result: dict, ttl: int = 3600):
-        if not self.redis:
+    def _key_space_built(self, model_version: str, task: asyncio.Future):
+        if not task.cancelled() and task.exception() is None:
+            self._key_spaces[model_version] = task.result()
             return
-        
-        key = self._generate_key(model_version, input_text)
+        # Retried on the next use
+        self._key_space_tasks.pop(model_version, None)
+        if not task.cancelled():
+            logger.warn("cache_key_space_failed", model_version=model_version, error=str(task.exception()))
+
+    async def key_space(self, model_version: str) -> KeySpace:
+        """The version's key space, waiting for it to be built if need be"""
+        space = self._key_spaces.get(model_version)
+        if space is None:
+            # Shielded so a caller's deadline does not cancel the build for everyone
+            space = await asyncio.shield(self._key_space_task(model_version))
+        await self._refresh_generation(space)
+        return space
+
+    def normalizer(self, model_version: str) -> Optional[Callable[[str], str]]:
+        """The version's cache key normalization once its key space is built, else None"""
+        space = self._key_spaces.get(model_version)
+        return space.normalize if space is not None else None
+
+    async def _ready_key_space(self, model_version: str) -> Optional[KeySpace]:
+        """
+        The key space if it is built. Otherwise the build is started and None
+        returned: going without the cache is faster than waiting for it.
+        """
+        space = self._key_spaces.get(model_version)
+        if space is None:
+            self._key_space_task(model_version)
+            return None
+        await self._refresh_generation(space)
+        return space
+
+    async def _refresh_generation(self, space: KeySpace):
+        # Re-read at most every CACHE_GENERATION_REFRESH_S; on failure the last known one is kept
+        now = time.monotonic()
+        if self.redis is None or now - space.generation_checked_at < settings.CACHE_GENERATION_REFRESH_S:
+            return
+        space.generation_checked_at = now
         try:
-            await self.redis.set(key, json.dumps(result), ex=ttl)
-        except Exception as e:
-            logger.warn("cache_set_failed", error=str(e))
+            generation = await self._call("get", lambda: self.redis.get(space.generation_key), self.read_timeout)
+            space.generation = int(generation or 0)
+        except RedisUnavailable:
+            pass
+
+    async def invalidate(self, model_version: str) -> int:
+        """
+        Drop every cached prediction of a version by bumping its generation:
+        one INCR, no key scan. Other workers pick the new generation up within
+        CACHE_GENERATION_REFRESH_S. Returns the new generation.
+        """
+        space = await self.key_space(model_version)
+        if self.redis is not None:
+            space.generation = int(
+                await self._call("incr", lambda: self.redis.incr(space.generation_key), self.write_timeout)
+            )
+        else:
+            space.generation += 1
+        space.generation_checked_at = time.monotonic()
+        logger.info("cache_invalidated", model_version=model_version, generation=space.generation)
+        return space.generation
+
+    async def get_prediction(self, model_version: str, input_text: str) -> Optional[dict]:
+        return (await self.get_predictions(model_version, [input_text]))[0]
+
+    async def set_prediction(self, model_version: str, input_text: str, result: dict, ttl: int = None):
+        await self.set_predictions(model_version, [(input_text, result)], ttl)
+
+    async def get_predictions(self, model_version: str, texts: List[str]) -> List[Optional[dict]]:
+        """
+        Look up every text, L1 first, then one MGET to Redis for the rest.
+        Misses are None. Hits carry no "text"; texts that normalize the same
+        share an entry.
+        """
+        if not texts:
+            return []
+        
+        space = await self._ready_key_space(model_version)
+        if space is None:
+            CACHE_MISSES.labels(model_version=model_version).inc(len(texts))
+            return [None] * len(texts)
+        keys = space.keys(texts)
+        results: List[Optional[dict]] = [None] * len(texts)
+        
+        l1_misses = []
+        for i, key in enumerate(keys):
+            if self.local is not None:
+                results[i] = self.local.get(model_version, key)
+            if results[i] is None:
+                l1_misses.append(i)
+        if self.local is not None:
+            l1_hits = len(keys) - len(l1_misses)
+            if l1_hits:
+                L1_CACHE_HITS.labels(model_version=model_version).inc(l1_hits)
+            if l1_misses:
+                L1_CACHE_MISSES.labels(model_version=model_version).inc(len(l1_misses))
+        
+        if l1_misses and self.redis is not None:
+            try:
+                values = await self._call("mget", lambda: self.redis.mget([keys[i] for i in l1_misses]),
+                                          self.read_timeout)
+            except RedisUnavailable:
+                values = [None] * len(l1_misses)
+            
+            l2_hits = 0
+            for i, value in zip(l1_misses, values):
+                if value:
+                    results[i] = decode_value(value)
+                    l2_hits += 1
+                    if self.local is not None:
+                        self.local.set(model_version, keys[i], results[i])
+            if l2_hits:
+                L2_CACHE_HITS.labels(model_version=model_version).inc(l2_hits)
+            if l2_hits < len(l1_misses):
+                L2_CACHE_MISSES.labels(model_version=model_version).inc(len(l1_misses) - l2_hits)
+        
+        hits = sum(1 for result in results if result is not None)
+        if hits:
+            CACHE_HITS.labels(model_version=model_version).inc(hits)
+        if hits < len(results):
+            CACHE_MISSES.labels(model_version=model_version).inc(len(results) - hits)
+        return results
+
+    async def set_predictions(self, model_version: str, items: List[Tuple[str, dict]], ttl: int = None):
+        """
+        Write (text, result) pairs to L1, and to Redis in one pipelined
+        SET ... EX round trip in the background, so requests never wait on it.
+        """
+        if not items:
+            return
+        
+        ttl = ttl or settings.REDIS_CACHE_TTL
+        space = await self._ready_key_space(model_version)
+        if space is None:
+            return
+        keys = space.keys([text for text, _ in items])
+        keyed = [(key, {k: v for k, v in result.items() if k in VALUE_FIELDS})
+                 for key, (_, result) in zip(keys, items)]
+        if self.local is not None:
+            for key, result in keyed:
+                self.local.set(model_version, key, result)
+        
+        if self.redis is None:
+            return
+        if len(self._pending_writes) >= settings.REDIS_MAX_PENDING_WRITES:
+            # Redis is not keeping up; dropping the write only costs a later miss
+            REDIS_OPERATIONS_SKIPPED.labels(operation="set", reason="write_backlog").inc()
+            return
+        task = asyncio.get_running_loop().create_task(self._write(keyed, ttl))
+        self._pending_writes.add(task)
+        task.add_done_callback(self._pending_writes.discard)
 
-    def _generate_key(self, version: str, text: str) -> str:
-        # Use MD5 for simple hashing of input text
-        h = hashlib.md5(text.encode()).hexdigest()
-        return f"pred:{version}:{h}"
+    async def _write(self, keyed: List[Tuple[str, dict]], ttl: int):
+        async def pipeline():
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, result in keyed:
+                    pipe.set(key, encode_value(result), ex=ttl)
+                await pipe.execute()
+        try:
+            await self._call("set", pipeline, self.write_timeout)
+        except RedisUnavailable:
+            pass
 
 cache_service = CacheService()
@@ -0,0 +1,346 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import select
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from app.core.metrics import (
+    INFERENCE_BATCH_SIZE, BATCH_QUEUE_WAIT, RING_SLOTS_USED, RING_HANDOFF_LATENCY, DEADLINE_SKIPPED,
+)
+from app.core.tracing import stage
+from app.services.backends import load_tokenizer, tokenizer_max_length
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.model_registry import model_registry
+from app.services.shm_ring import (
+    RingChannel, STATUS_OK, STATUS_ERROR, STATUS_EXPIRED, ENCODING_TEXT, ENCODING_TOKENS, ring_bell,
+    drain_bell, encode_texts, encoded_size, decode_texts, encode_tokens, encoded_tokens_size, decode_tokens,
+    encode_predictions, decode_predictions, max_prediction_items, worker_epoch,
+)
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+
+class CentralInferenceClient:
+    """
+    Front-end side of the central inference process (prefork mode with
+    CENTRAL_INFERENCE). Requests are written to this worker's request ring and
+    predictions come back on its response ring, so batches are formed across
+    all workers instead of per process. Texts for token-id models are
+    tokenized here, so the single inference process only runs forward passes;
+    raw-text models get the texts.
+    """
+
+    def __init__(self):
+        self.channel = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self.epoch = 0
+        self._reader_loop = None
+        # Version -> its tokenizer, or None to send raw text
+        self._tokenizers: Dict[str, Any] = {}
+        self._tokenizer_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.channel is not None
+
+    def attach(self, channel: RingChannel, generation: int):
+        """
+        Called in a forked worker before it starts serving. generation counts
+        the workers started on this channel; responses sent to an earlier
+        worker carry its epoch and are dropped.
+        """
+        self.channel = channel
+        self.epoch = worker_epoch(os.getpid(), generation)
+        self._pending.clear()
+        self._ids = itertools.count(1)
+        self._reader_loop = None
+
+    def _ensure_reader(self):
+        loop = asyncio.get_running_loop()
+        if self._reader_loop is not loop:
+            loop.add_reader(self.channel.response_bell[0], self._drain)
+            self._reader_loop = loop
+            # Clear out responses left for a previous worker in this slot
+            self._drain()
+
+    def _drain(self):
+        drain_bell(self.channel.response_bell[0])
+        ring = self.channel.responses
+        while True:
+            record = ring.peek()
+            if record is None:
+                break
+            header, payload = record
+            if int(header["epoch"]) != self.epoch:
+                # Answer to a previous worker's request on this slot
+                logger.debug("central_stale_response_dropped", request_id=int(header["request_id"]))
+                ring.advance()
+                continue
+            future = self._pending.pop(int(header["request_id"]), None)
+            if future is not None and not future.done():
+                RING_HANDOFF_LATENCY.labels(direction="response").observe(
+                    time.monotonic() - header["enqueued_at"]
+                )
+                if header["status"] == STATUS_OK:
+                    future.set_result(decode_predictions(payload, int(header["n_items"])))
+                elif header["status"] == STATUS_EXPIRED:
+                    future.set_exception(DeadlineExceeded())
+                else:
+                    future.set_exception(RuntimeError(payload.tobytes().decode("utf-8")))
+            ring.advance()
+
+    async def warm_up(self, model_version: str):
+        """
+        Wait until the inference process serves a version. It loads models
+        itself, so this only fails on an error other than a timeout.
+        """
+        while True:
+            prediction = (await self.submit(model_version, ["warmup"]))[0]
+            if not isinstance(prediction, TimeoutError):
+                break
+            logger.info("central_warmup_waiting", model_version=model_version)
+        if isinstance(prediction, Exception):
+            raise prediction
+
+    def _tokenizer(self, model_version: str):
+        """The version's tokenizer, loaded once and without the model; None for raw-text models"""
+        with self._tokenizer_lock:
+            if model_version not in self._tokenizers:
+                tokenizer = None
+                spec = model_registry.versions.get(model_version)
+                if spec is not None:
+                    try:
+                        tokenizer = load_tokenizer(spec, model_registry.backend_for(model_version))
+                    except Exception as e:
+                        # Send text; the inference process falls back as it would for any load failure
+                        logger.error("central_tokenizer_load_failed", model_version=model_version, error=str(e))
+                self._tokenizers[model_version] = tokenizer
+            return self._tokenizers[model_version]
+
+    def _tokenize(self, model_version: str, texts: List[str]) -> Optional[List[List[int]]]:
+        """Token ids per text, or None if the version takes raw text"""
+        tokenizer = self._tokenizer(model_version)
+        if tokenizer is None:
+            return None
+        with stage("tokenize", model_version, len(texts)):
+            return tokenizer(texts, truncation=True, max_length=tokenizer_max_length(tokenizer))["input_ids"]
+
+    def _split(self, sizes: List[int], size_of) -> List[List[int]]:
+        """Group item indices into records that fit one ring slot; size_of gives a record's payload size"""
+        limit = self.channel.requests.payload_bytes
+        max_items = max_prediction_items(self.channel.responses.payload_bytes)
+        records, current, current_sizes = [], [], []
+        for i, size in enumerate(sizes):
+            if current and (size_of(current_sizes + [size]) > limit or len(current) >= max_items):
+                records.append(current)
+                current, current_sizes = [], []
+            current.append(i)
+            current_sizes.append(size)
+        if current:
+            records.append(current)
+        return records
+
+    async def submit(self, model_version: str, texts: List[str],
+                     deadlines: Optional[List[Optional[Deadline]]] = None) -> List[Any]:
+        """
+        Same contract as BatchScheduler.submit: one prediction per text, with
+        failed items returned as exception instances.
+        """
+        self._ensure_reader()
+        loop = asyncio.get_running_loop()
+        results: List[Any] = [None] * len(texts)
+        waiting = []
+
+        # Tokenizing (and the first tokenizer load) blocks, so it runs off the event loop
+        rows = await loop.run_in_executor(None, contextvars.copy_context().run, self._tokenize,
+                                          model_version, texts)
+        if rows is None:
+            encoding = ENCODING_TEXT
+            records = self._split([len(text.encode("utf-8")) for text in texts], encoded_size)
+        else:
+            encoding = ENCODING_TOKENS
+            records = self._split([len(row) for row in rows], encoded_tokens_size)
+
+        for indices in records:
+            if rows is None:
+                parts = encode_texts([texts[i] for i in indices])
+            else:
+                parts = encode_tokens([rows[i] for i in indices])
+            if sum(part.nbytes for part in parts) > self.channel.requests.payload_bytes:
+                for i in indices:
+                    results[i] = ValueError("text is larger than an inference ring slot")
+                continue
+            # A record is only skipped once every item in it has expired
+            record_deadline = 0.0
+            if deadlines and all(deadlines[i] is not None and deadlines[i].at is not None for i in indices):
+                record_deadline = max(deadlines[i].at for i in indices)
+            request_id = next(self._ids)
+            future = loop.create_future()
+            self._pending[request_id] = future
+            while not self.channel.requests.write(request_id, model_version, STATUS_OK, len(indices), parts,
+                                                  record_deadline, self.epoch, encoding):
+                # Ring full: the inference process is behind, wait for it to catch up
+                await asyncio.sleep(0.001)
+            ring_bell(self.channel.request_bell[1])
+            waiting.append((indices, request_id, future))
+
+        if waiting:
+            await asyncio.wait([future for _, _, future in waiting],
+                               timeout=settings.CENTRAL_INFERENCE_TIMEOUT_S)
+
+        for indices, request_id, future in waiting:
+            if not future.done():
+                self._pending.pop(request_id, None)
+                future.cancel()
+                error = TimeoutError("central inference did not respond in time")
+                predictions = [error] * len(indices)
+            elif future.exception() is not None:
+                predictions = [future.exception()] * len(indices)
+            else:
+                predictions = future.result()
+            for i, prediction in zip(indices, predictions):
+                results[i] = prediction
+        return results
+
+
+class _Record(NamedTuple):
+    channel: RingChannel
+    request_id: int
+    epoch: int
+    items: List[Any]
+    enqueued_at: float
+    deadline: float
+
+
+def _respond(record: _Record, version: str, status: int, parts: List[np.ndarray], respond_by: float):
+    """
+    Write a record's response, waiting for room in the ring until respond_by.
+    The wait is shared by the whole batch, so a stuck worker costs the loop at
+    most CENTRAL_RESPONSE_WAIT_MS per batch; its request times out on its side.
+    """
+    channel = record.channel
+    while not channel.responses.write(record.request_id, version, status, len(record.items), parts,
+                                      epoch=record.epoch):
+        if time.monotonic() > respond_by:
+            logger.warn("central_response_dropped", request_id=record.request_id)
+            return
+        time.sleep(0.0005)
+    ring_bell(channel.response_bell[1])
+
+
+def _run_batch(version: str, records: List[_Record]):
+    from app.services.inference_engine import run_backend_probabilities
+
+    # Expired records are answered without costing a forward pass
+    now = time.monotonic()
+    respond_by = now + settings.CENTRAL_RESPONSE_WAIT_MS / 1000
+    live = []
+    for record in records:
+        if record.deadline and now >= record.deadline:
+            DEADLINE_SKIPPED.labels(model_version=version, stage="batch").inc(len(record.items))
+            _respond(record, version, STATUS_EXPIRED, [], respond_by)
+        else:
+            live.append(record)
+    records = live
+    if not records:
+        return
+
+    # Texts for raw-text models, 1-D token id arrays for the rest
+    items = [item for record in records for item in record.items]
+    now = time.monotonic()
+    for record in records:
+        BATCH_QUEUE_WAIT.labels(model_version=version).observe(now - record.enqueued_at)
+    INFERENCE_BATCH_SIZE.labels(model_version=version).observe(len(items))
+    try:
+        probs, label_map = run_backend_probabilities(version, items)
+    except Exception as e:
+        logger.error("batch_inference_failed", model_version=version, batch_size=len(items), error=str(e))
+        message = [np.frombuffer(str(e).encode("utf-8"), dtype=np.uint8)]
+        respond_by = time.monotonic() + settings.CENTRAL_RESPONSE_WAIT_MS / 1000
+        for record in records:
+            _respond(record, version, STATUS_ERROR, message, respond_by)
+        return
+
+    start = 0
+    respond_by = time.monotonic() + settings.CENTRAL_RESPONSE_WAIT_MS / 1000
+    for record in records:
+        end = start + len(record.items)
+        parts = encode_predictions(probs[start:end], label_map)
+        if sum(part.nbytes for part in parts) > record.channel.responses.payload_bytes:
+            message = [np.frombuffer(b"predictions are larger than an inference ring slot", dtype=np.uint8)]
+            _respond(record, version, STATUS_ERROR, message, respond_by)
+        else:
+            _respond(record, version, STATUS_OK, parts, respond_by)
+        start = end
+
+
+def serve_channels(channels: List[RingChannel]):
+    """
+    Main loop of the inference process: collect requests from every
+    worker's ring and run them in batches per model version, bounded by
+    MAX_BATCH_SIZE texts and MAX_BATCH_WAIT_MS since the oldest request.
+    """
+    max_batch_size = max(1, settings.MAX_BATCH_SIZE)
+    max_wait = max(0.0, settings.MAX_BATCH_WAIT_MS) / 1000
+    bells = [channel.request_bell[0] for channel in channels]
+    pending: Dict[str, List[_Record]] = defaultdict(list)
+    logger.info("central_inference_started", workers=len(channels))
+
+    while True:
+        timeout = None
+        if pending:
+            oldest = min(records[0].enqueued_at for records in pending.values())
+            timeout = max(0.0, oldest + max_wait - time.monotonic())
+        readable, _, _ = select.select(bells, [], [], timeout)
+        for fd in readable:
+            drain_bell(fd)
+
+        # Poll every ring: doorbells coalesce, so one byte can stand for many slots
+        for channel in channels:
+            while True:
+                record = channel.requests.peek()
+                if record is None:
+                    break
+                header, payload = record
+                RING_HANDOFF_LATENCY.labels(direction="request").observe(
+                    time.monotonic() - header["enqueued_at"]
+                )
+                version = header["version"].decode()
+                n_items = int(header["n_items"])
+                if header["encoding"] == ENCODING_TOKENS:
+                    items = decode_tokens(payload, n_items)
+                else:
+                    items = decode_texts(payload, n_items)
+                pending[version].append(_Record(
+                    channel, int(header["request_id"]), int(header["epoch"]), items,
+                    float(header["enqueued_at"]), float(header["deadline"]),
+                ))
+                channel.requests.advance()
+        RING_SLOTS_USED.labels(ring="request").set(sum(len(c.requests) for c in channels))
+        RING_SLOTS_USED.labels(ring="response").set(sum(len(c.responses) for c in channels))
+
+        now = time.monotonic()
+        for version in list(pending):
+            records = pending[version]
+            while records:
+                total = sum(len(record.items) for record in records)
+                if total < max_batch_size and now - records[0].enqueued_at < max_wait:
+                    break
+                batch, size = [], 0
+                while records and (not batch or size + len(records[0].items) <= max_batch_size):
+                    record = records.pop(0)
+                    batch.append(record)
+                    size += len(record.items)
+                _run_batch(version, batch)
+            if not records:
+                del pending[version]
+
+
+central_client = CentralInferenceClient()
@@ -0,0 +1,62 @@
+import time
+from typing import Callable, Optional
+import structlog
+
+logger = structlog.get_logger()
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures (errors or calls
+    over their time budget) so callers stop waiting on a dependency that is
+    down or slow. Whoever owns the breaker probes the dependency while it is
+    open and calls close() once it is healthy again. Only used from the
+    event loop.
+    """
+
+    def __init__(self, name: str, failure_threshold: int,
+                 on_change: Optional[Callable[[str], None]] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.on_change = on_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == OPEN
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self, reason: str) -> bool:
+        """Count a failure; True if it opened the breaker"""
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self.trip(reason)
+            return True
+        return False
+
+    def trip(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        logger.warn("circuit_opened", breaker=self.name, reason=reason, failures=self.failures)
+        self._changed()
+
+    def close(self):
+        if self.state == CLOSED:
+            return
+        logger.info("circuit_closed", breaker=self.name,
+                    open_seconds=round(time.monotonic() - (self.opened_at or time.monotonic()), 3))
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self.state)
@@ -0,0 +1,56 @@
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    message = "deadline exceeded"
+
+    def __init__(self, message: str = message):
+        super().__init__(message)
+
+
+class Deadline:
+    """
+    Absolute time.monotonic() deadline for a piece of work, or None for no
+    deadline. Work coalesced from several requests shares one Deadline that
+    is extended to the latest of theirs, so it is only skipped once nobody
+    is waiting for it.
+    """
+
+    __slots__ = ("at",)
+
+    def __init__(self, at: Optional[float] = None):
+        self.at = at
+
+    @classmethod
+    def from_budget_ms(cls, budget_ms: Optional[float]) -> Optional["Deadline"]:
+        if budget_ms is None:
+            return None
+        return cls(time.monotonic() + budget_ms / 1000)
+
+    def remaining(self) -> Optional[float]:
+        if self.at is None:
+            return None
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self, now: Optional[float] = None) -> bool:
+        if self.at is None:
+            return False
+        return (time.monotonic() if now is None else now) >= self.at
+
+    def extend(self, other: Optional["Deadline"]):
+        """Keep the work alive for as long as the other waiter needs it"""
+        if self.at is None:
+            return
+        if other is None or other.at is None:
+            self.at = None
+        else:
+            self.at = max(self.at, other.at)
+
+
+def remaining(deadline: Optional[Deadline]) -> Optional[float]:
+    return deadline.remaining() if deadline is not None else None
+
+
+def expired(deadline: Optional[Deadline]) -> bool:
+    return deadline is not None and deadline.expired()
@@ -0,0 +1,158 @@
+import asyncio
+import contextvars
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import EXECUTOR_QUEUE_DEPTH, EXECUTOR_ACTIVE_WORKERS, EXECUTOR_OCCUPANCY
+from app.core.tracing import buffer_stages, drain_stages, record_stage
+import structlog
+
+logger = structlog.get_logger()
+
+
+# Longest a process worker waits at the barrier for the others to start
+BARRIER_TIMEOUT_S = 600
+
+# Set in each process worker: shared by every worker of the pool
+_barrier = None
+
+
+def _init_process_worker(init: Optional[Callable[[int], None]], max_workers: int, barrier):
+    global _barrier
+    _barrier = barrier
+    # Metrics recorded in a worker process are never exported; stages go back with each result
+    buffer_stages()
+    if init is not None:
+        init(max_workers)
+
+
+def _call_at_barrier(fn: Callable[..., Any], *args) -> Any:
+    """
+    Run fn, then wait until every worker has run it. A worker blocked here
+    takes no other call, so max_workers of these land on distinct workers.
+    """
+    try:
+        return fn(*args)
+    finally:
+        _barrier.wait(BARRIER_TIMEOUT_S)
+
+
+def _call_reporting(collect: Optional[Callable[[], Any]], fn: Callable[..., Any], *args) -> Tuple:
+    """Run fn in a process worker; returns (ok, result or exception, stages, report)"""
+    try:
+        ok, value = True, fn(*args)
+    except Exception as e:
+        ok, value = False, e
+    return ok, value, drain_stages(), collect() if collect is not None else None
+
+
+class InferenceExecutor:
+    """
+    Dedicated pool that runs blocking model work so the event loop only
+    handles I/O. Backed by threads or processes depending on settings.
+
+    Process workers return their stage timings and a report (see
+    set_process_hooks) with every result, and both are recorded here, in the
+    process that exports metrics.
+    """
+
+    def __init__(self):
+        self._pool: Optional[Executor] = None
+        # Created on first use, inside the serving event loop
+        self._each_worker_lock: Optional[asyncio.Lock] = None
+        self.kind = "process" if settings.INFERENCE_EXECUTOR.lower() == "process" else "thread"
+        if self.kind == "process":
+            self.max_workers = max(1, settings.INFERENCE_PROCESS_WORKERS)
+        else:
+            self.max_workers = max(1, settings.INFERENCE_THREAD_WORKERS)
+        self._in_flight = 0
+        self._worker_init: Optional[Callable[[int], None]] = None
+        self._collect_report: Optional[Callable[[], Any]] = None
+        self._apply_report: Optional[Callable[[Any], None]] = None
+
+    def set_process_hooks(self, init: Callable[[int], None], collect: Callable[[], Any],
+                          apply: Callable[[Any], None]):
+        """
+        For the process pool: init(max_workers) runs in each worker as it
+        starts, collect() in the worker after every call, and apply() here
+        with what collect returned. init and collect must be module-level
+        functions so they can be pickled.
+        """
+        self._worker_init = init
+        self._collect_report = collect
+        self._apply_report = apply
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                # Spawn rather than fork: this process may already run torch/ORT thread
+                # pools, and forking after they started can deadlock (see app/prefork.py)
+                context = multiprocessing.get_context("spawn")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_process_worker,
+                    initargs=(self._worker_init, self.max_workers, context.Barrier(self.max_workers)),
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inference",
+                )
+            logger.info("inference_executor_started", kind=self.kind, workers=self.max_workers)
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) in the pool and await its result"""
+        pool = self._get_pool()
+        loop = asyncio.get_running_loop()
+        self._in_flight += 1
+        self._report()
+        try:
+            if self.kind == "thread":
+                # Carry the current trace context into the worker thread
+                return await loop.run_in_executor(pool, contextvars.copy_context().run, fn, *args)
+            ok, value, stages, report = await loop.run_in_executor(
+                pool, _call_reporting, self._collect_report, fn, *args
+            )
+            for stage in stages:
+                record_stage(*stage)
+            if report is not None and self._apply_report is not None:
+                self._apply_report(report)
+            if not ok:
+                raise value
+            return value
+        finally:
+            self._in_flight -= 1
+            self._report()
+
+    async def run_on_each_worker(self, fn: Callable[..., Any], *args) -> List[Any]:
+        """
+        Run fn(*args) once in every process worker, starting any not yet
+        running, and return their results. Thread workers share this
+        process's state, so for them it runs once.
+        """
+        if self.kind == "thread":
+            return [await self.run(fn, *args)]
+        # One round at a time, or two rounds could share the barrier
+        if self._each_worker_lock is None:
+            self._each_worker_lock = asyncio.Lock()
+        async with self._each_worker_lock:
+            return await asyncio.gather(*[self.run(_call_at_barrier, fn, *args)
+                                          for _ in range(self.max_workers)])
+
+    def _report(self):
+        active = min(self._in_flight, self.max_workers)
+        EXECUTOR_ACTIVE_WORKERS.labels(pool=self.kind).set(active)
+        EXECUTOR_QUEUE_DEPTH.labels(pool=self.kind).set(self._in_flight - active)
+        EXECUTOR_OCCUPANCY.labels(pool=self.kind).set(active / self.max_workers)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            logger.info("inference_executor_stopped", kind=self.kind)
+
+
+inference_executor = InferenceExecutor()
@@ -1,132 +1,409 @@
 import asyncio
+import contextlib
+import os
 import time
-from typing import List
-from app.services.model_loader import model_loader
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from app.services.model_registry import model_registry, UnknownModelVersion
+from app.services.backends import create_backend
+from app.services.model_residency import ModelResidencyManager, WorkerResidency
 from app.services.cache_service import cache_service
-from app.schemas import PredictionRequest, PredictionResponse
-from app.core.metrics import MODEL_INFERENCE_TIME, REQUEST_LATENCY
+from app.services.batcher import get_scheduler
+from app.services.central_inference import central_client
+from app.services.single_flight import single_flight
+from app.services.executor import inference_executor
+from app.services.router import model_router, shadow_runner
+from app.services.admission import admission_controller, Overloaded
+from app.services.postprocessing import select_fields
+from app.services.deadlines import Deadline, DeadlineExceeded, expired, remaining
+from app.core.config import settings
+from app.core.tracing import stage, record_stage
+from app.schemas import PredictionRequest, PredictionResponse, TokenPredictionRequest
+from app.core.metrics import (
+    MODEL_INFERENCE_TIME, REQUEST_LATENCY, MODEL_LOAD_TIME, ACTIVE_MODELS, VERSION_LATENCY,
+    DEADLINE_SKIPPED,
+)
 import structlog
-from transformers import pipeline
 
 logger = structlog.get_logger()
 
-# Cache for sentiment pipelines
-_pipelines = {}
-
-MODELS = {
-    "v1": {
-        "name": "DistilBERT SST-2",
-        "model_id": "distilbert-base-uncased-finetuned-sst-2-english"
-    },
-    "v2": {
-        "name": "RoBERTa Twitter",
-        "model_id": "cardiffnlp/twitter-roberta-base-sentiment"
-    },
-    "v3": {
-        "name": "NLPTown Multilingual Sentiment",
-        "model_id": "nlptown/bert-base-multilingual-uncased-sentiment",
-        "notes": "Multilingual sentiment model (NLPTown)"
-    },
-    "v4": {
-        "name": "TinyBERT",
-        "model_id": "huawei-noah/TinyBERT_General_4L_312D"
-    },
-    "v5": {
-        "name": "BERT Base Multilingual",
-        "model_id": "bert-base-multilingual-cased"
-    }
-}
-
-def get_pipeline(model_version: str):
-    """Get or create a sentiment analysis pipeline for the model version"""
-    if model_version not in MODELS:
-        model_version = "v1"  # Default to v1
-    
-    if model_version not in _pipelines:
-        model_id = MODELS[model_version]["model_id"]
+# Served model versions, resolved from model_registry.yaml
+MODELS = model_registry.versions
+
+def _create_backend(model_version: str):
+    spec = MODELS[model_version]
+    backend_name = model_registry.backend_for(model_version)
+    start_time = time.time()
+    backend = create_backend(model_version, spec, backend_name)
+    duration = time.time() - start_time
+    MODEL_LOAD_TIME.labels(model_name="sentiment", model_version=model_version).set(duration)
+    ACTIVE_MODELS.labels(model_name="sentiment", version=model_version).set(1)
+    logger.info("backend_loaded", model_version=model_version, backend=backend_name,
+                model_id=spec.get("model_id"), duration=duration)
+    return backend
+
+# Loaded backends, kept within MODEL_MEMORY_BUDGET_MB
+model_residency = ModelResidencyManager(
+    _create_backend,
+    budget_bytes=settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024,
+    pinned=settings.PINNED_MODEL_VERSIONS,
+)
+
+def _init_process_worker(workers: int):
+    """
+    Process executor worker: each holds its own models, so each gets a share
+    of the budget, and warms the preloaded versions before taking traffic
+    """
+    model_residency.set_budget(settings.MODEL_MEMORY_BUDGET_MB * 1024 * 1024 // workers)
+    warm_versions(settings.PRELOAD_MODEL_VERSIONS)
+
+def residency_report() -> dict:
+    """Sent back by process executor workers with every result"""
+    return {"pid": os.getpid(), "resident": model_residency.snapshot()}
+
+# With the process executor, models live in its workers; this is what they last reported
+worker_residency = WorkerResidency()
+inference_executor.set_process_hooks(_init_process_worker, residency_report, worker_residency.apply)
+
+def acquire_backend(model_version: str) -> Tuple[str, object]:
+    """
+    Get the backend for a version and mark it in use so it cannot be
+    evicted. Falls back to the default version if it fails to load.
+    Callers must release_backend() the returned version.
+    """
+    model_version = model_registry.resolve(model_version)
+    try:
+        return model_version, model_residency.acquire(model_version)
+    except Exception as e:
+        logger.error("backend_load_failed", model_version=model_version, error=str(e))
+        # Fallback to the default version
+        if model_version != model_registry.default_version:
+            return acquire_backend(model_registry.default_version)
+        raise
+
+def release_backend(model_version: str):
+    model_residency.release(model_version)
+
+def run_backend_batch(model_version: str, texts: List[str]) -> List[dict]:
+    """Run a single batched forward pass for the given texts"""
+    served_version, backend = acquire_backend(model_version)
+    try:
+        return backend.predict_batch(texts)
+    finally:
+        release_backend(served_version)
+
+def run_backend_probabilities(model_version: str, texts: List[str]) -> Tuple[np.ndarray, object]:
+    """Like run_backend_batch, but returns the probability matrix and label map"""
+    served_version, backend = acquire_backend(model_version)
+    try:
+        if served_version != model_version and not all(isinstance(text, str) for text in texts):
+            # Token ids from the requested version's tokenizer mean nothing to the fallback model
+            raise RuntimeError(f"model {model_version} failed to load")
+        return backend.predict_probabilities(texts)
+    finally:
+        release_backend(served_version)
+
+def load_and_warm(model_version: str):
+    """
+    Load a version's backend and run warmup batches across representative
+    sequence lengths. Raises if the version itself cannot be served.
+    """
+    served_version, backend = acquire_backend(model_version)
+    try:
+        if served_version != model_version:
+            raise RuntimeError(f"model {model_version} failed to load")
+        
+        for length in settings.WARMUP_SEQUENCE_LENGTHS:
+            text = " ".join(["warmup"] * length)
+            backend.predict_batch([text] * settings.WARMUP_BATCH_SIZE)
+        logger.info("model_warmed_up", model_version=model_version)
+    finally:
+        release_backend(served_version)
+
+# Version -> "warm" or "failed" in this process, from warm_versions()
+_warm_states: Dict[str, str] = {}
+
+def warm_versions(versions: List[str]) -> Dict[str, str]:
+    """load_and_warm each version not yet warm in this process; returns every version's state"""
+    for version in versions:
+        if _warm_states.get(version) == "warm":
+            continue
         try:
-            _pipelines[model_version] = pipeline(
-                "sentiment-analysis",
-                model=model_id,
-                device=-1  # CPU
-            )
-            logger.info("pipeline_loaded", model_version=model_version, model_id=model_id)
+            load_and_warm(version)
+            _warm_states[version] = "warm"
         except Exception as e:
-            logger.error("pipeline_load_failed", model_version=model_version, error=str(e))
-            # Fallback to v1
-            if model_version != "v1":
-                return get_pipeline("v1")
-            raise
-    
-    return _pipelines[model_version]
+            logger.error("model_warmup_failed", model_version=version, error=str(e))
+            _warm_states[version] = "failed"
+    return {version: _warm_states[version] for version in versions}
+
+def token_input_info(model_version: str) -> Optional[dict]:
+    """Token input details for a version, or None if it only takes raw text"""
+    served_version, backend = acquire_backend(model_version)
+    try:
+        if served_version != model_version or not getattr(backend, "accepts_token_ids", False):
+            return None
+        return backend.token_input_info()
+    finally:
+        release_backend(served_version)
+
+def loaded_versions() -> List[str]:
+    if inference_executor.kind == "process":
+        return worker_residency.resident_versions()
+    return model_residency.resident_versions()
+
+def build_result(text: str, prediction) -> dict:
+    """Map a backend prediction (or the exception raised for it) to a result item"""
+    try:
+        if isinstance(prediction, Exception):
+            raise prediction
+        # Label, class and probabilities come from the version's registry label map
+        return {"text": text, **prediction}
+    except Exception as e:
+        if not isinstance(e, DeadlineExceeded):
+            logger.error("text_prediction_failed", text=text, error=str(e))
+        return {
+            "text": text,
+            "label": 0,
+            "confidence": 0.0,
+            "class": "unknown",
+            "error": str(e)
+        }
+
+@contextlib.asynccontextmanager
+async def _not_admitted():
+    # Bypasses admission control; contextlib.nullcontext only supports async with from Python 3.10
+    yield
 
 class InferenceEngine:
+    def __init__(self):
+        # Preloaded version -> "loading", "warm" or "failed"
+        self.model_states: Dict[str, str] = {}
+        self.warmup_done = False
+
+    async def warm_up(self, versions: List[str]):
+        """Load and warm the given versions in parallel on the inference executor"""
+        versions = [v for v in versions if v in MODELS]
+        self.model_states = {v: "loading" for v in versions}
+        if inference_executor.kind == "process" and not central_client.enabled:
+            await self._warm_process_workers(versions)
+            return
+        
+        async def _warm(version: str):
+            try:
+                if central_client.enabled:
+                    # Models are loaded and run by the inference process, not this worker
+                    await central_client.warm_up(version)
+                else:
+                    await inference_executor.run(load_and_warm, version)
+                self.model_states[version] = "warm"
+            except Exception as e:
+                logger.error("model_warmup_failed", model_version=version, error=str(e))
+                self.model_states[version] = "failed"
+        
+        await asyncio.gather(*[_warm(v) for v in versions])
+        self.warmup_done = True
+        logger.info("warmup_complete", models=self.model_states)
+
+    async def _warm_process_workers(self, versions: List[str]):
+        """Every process worker loads its own models: a version is warm once it is warm in all of them"""
+        try:
+            reports = await inference_executor.run_on_each_worker(warm_versions, versions)
+            for version in versions:
+                warm = all(report[version] == "warm" for report in reports)
+                self.model_states[version] = "warm" if warm else "failed"
+        except Exception as e:
+            logger.error("model_warmup_failed", models=versions, error=str(e))
+            self.model_states = {v: "failed" for v in versions}
+        self.warmup_done = True
+        logger.info("warmup_complete", models=self.model_states)
+
+    def is_ready(self) -> bool:
+        """Ready once every preloaded version is warm"""
+        return self.warmup_done and all(state == "warm" for state in self.model_states.values())
+
+    async def _infer(self, served_version: str, texts: List[str],
+                     deadlines: Optional[List[Deadline]] = None) -> List[dict]:
+        """Run texts through the batcher and write successful results to the cache"""
+        if central_client.enabled:
+            # Batched together with other workers' traffic in the inference process
+            predictions = await central_client.submit(served_version, texts, deadlines)
+        else:
+            scheduler = get_scheduler(served_version, run_backend_batch)
+            predictions = await scheduler.submit(texts, deadlines)
+        results = [build_result(text, prediction) for text, prediction in zip(texts, predictions)]
+        
+        # One pipelined write for all new results
+        with stage("cache_write", served_version, len(texts)):
+            await cache_service.set_predictions(
+                served_version,
+                [(text, result) for text, result in zip(texts, results) if "error" not in result]
+            )
+        return results
+
+    async def _lookup(self, served_version: str, texts: List[str],
+                      deadline: Optional[Deadline]) -> List[Optional[dict]]:
+        """Cache lookup bounded by the deadline; a lookup that runs out of time counts as all misses"""
+        if expired(deadline):
+            return [None] * len(texts)
+        try:
+            with stage("cache_lookup", served_version, len(texts)):
+                return await asyncio.wait_for(cache_service.get_predictions(served_version, texts), remaining(deadline))
+        except asyncio.TimeoutError:
+            return [None] * len(texts)
+
+    def _skip_expired(self, served_version: str, texts: List[str], indices: List[int],
+                      results: List[Optional[dict]], stage: str):
+        DEADLINE_SKIPPED.labels(model_version=served_version, stage=stage).inc(len(indices))
+        for i in indices:
+            results[i] = {**build_result(texts[i], DeadlineExceeded()), "cached": False}
+
+    async def predict_texts(self, served_version: str, texts: List[str],
+                            priority: Optional[str] = None,
+                            deadline: Optional[Deadline] = None) -> Tuple[List[dict], bool]:
+        """
+        Resolve texts against the cache, inferring only the misses.
+        Returns the per-text results and whether every item was cached.
+        With a priority, the misses go through admission control and may
+        raise Overloaded; cache hits are never shed. Texts not done by the
+        deadline come back as "deadline exceeded" errors and are skipped
+        before inference where possible.
+        """
+        # One MGET for every text in the request
+        cached = await self._lookup(served_version, texts, deadline)
+        results = [None] * len(texts)
+        miss_indices = []
+        for i, hit in enumerate(cached):
+            if hit is None:
+                miss_indices.append(i)
+            else:
+                # Cached entries are shared by texts that normalize the same; echo this request's text
+                results[i] = {"text": texts[i], **hit, "cached": True}
+        
+        # Identical in-flight misses share one inference; the rest are
+        # coalesced with concurrent requests into batched forward passes
+        if miss_indices and expired(deadline):
+            self._skip_expired(served_version, texts, miss_indices, results, stage="cache")
+        elif miss_indices:
+            miss_texts = [texts[i] for i in miss_indices]
+            admit_start = time.perf_counter()
+            try:
+                async with self._admit(served_version, priority, deadline):
+                    record_stage("admission_wait", served_version, len(miss_texts), time.perf_counter() - admit_start)
+                    computed = await single_flight.run(
+                        served_version,
+                        miss_texts,
+                        lambda lead_texts, lead_deadlines: self._infer(served_version, lead_texts, lead_deadlines),
+                        deadline,
+                        # Same equivalence as the cache keys; exact text until the key space is built
+                        cache_service.normalizer(served_version)
+                    )
+            except DeadlineExceeded:
+                # Ran out of time waiting for an inference slot
+                self._skip_expired(served_version, texts, miss_indices, results, stage="admission")
+                return results, False
+            for i, result in zip(miss_indices, computed):
+                if isinstance(result, Exception):
+                    result = build_result(texts[i], result)
+                results[i] = {**result, "text": texts[i], "cached": False}
+        
+        return results, not miss_indices
+
+    def _admit(self, served_version: str, priority: Optional[str], deadline: Optional[Deadline]):
+        if priority is None:
+            return _not_admitted()
+        return admission_controller.admit(served_version, priority, deadline)
+
+    async def predict_tokens(self, request: TokenPredictionRequest, rows: List[np.ndarray]) -> PredictionResponse:
+        """
+        Predict pre-tokenized rows. They skip the text cache and join the
+        version's batcher directly, sharing forward passes with text traffic.
+        """
+        start_time = time.time()
+        served_version = request.model_version
+        deadline = Deadline.from_budget_ms(request.deadline_ms)
+        results: List[dict] = []
+        try:
+            async with self._admit(served_version, request.priority, deadline):
+                scheduler = get_scheduler(served_version, run_backend_batch)
+                predictions = await scheduler.submit(rows, [deadline] * len(rows) if deadline else None)
+        except DeadlineExceeded:
+            DEADLINE_SKIPPED.labels(model_version=served_version, stage="admission").inc(len(rows))
+            raise
+        for prediction in predictions:
+            results.append({**build_result(None, prediction), "cached": False})
+        results = select_fields(results, echo_text=False, return_probabilities=request.return_probabilities,
+                                top_k=request.top_k)
+        missed = sum(1 for result in results if result.get("error") == DeadlineExceeded.message)
+        if missed == len(results):
+            raise DeadlineExceeded()
+
+        duration_ms = (time.time() - start_time) * 1000
+        MODEL_INFERENCE_TIME.labels("sentiment", served_version).observe(duration_ms / 1000)
+        VERSION_LATENCY.labels(model_version=served_version, role="primary").observe(duration_ms / 1000)
+        return PredictionResponse.model_construct(
+            request_id=request.id,
+            model_version=served_version,
+            results=results,
+            latency_ms=duration_ms,
+            cached=False,
+            partial=missed > 0
+        )
+
+    async def _shadow_predict(self, texts: List[str], shadow_version: str) -> List[dict]:
+        # Lowest priority: shadow misses queue behind all real traffic and are shed first
+        results, _ = await self.predict_texts(shadow_version, texts, priority="shadow")
+        return results
+
     async def predict(self, request: PredictionRequest) -> PredictionResponse:
         """
         Predict sentiment for given texts using specified model.
         """
         try:
             start_time = time.time()
-            model_version = request.model_version or "v1"
-            
-            # Get the appropriate pipeline
-            sentiment_pipe = get_pipeline(model_version)
+            deadline = Deadline.from_budget_ms(request.deadline_ms)
+            # Explicit versions are honoured; otherwise the registry rollout strategy decides
+            decision = model_router.route(request.id, request.model_version)
+            served_version = decision.version
             
-            # Run predictions
-            results = []
-            for text in request.texts:
-                try:
-                    # Get prediction from model
-                    prediction = sentiment_pipe(text, truncation=True)[0]
-                    
-                    label_name = prediction["label"]
-                    confidence = float(prediction["score"])
-                    
-                    # Map label to numeric
-                    if label_name.lower() in ["positive", "neg_pos"]:
-                        label = 1
-                        class_name = "positive"
-                    elif label_name.lower() in ["negative", "neg"]:
-                        label = 0
-                        class_name = "negative"
-                    else:
-                        label = 1 if confidence > 0.5 else 0
-                        class_name = "positive" if label == 1 else "negative"
-                    
-                    results.append({
-                        "text": text,
-                        "label": label,
-                        "confidence": confidence,
-                        "class": class_name,
-                        "raw_label": label_name
-                    })
-                except Exception as e:
-                    logger.error("text_prediction_failed", text=text, error=str(e))
-                    results.append({
-                        "text": text,
-                        "label": 0,
-                        "confidence": 0.0,
-                        "class": "unknown",
-                        "error": str(e)
-                    })
+            results, all_cached = await self.predict_texts(
+                served_version, request.texts, request.priority, deadline
+            )
+            # Whatever finished in time is returned; nothing finishing is a timeout
+            missed = sum(1 for result in results if result.get("error") == DeadlineExceeded.message)
+            if missed == len(results):
+                raise DeadlineExceeded()
             
             duration_ms = (time.time() - start_time) * 1000
-            MODEL_INFERENCE_TIME.labels("sentiment", model_version).observe(duration_ms / 1000)
+            MODEL_INFERENCE_TIME.labels("sentiment", served_version).observe(duration_ms / 1000)
+            VERSION_LATENCY.labels(model_version=served_version, role="primary").observe(duration_ms / 1000)
             
-            return PredictionResponse(
+            # Shadow traffic is queued after the primary result is ready
+            if decision.shadow_version:
+                shadow_runner.submit(
+                    request.texts, served_version, decision.shadow_version, results, self._shadow_predict
+                )
+            # Cached and shared results keep every field; each request gets its own view
+            results = select_fields(results, request.echo_text, request.return_probabilities, request.top_k)
+            
+            # Results are built here, so skip re-validating every item
+            return PredictionResponse.model_construct(
                 request_id=request.id,
-                model_version=model_version,
+                model_version=served_version,
                 results=results,
-                latency_ms=duration_ms
+                latency_ms=duration_ms,
+                cached=all_cached,
+                partial=missed > 0
             )
+        except (Overloaded, DeadlineExceeded, UnknownModelVersion):
+            # Surfaced to the endpoint as a 429 / 504 / 404
+            raise
         except Exception as e:
             logger.error("predict_error", error=str(e), exc_info=True)
             return PredictionResponse(
                 request_id=request.id,
-                model_version=request.model_version or "v1",
+                model_version=model_registry.resolve(request.model_version),
                 results=[],
                 latency_ms=0
             )
 
-
 inference_engine = InferenceEngine()
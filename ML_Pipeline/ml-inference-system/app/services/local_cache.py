@@ -0,0 +1,82 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from app.core.metrics import L1_CACHE_EVICTIONS, L1_CACHE_BYTES, L1_CACHE_ITEMS
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate resident size of a cached prediction in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for k, v in value.items():
+            size += sys.getsizeof(k) + estimate_size(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            size += estimate_size(v)
+    return size
+
+
+class LocalCache:
+    """
+    Bounded in-process LRU cache with per-entry TTL and a memory budget.
+    Entries are namespaced (e.g. by model version) so one namespace can be
+    dropped without touching the others. Only used from the event loop.
+    """
+
+    def __init__(self, max_items: int, max_bytes: int, ttl: float):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        entry = self._entries.get((namespace, key))
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at < time.monotonic():
+            self._remove((namespace, key))
+            return None
+        self._entries.move_to_end((namespace, key))
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float = None):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if (namespace, key) in self._entries:
+            self._remove((namespace, key))
+        expires_at = time.monotonic() + (ttl or self.ttl)
+        self._entries[(namespace, key)] = (value, expires_at, size)
+        self._bytes += size
+        self._evict()
+        self._report()
+
+    def clear(self, namespace: str = None):
+        """Drop every entry, or only those of one namespace"""
+        if namespace is None:
+            self._entries.clear()
+            self._bytes = 0
+        else:
+            for entry_key in [k for k in self._entries if k[0] == namespace]:
+                self._remove(entry_key)
+        self._report()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_items or self._bytes > self.max_bytes):
+            entry_key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            L1_CACHE_EVICTIONS.labels(model_version=entry_key[0]).inc()
+
+    def _remove(self, entry_key):
+        _, _, size = self._entries.pop(entry_key)
+        self._bytes -= size
+
+    def _report(self):
+        L1_CACHE_ITEMS.set(len(self._entries))
+        L1_CACHE_BYTES.set(self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
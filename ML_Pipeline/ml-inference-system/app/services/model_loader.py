@@ -8,12 +8,51 @@ import structlog
 
 logger = structlog.get_logger()
 
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+def build_session_options() -> ort.SessionOptions:
+    """Build ONNX Runtime session options from settings"""
+    options = ort.SessionOptions()
+    options.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS.get(
+        settings.ONNX_GRAPH_OPTIMIZATION_LEVEL.lower(),
+        ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    )
+    options.execution_mode = EXECUTION_MODES.get(
+        settings.ONNX_EXECUTION_MODE.lower(),
+        ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    # 0 lets ONNX Runtime pick based on available cores
+    options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = settings.ONNX_INTER_OP_THREADS
+    return options
+
+def create_profiling_session(path: str, profile_prefix: str) -> ort.InferenceSession:
+    """
+    Uncached session for the same model with per-operator profiling on.
+    ONNX Runtime only enables profiling at session creation, so profiling a
+    served model means running this second session in its place for a while.
+    """
+    options = build_session_options()
+    options.enable_profiling = True
+    options.profile_file_prefix = profile_prefix
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
 class ModelLoader:
     _models = {}
     _lock = threading.Lock()
 
     @classmethod
-    def get_model(cls, path: str):
+    def get_model(cls, path: str, model_version: str = None):
         """
         Thread-safe method to get or load an ONNX model.
         """
@@ -21,11 +60,18 @@ class ModelLoader:
             with cls._lock:
                 # Check again inside lock
                 if path not in cls._models:
-                    cls._load_model(path)
+                    cls._load_model(path, model_version)
         return cls._models[path]
 
     @classmethod
-    def _load_model(cls, path: str):
+    def unload(cls, path: str):
+        """Forget a cached session so it can be garbage collected"""
+        with cls._lock:
+            cls._models.pop(path, None)
+        logger.info("model_unloaded", path=path)
+
+    @classmethod
+    def _load_model(cls, path: str, model_version: str = None):
         logger.info("loading_model", path=path)
         start_time = time.time()
         try:
@@ -34,13 +80,16 @@ class ModelLoader:
                 raise FileNotFoundError(f"Model file not found: {path}")
 
             # Load ONNX session
-            session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+            session = ort.InferenceSession(
+                path,
+                sess_options=build_session_options(),
+                providers=["CPUExecutionProvider"]
+            )
             
             cls._models[path] = session
             
             duration = time.time() - start_time
-            model_name = path.split("/")[-2] # primitive extraction
-            version = path.split("/")[-2]
+            version = model_version or os.path.basename(os.path.dirname(path))
             
             MODEL_LOAD_TIME.labels(model_name="sentiment", model_version=version).set(duration)
             ACTIVE_MODELS.labels(model_name="sentiment", version=version).inc()
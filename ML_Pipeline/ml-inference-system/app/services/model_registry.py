@@ -0,0 +1,147 @@
+import json
+import os
+from typing import Dict, Optional
+import yaml
+from app.core.config import settings
+import structlog
+
+logger = structlog.get_logger()
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Used when no registry file can be found
+DEFAULT_MODELS = {
+    "v1": {
+        "name": "DistilBERT SST-2",
+        "model_id": "distilbert-base-uncased-finetuned-sst-2-english"
+    },
+    "v2": {
+        "name": "RoBERTa Twitter",
+        "model_id": "cardiffnlp/twitter-roberta-base-sentiment",
+        "classes": ["negative", "neutral", "positive"]
+    },
+    "v3": {
+        "name": "NLPTown Multilingual Sentiment",
+        "model_id": "nlptown/bert-base-multilingual-uncased-sentiment",
+        "notes": "Multilingual sentiment model (NLPTown)",
+        "classes": ["very_negative", "negative", "neutral", "positive", "very_positive"]
+    },
+    "v4": {
+        "name": "TinyBERT",
+        "model_id": "huawei-noah/TinyBERT_General_4L_312D"
+    },
+    "v5": {
+        "name": "BERT Base Multilingual",
+        "model_id": "bert-base-multilingual-cased"
+    }
+}
+
+# Written next to an ONNX export by scripts/download_pretrained_models.py
+EXPORT_MANIFEST = "export.json"
+
+
+class UnknownModelVersion(KeyError):
+    """A request named a version the registry does not have"""
+
+
+class ArtifactMismatch(ValueError):
+    """An ONNX artifact that was not exported from the version's declared model_id"""
+
+
+def artifact_model_id(path: str) -> Optional[str]:
+    """The model id an ONNX artifact was exported from, if its directory records one"""
+    model_dir = os.path.dirname(path)
+    for name, key in ((EXPORT_MANIFEST, "model_id"), ("config.json", "_name_or_path")):
+        manifest = os.path.join(model_dir, name)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                model_id = json.load(f).get(key)
+            if model_id:
+                return model_id
+    return None
+
+
+class ModelRegistry:
+    """
+    Model versions and rollout settings read from model_registry.yaml.
+    """
+
+    def __init__(self, path: str, task: str = "sentiment_analysis"):
+        self.path = self._locate(path)
+        self.base_dir = os.path.dirname(self.path) if self.path else PROJECT_ROOT
+        self.versions: Dict[str, dict] = {}
+        self.default_version = "v1"
+        self.rollout_strategy: dict = {}
+        self._load(task)
+
+    @staticmethod
+    def _locate(path: str) -> Optional[str]:
+        candidates = [path]
+        if not os.path.isabs(path):
+            candidates.append(os.path.join(PROJECT_ROOT, path))
+        for candidate in candidates:
+            if os.path.exists(candidate):
+                return os.path.abspath(candidate)
+        return None
+
+    def _load(self, task: str):
+        if self.path is None:
+            logger.warn("model_registry_not_found", path=settings.MODEL_REGISTRY_PATH)
+            self.versions = {version: dict(spec) for version, spec in DEFAULT_MODELS.items()}
+            return
+
+        with open(self.path) as f:
+            data = yaml.safe_load(f) or {}
+
+        entry = data.get("models", {}).get(task, {})
+        self.default_version = entry.get("default_version", self.default_version)
+        self.rollout_strategy = entry.get("rollout_strategy") or {}
+        for version, spec in (entry.get("versions") or {}).items():
+            spec = dict(spec)
+            spec.setdefault("name", version)
+            spec.setdefault("model_id", spec.get("path", ""))
+            if spec.get("path"):
+                spec["path"] = self.resolve_path(spec["path"])
+            self.versions[version] = spec
+
+        logger.info("model_registry_loaded", path=self.path, versions=list(self.versions))
+
+    def resolve_path(self, path: str) -> str:
+        """Resolve a registry path relative to the registry file"""
+        if os.path.isabs(path):
+            return path
+        return os.path.join(self.base_dir, path)
+
+    def resolve(self, model_version: Optional[str]) -> str:
+        """Map a requested version to a served one, falling back to the default"""
+        if model_version in self.versions:
+            return model_version
+        return self.default_version
+
+    def get(self, model_version: str) -> dict:
+        return self.versions[self.resolve(model_version)]
+
+    def backend_for(self, model_version: str) -> str:
+        """
+        Pick "onnx" or "transformers" for a version. "auto" only serves an
+        existing artifact as a version that declares a model_id when the
+        artifact records being exported from that model; anything else is an
+        ArtifactMismatch rather than another model served under its name.
+        """
+        spec = self.get(model_version)
+        backend = (spec.get("backend") or settings.INFERENCE_BACKEND).lower()
+        if backend == "auto":
+            path = spec.get("path")
+            backend = "onnx" if path and os.path.exists(path) else "transformers"
+            if backend == "onnx" and self.resolve_path(spec.get("model_id", "")) != path:
+                exported_from = artifact_model_id(path)
+                if exported_from != spec["model_id"]:
+                    raise ArtifactMismatch(
+                        f"{path} was exported from {exported_from or 'an unknown model'}, not "
+                        f"{spec['model_id']}; re-export it with scripts/download_pretrained_models.py "
+                        f"or give version {self.resolve(model_version)} an explicit backend"
+                    )
+        return backend
+
+
+model_registry = ModelRegistry(settings.MODEL_REGISTRY_PATH)
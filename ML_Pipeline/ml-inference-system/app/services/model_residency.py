@@ -0,0 +1,211 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+from app.core.metrics import (
+    ACTIVE_MODELS, MODEL_RESIDENT_BYTES, MODEL_MEMORY_USED_BYTES,
+    MODEL_MEMORY_BUDGET_BYTES, MODEL_EVICTIONS, MODEL_LOAD_TIME,
+)
+import structlog
+
+logger = structlog.get_logger()
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, 0 where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _Resident:
+    __slots__ = ("backend", "size_bytes", "load_seconds", "in_flight")
+
+    def __init__(self, backend: Any, size_bytes: int, load_seconds: float = 0.0):
+        self.backend = backend
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.in_flight = 0
+
+
+class ModelResidencyManager:
+    """
+    Keeps loaded backends within a memory budget. Models are evicted least
+    recently used first, never while they have in-flight work and never if
+    pinned. Concurrent loads of the same version are single-flighted.
+    Safe to call from executor threads.
+    """
+
+    def __init__(self, load: Callable[[str], Any], budget_bytes: int, pinned: List[str]):
+        self._load = load
+        self.budget_bytes = budget_bytes
+        self.pinned = set(pinned)
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        MODEL_MEMORY_BUDGET_BYTES.set(budget_bytes)
+
+    def acquire(self, model_version: str) -> Any:
+        """
+        Return the backend for a version, loading it if needed, and mark it
+        in use until release() is called.
+        """
+        while True:
+            with self._lock:
+                entry = self._resident.get(model_version)
+                if entry is not None:
+                    entry.in_flight += 1
+                    self._resident.move_to_end(model_version)
+                    return entry.backend
+                pending = self._loading.get(model_version)
+                leader = pending is None
+                if leader:
+                    pending = Future()
+                    self._loading[model_version] = pending
+
+            if not leader:
+                # Another thread is loading it; wait and retry the lookup
+                pending.result()
+                continue
+
+            try:
+                entry = self._load_entry(model_version)
+            except Exception as e:
+                with self._lock:
+                    del self._loading[model_version]
+                pending.set_exception(e)
+                raise
+
+            with self._lock:
+                entry.in_flight += 1
+                self._resident[model_version] = entry
+                del self._loading[model_version]
+                self._enforce_budget(warn=True)
+                self._report()
+            pending.set_result(None)
+            return entry.backend
+
+    def release(self, model_version: str):
+        with self._lock:
+            entry = self._resident.get(model_version)
+            if entry is not None:
+                entry.in_flight = max(0, entry.in_flight - 1)
+                self._enforce_budget()
+                self._report()
+
+    def resident_versions(self) -> List[str]:
+        with self._lock:
+            return list(self._resident.keys())
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Size and load time of each resident version"""
+        with self._lock:
+            return {version: {"size_bytes": entry.size_bytes, "load_seconds": entry.load_seconds}
+                    for version, entry in self._resident.items()}
+
+    def used_bytes(self) -> int:
+        with self._lock:
+            return self._used_bytes()
+
+    def set_budget(self, budget_bytes: int):
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._enforce_budget(warn=True)
+        MODEL_MEMORY_BUDGET_BYTES.set(budget_bytes)
+
+    def _load_entry(self, model_version: str) -> _Resident:
+        rss_before = current_rss_bytes()
+        start_time = time.time()
+        backend = self._load(model_version)
+        rss_delta = current_rss_bytes() - rss_before
+        duration = time.time() - start_time
+
+        estimate = 0
+        if hasattr(backend, "memory_bytes"):
+            estimate = backend.memory_bytes()
+        size_bytes = max(rss_delta, estimate)
+        logger.info("model_resident", model_version=model_version, size_mb=round(size_bytes / 2**20, 1),
+                    duration=duration)
+        return _Resident(backend, size_bytes, duration)
+
+    def _used_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._resident.values())
+
+    def _enforce_budget(self, warn: bool = False):
+        """Evict idle, unpinned models in LRU order until within budget; caller holds the lock"""
+        used = self._used_bytes()
+        if used <= self.budget_bytes:
+            return
+        for version in list(self._resident.keys()):
+            if used <= self.budget_bytes:
+                break
+            entry = self._resident[version]
+            if version in self.pinned or entry.in_flight > 0:
+                continue
+            del self._resident[version]
+            used -= entry.size_bytes
+            self._unload(version, entry)
+        if warn and used > self.budget_bytes:
+            logger.warn("model_memory_over_budget", used_mb=round(used / 2**20, 1),
+                        budget_mb=round(self.budget_bytes / 2**20, 1))
+
+    def _unload(self, model_version: str, entry: _Resident):
+        if hasattr(entry.backend, "close"):
+            try:
+                entry.backend.close()
+            except Exception as e:
+                logger.warn("model_close_failed", model_version=model_version, error=str(e))
+        entry.backend = None
+        gc.collect()
+        MODEL_EVICTIONS.labels(model_version=model_version).inc()
+        MODEL_RESIDENT_BYTES.labels(model_version=model_version).set(0)
+        ACTIVE_MODELS.labels(model_name="sentiment", version=model_version).set(0)
+        logger.info("model_evicted", model_version=model_version,
+                    size_mb=round(entry.size_bytes / 2**20, 1))
+
+    def _report(self):
+        for version, entry in self._resident.items():
+            MODEL_RESIDENT_BYTES.labels(model_version=version).set(entry.size_bytes)
+        MODEL_MEMORY_USED_BYTES.set(self._used_bytes())
+
+
+class WorkerResidency:
+    """
+    Resident models of the process executor's workers, rebuilt from the
+    snapshot each worker sends back with every result. Every worker holds its
+    own copy of a model, so sizes add up across workers.
+    """
+
+    def __init__(self):
+        self._workers: Dict[int, Dict[str, dict]] = {}
+        self._lock = threading.Lock()
+
+    def apply(self, report: dict):
+        with self._lock:
+            previous = self._workers.get(report["pid"], {})
+            current = report["resident"]
+            self._workers[report["pid"]] = current
+            for version in previous.keys() - current.keys():
+                MODEL_EVICTIONS.labels(model_version=version).inc()
+            for version in current.keys() - previous.keys():
+                MODEL_LOAD_TIME.labels(model_name="sentiment", model_version=version).set(
+                    current[version]["load_seconds"]
+                )
+
+            totals: Dict[str, int] = defaultdict(int)
+            for resident in self._workers.values():
+                for version, entry in resident.items():
+                    totals[version] += entry["size_bytes"]
+            for version in totals.keys() | previous.keys():
+                MODEL_RESIDENT_BYTES.labels(model_version=version).set(totals.get(version, 0))
+                ACTIVE_MODELS.labels(model_name="sentiment", version=version).set(1 if version in totals else 0)
+            MODEL_MEMORY_USED_BYTES.set(sum(totals.values()))
+
+    def resident_versions(self) -> List[str]:
+        with self._lock:
+            return sorted({version for resident in self._workers.values() for version in resident})
@@ -0,0 +1,109 @@
+from itertools import islice
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+# Class semantics recognised from raw label names when the registry declares none
+KNOWN_CLASSES = {
+    "negative": "negative",
+    "neg": "negative",
+    "neutral": "neutral",
+    "neu": "neutral",
+    "positive": "positive",
+    "pos": "positive",
+}
+
+BINARY_CLASSES = ["negative", "positive"]
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class LabelMap:
+    """
+    Raw label name and class name for each output index of a model. The
+    numeric "label" of a result is the output index, so classes should be
+    declared in output order (e.g. 1 to 5 stars).
+    """
+
+    def __init__(self, labels: Sequence[str], classes: Sequence[str]):
+        self.labels = np.array(labels, dtype=object)
+        self.classes = np.array(classes, dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @classmethod
+    def build(cls, num_classes: int, registry_labels: Optional[List[str]] = None,
+              config_labels: Optional[List[str]] = None,
+              registry_classes: Optional[List[str]] = None) -> "LabelMap":
+        """
+        Registry labels win over the model's own config; lists whose length
+        does not match the model output are ignored. Without declared
+        classes, well-known label names are mapped, binary models are read
+        as negative/positive, and anything else keeps its raw label name.
+        """
+        labels = next(
+            (list(candidate) for candidate in (registry_labels, config_labels)
+             if candidate and len(candidate) == num_classes),
+            [f"LABEL_{i}" for i in range(num_classes)]
+        )
+        if registry_classes and len(registry_classes) == num_classes:
+            classes = list(registry_classes)
+        elif all(label.lower() in KNOWN_CLASSES for label in labels):
+            classes = [KNOWN_CLASSES[label.lower()] for label in labels]
+        elif num_classes == 2:
+            classes = list(BINARY_CLASSES)
+        else:
+            classes = [label.lower() for label in labels]
+        return cls(labels, classes)
+
+    def to_dict(self) -> Dict[str, list]:
+        return {"labels": self.labels.tolist(), "classes": self.classes.tolist()}
+
+
+def postprocess(probs: np.ndarray, label_map: LabelMap) -> List[dict]:
+    """
+    Turn a batch of class probabilities into result items with one argsort
+    over the whole matrix. Each item's probabilities are ordered from most to
+    least likely, so top-k is a prefix.
+    """
+    order = np.argsort(-probs, axis=1, kind="stable")
+    best = order[:, 0]
+    ranked = np.take_along_axis(probs, order, axis=1).tolist()
+    ranked_classes = label_map.classes[order].tolist()
+    return [
+        {
+            "label": label,
+            "confidence": row[0],
+            "class": class_name,
+            "raw_label": raw_label,
+            "probabilities": dict(zip(row_classes, row)),
+        }
+        for label, class_name, raw_label, row, row_classes in zip(
+            best.tolist(), label_map.classes[best].tolist(), label_map.labels[best].tolist(),
+            ranked, ranked_classes
+        )
+    ]
+
+
+def select_fields(results: List[dict], echo_text: bool = True, return_probabilities: bool = False,
+                  top_k: Optional[int] = None) -> List[dict]:
+    """
+    Shape result items for one request: drop the echoed text unless asked
+    for, and drop the probabilities unless asked for. top_k implies
+    probabilities and keeps only the k most likely classes.
+    """
+    keep_probabilities = return_probabilities or bool(top_k)
+    if echo_text and keep_probabilities and not top_k:
+        return results
+    selected = []
+    for result in results:
+        item = {k: v for k, v in result.items()
+                if (echo_text or k != "text") and (keep_probabilities or k != "probabilities")}
+        if top_k and "probabilities" in item:
+            item["probabilities"] = dict(islice(item["probabilities"].items(), top_k))
+        selected.append(item)
+    return selected
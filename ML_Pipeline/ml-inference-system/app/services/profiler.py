@@ -0,0 +1,189 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.services.backends import OnnxBackend
+import structlog
+
+logger = structlog.get_logger()
+
+
+# Leaf frames of threads blocked waiting for work (executor queues, the
+# event loop's select); samples ending in them are dropped unless idle is on
+IDLE_FRAMES = {
+    ("thread.py", "_worker"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profiling run is already in progress"""
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread in this process from a
+    background thread and counts them as collapsed stacks
+    ("thread;outer;...;inner count", the input format of flamegraph.pl and
+    speedscope). Nothing runs between profiling sessions.
+
+    Walking the frames holds the GIL, so the sampler measures its own cost
+    and stretches the interval to keep it under max_overhead of wall time.
+    """
+
+    def __init__(self, interval: float, max_overhead: float, idle: bool = False):
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.idle = idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+        self._stopped_at = 0.0
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._stopped_at = time.perf_counter()
+
+    @property
+    def overhead(self) -> float:
+        elapsed = (self._stopped_at or time.perf_counter()) - self._started_at
+        return self.sampling_seconds / elapsed if elapsed > 0 else 0.0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.is_set():
+            start_time = time.perf_counter()
+            self._sample(own_id)
+            cost = time.perf_counter() - start_time
+            self.sampling_seconds += cost
+            # cost / (cost + wait) <= max_overhead
+            self._stop.wait(max(self.interval, cost / self.max_overhead - cost))
+
+    def _sample(self, own_id: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            code = frame.f_code
+            if not self.idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top_frames(self, limit: int = 20) -> List[dict]:
+        """Leaf frames by share of samples, i.e. where the time is spent"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [{"frame": frame, "samples": count, "share": round(count / total, 4)}
+                for frame, count in leaves.most_common(limit)]
+
+
+class ProfilingService:
+    """
+    Runs one bounded profiling session at a time: the sampling profiler
+    and, optionally, ONNX Runtime per-operator profiling of loaded models.
+    Artifacts are written to PROFILE_DIR.
+    """
+
+    def __init__(self):
+        self._running = False
+
+    @staticmethod
+    def _start_onnx(versions: List[str], stamp: str, acquire, release, profiled: Dict[str, OnnxBackend]):
+        for version in versions:
+            served_version, backend = acquire(version)
+            if served_version == version and isinstance(backend, OnnxBackend):
+                prefix = os.path.join(settings.PROFILE_DIR, f"onnx-{version}-{stamp}-{os.getpid()}")
+                backend.start_profiling(prefix)
+                profiled[version] = backend
+            else:
+                release(served_version)
+                logger.warn("onnx_profiling_skipped", model_version=version, reason="not an onnx backend")
+
+    @staticmethod
+    def _stop_onnx(profiled: Dict[str, OnnxBackend], release) -> Dict[str, str]:
+        onnx_profiles = {}
+        for version, backend in profiled.items():
+            try:
+                onnx_profiles[version] = backend.stop_profiling()
+            finally:
+                release(version)
+        return onnx_profiles
+
+    async def profile(self, seconds: float, interval_ms: float, onnx_versions: List[str],
+                      acquire, release, idle: bool = False) -> dict:
+        """
+        Profile this process for `seconds`. acquire/release pin each model in
+        onnx_versions for the duration so it cannot be evicted mid-profile.
+        Loading models and building or ending profiling sessions block, so
+        they run on the default executor rather than the event loop.
+        """
+        if self._running:
+            raise ProfilerBusy("a profiling session is already running")
+        self._running = True
+        seconds = min(seconds, settings.PROFILER_MAX_SECONDS)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        profiled: Dict[str, OnnxBackend] = {}
+        sampler = SamplingProfiler(interval_ms / 1000, settings.PROFILER_MAX_OVERHEAD, idle)
+        logger.info("profiling_started", seconds=seconds, interval_ms=interval_ms, onnx_versions=onnx_versions)
+        loop = asyncio.get_running_loop()
+        try:
+            if onnx_versions:
+                await loop.run_in_executor(None, self._start_onnx, onnx_versions, stamp, acquire, release, profiled)
+
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+        finally:
+            try:
+                onnx_profiles = await loop.run_in_executor(None, self._stop_onnx, profiled, release)
+            finally:
+                self._running = False
+
+        collapsed_path = os.path.join(settings.PROFILE_DIR, f"stacks-{stamp}-{os.getpid()}.collapsed")
+        with open(collapsed_path, "w") as f:
+            f.write(sampler.collapsed())
+        logger.info("profiling_finished", samples=sampler.samples, overhead=sampler.overhead,
+                    collapsed=collapsed_path, onnx_profiles=onnx_profiles)
+        return {
+            "pid": os.getpid(),
+            "seconds": seconds,
+            "samples": sampler.samples,
+            "overhead": round(sampler.overhead, 4),
+            "collapsed_stacks": os.path.basename(collapsed_path),
+            "onnx_profiles": {v: os.path.basename(p) for v, p in onnx_profiles.items()},
+            "top_frames": sampler.top_frames(),
+        }
+
+
+profiling_service = ProfilingService()
@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import time
+from typing import Awaitable, Callable, List, NamedTuple, Optional
+from app.core.config import settings
+from app.core.metrics import (
+    ROUTED_REQUESTS, VERSION_LATENCY, SHADOW_DROPPED, SHADOW_QUEUE_DEPTH, MODEL_AGREEMENT,
+)
+from app.services.model_registry import model_registry, ModelRegistry, UnknownModelVersion
+from app.services.admission import Overloaded
+import structlog
+
+logger = structlog.get_logger()
+
+
+class RouteDecision(NamedTuple):
+    version: str
+    strategy: str
+    shadow_version: Optional[str] = None
+
+
+def sticky_bucket(request_id: str) -> float:
+    """Stable position in [0, 100) for a request id"""
+    digest = hashlib.md5(request_id.encode()).hexdigest()
+    return int(digest[:8], 16) % 10000 / 100
+
+
+class ModelRouter:
+    """
+    Picks the serving version for requests that don't ask for one, following
+    the registry rollout_strategy (canary, shadow, ab_test, pinned). Buckets
+    are sticky on request id so retries land on the same version.
+    """
+
+    def __init__(self, registry: ModelRegistry):
+        self.registry = registry
+        self.strategy = registry.rollout_strategy or {}
+
+    def route(self, request_id: str, requested_version: Optional[str]) -> RouteDecision:
+        """
+        The served version (and shadow version) for a request. Decisions only
+        hold registry versions, so they are safe as metric labels; an unknown
+        explicit version raises UnknownModelVersion and is counted as "unknown".
+        """
+        if requested_version:
+            if requested_version not in self.registry.versions:
+                ROUTED_REQUESTS.labels(model_version="unknown", strategy="explicit").inc()
+                raise UnknownModelVersion(requested_version)
+            decision = RouteDecision(requested_version, "explicit")
+        else:
+            decision = self._apply_strategy(request_id)
+            decision = decision._replace(
+                version=self.registry.resolve(decision.version),
+                shadow_version=decision.shadow_version and self.registry.resolve(decision.shadow_version),
+            )
+        ROUTED_REQUESTS.labels(model_version=decision.version, strategy=decision.strategy).inc()
+        return decision
+
+    def _apply_strategy(self, request_id: str) -> RouteDecision:
+        kind = self.strategy.get("type", "pinned")
+        default = self.registry.default_version
+        target = self.strategy.get("target_version")
+        if target not in self.registry.versions:
+            target = None
+
+        if kind == "canary" and target:
+            percentage = float(self.strategy.get("canary_percentage", 0))
+            version = target if sticky_bucket(request_id) < percentage else default
+            return RouteDecision(version, kind)
+
+        if kind == "shadow" and target:
+            percentage = float(self.strategy.get("shadow_percentage", 100))
+            shadow = target if sticky_bucket(request_id) < percentage else None
+            return RouteDecision(default, kind, shadow)
+
+        if kind == "ab_test":
+            variants = self.strategy.get("variants") or {default: 50, target or default: 50}
+            bucket = sticky_bucket(request_id)
+            total = sum(float(weight) for weight in variants.values()) or 1.0
+            cumulative = 0.0
+            for version, weight in variants.items():
+                cumulative += float(weight) / total * 100
+                if bucket < cumulative and version in self.registry.versions:
+                    return RouteDecision(version, kind)
+            return RouteDecision(default, kind)
+
+        # pinned: everything on target_version if given, else the default
+        return RouteDecision(target or default, "pinned")
+
+
+class ShadowRunner:
+    """
+    Replays primary requests against a shadow version off the response path.
+    Work goes through a bounded queue and is dropped when the queue is full,
+    so shadow traffic can never add latency to the primary call. Replays are
+    admitted at the lowest priority and dropped when shed.
+    """
+
+    def __init__(self, max_queue: int):
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._worker: Optional[asyncio.Task] = None
+
+    def submit(self, texts: List[str], primary_version: str, shadow_version: str,
+               primary_results: List[dict], predict: Callable[[List[str], str], Awaitable[List[dict]]]):
+        try:
+            self._queue.put_nowait((texts, primary_version, shadow_version, primary_results, predict))
+        except asyncio.QueueFull:
+            SHADOW_DROPPED.labels(model_version=shadow_version).inc()
+            return
+        SHADOW_QUEUE_DEPTH.set(self._queue.qsize())
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            texts, primary_version, shadow_version, primary_results, predict = await self._queue.get()
+            SHADOW_QUEUE_DEPTH.set(self._queue.qsize())
+            start_time = time.time()
+            try:
+                shadow_results = await predict(texts, shadow_version)
+            except Overloaded:
+                SHADOW_DROPPED.labels(model_version=shadow_version).inc()
+                continue
+            except Exception as e:
+                logger.warn("shadow_predict_failed", model_version=shadow_version, error=str(e))
+                continue
+            VERSION_LATENCY.labels(model_version=shadow_version, role="shadow").observe(time.time() - start_time)
+
+            for primary, shadow in zip(primary_results, shadow_results):
+                if "error" in primary or "error" in shadow:
+                    continue
+                outcome = "agree" if primary.get("class") == shadow.get("class") else "disagree"
+                MODEL_AGREEMENT.labels(
+                    primary_version=primary_version, shadow_version=shadow_version, outcome=outcome
+                ).inc()
+
+    def stop(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+
+
+model_router = ModelRouter(model_registry)
+shadow_runner = ShadowRunner(max_queue=settings.SHADOW_QUEUE_SIZE)
@@ -0,0 +1,87 @@
+import json
+from typing import List, Optional, Tuple
+from app.schemas import PredictionResponse
+
+# Both are in requirements.txt; without them responses fall back to stdlib JSON
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Accept values recognised for each response format
+_ALIASES = {
+    JSON: JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+
+def available_media_types() -> List[str]:
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def _parse_accept(accept: str) -> List[Tuple[str, float]]:
+    entries = []
+    for part in accept.split(","):
+        media_type, *params = [p.strip() for p in part.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        entries.append((media_type.lower(), quality))
+    return entries
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pick the response format from an Accept header: the supported type with
+    the highest q-value, earliest listed on ties. JSON is the fallback,
+    including for wildcards and unsupported types.
+    """
+    if not accept:
+        return JSON
+    supported = available_media_types()
+    best, best_quality = JSON, 0.0
+    for media_type, quality in _parse_accept(accept):
+        media_type = _ALIASES.get(media_type)
+        if media_type in supported and quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def prediction_payload(response: PredictionResponse) -> dict:
+    # Plain attribute reads: results are engine-built dicts and need no re-validation
+    return {
+        "request_id": response.request_id,
+        "model_version": response.model_version,
+        "results": response.results,
+        "latency_ms": response.latency_ms,
+        "cached": response.cached,
+        "partial": response.partial,
+    }
+
+
+def encode_prediction(response: PredictionResponse, media_type: str = JSON) -> bytes:
+    """
+    Encode a prediction response. msgpack packs floats as float32, which
+    holds model scores exactly and keeps large batches compact.
+    """
+    payload = prediction_payload(response)
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True, use_single_float=True)
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode()
@@ -0,0 +1,210 @@
+import json
+import os
+import time
+from multiprocessing import shared_memory
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from app.services.postprocessing import LabelMap, postprocess
+
+# head and tail counters, padded to a cache line
+CONTROL_BYTES = 64
+
+# Response records are sized for this many classes per item plus a label table
+MAX_RESPONSE_CLASSES = 16
+LABEL_TABLE_BYTES = 4096
+
+SLOT_HEADER = np.dtype([
+    ("request_id", "<u8"),
+    ("epoch", "<u8"),         # sending worker's attach epoch, echoed in the response
+    ("enqueued_at", "<f8"),   # time.monotonic(), comparable across processes
+    ("deadline", "<f8"),      # time.monotonic() deadline, 0 for none
+    ("status", "<u4"),
+    ("encoding", "<u4"),      # requests: ENCODING_TEXT or ENCODING_TOKENS payload
+    ("n_items", "<u4"),
+    ("nbytes", "<u4"),
+    ("version", "S32"),
+])
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_EXPIRED = 2
+
+ENCODING_TEXT = 0
+ENCODING_TOKENS = 1
+
+
+class ShmRing:
+    """
+    Single-producer single-consumer ring of fixed-size slots in shared memory.
+    Each slot holds a header and a raw payload that the producer fills from
+    numpy arrays and the consumer reads through numpy views, so nothing is
+    pickled. The producer only advances tail and the consumer only head.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int, payload_bytes: int):
+        self.shm = shm
+        self.slots = slots
+        self.payload_bytes = payload_bytes
+        self._control = np.ndarray((2,), dtype=np.uint64, buffer=shm.buf)
+        self.headers = np.ndarray((slots,), dtype=SLOT_HEADER, buffer=shm.buf, offset=CONTROL_BYTES)
+        self.payloads = np.ndarray(
+            (slots, payload_bytes), dtype=np.uint8, buffer=shm.buf,
+            offset=CONTROL_BYTES + SLOT_HEADER.itemsize * slots
+        )
+
+    @classmethod
+    def create(cls, slots: int, payload_bytes: int) -> "ShmRing":
+        size = CONTROL_BYTES + slots * (SLOT_HEADER.itemsize + payload_bytes)
+        ring = cls(shared_memory.SharedMemory(create=True, size=size), slots, payload_bytes)
+        ring._control[:] = 0
+        return ring
+
+    def __len__(self) -> int:
+        return int(self._control[1] - self._control[0])
+
+    def full(self) -> bool:
+        return len(self) >= self.slots
+
+    def write(self, request_id: int, version: str, status: int, n_items: int,
+              parts: Sequence[np.ndarray], deadline: float = 0.0, epoch: int = 0,
+              encoding: int = ENCODING_TEXT) -> bool:
+        """Copy parts into the next free slot; False if the ring is full"""
+        if self.full():
+            return False
+        tail = int(self._control[1])
+        index = tail % self.slots
+        payload = self.payloads[index]
+        offset = 0
+        for part in parts:
+            raw = np.ascontiguousarray(part).view(np.uint8).reshape(-1)
+            payload[offset:offset + raw.size] = raw
+            offset += raw.size
+        self.headers[index] = (request_id, epoch, time.monotonic(), deadline, status, encoding, n_items,
+                               offset, version.encode()[:32])
+        # Publish only after the slot is written
+        self._control[1] = tail + 1
+        return True
+
+    def peek(self) -> Optional[Tuple[np.void, np.ndarray]]:
+        """Header copy and payload view of the oldest slot; valid until advance()"""
+        if len(self) == 0:
+            return None
+        index = int(self._control[0]) % self.slots
+        header = self.headers[index].copy()
+        return header, self.payloads[index, :int(header["nbytes"])]
+
+    def advance(self):
+        self._control[0] = self._control[0] + 1
+
+    def close(self, unlink: bool = False):
+        # Drop our views first; SharedMemory refuses to close while they exist
+        del self._control, self.headers, self.payloads
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def worker_epoch(pid: int, generation: int) -> int:
+    """
+    Identifies one worker's attachment to a channel. Request ids restart for
+    every worker on a slot, so responses are only matched within an epoch.
+    """
+    return (generation << 32) | pid
+
+
+def _nonblocking_pipe() -> Tuple[int, int]:
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(read_fd, False)
+    os.set_blocking(write_fd, False)
+    return read_fd, write_fd
+
+
+def ring_bell(fd: int):
+    """Wake the other side; a full pipe already means a wakeup is pending"""
+    try:
+        os.write(fd, b"\0")
+    except BlockingIOError:
+        pass
+
+
+def drain_bell(fd: int):
+    try:
+        while os.read(fd, 4096):
+            pass
+    except BlockingIOError:
+        pass
+
+
+class RingChannel:
+    """
+    Request and response rings between one front-end worker and the inference
+    process, with a pipe per direction as doorbell. Created before forking.
+    """
+
+    def __init__(self, slots: int, payload_bytes: int):
+        self.requests = ShmRing.create(slots, payload_bytes)
+        self.responses = ShmRing.create(slots, payload_bytes)
+        self.request_bell = _nonblocking_pipe()
+        self.response_bell = _nonblocking_pipe()
+
+    def close(self, unlink: bool = False):
+        self.requests.close(unlink)
+        self.responses.close(unlink)
+        for fd in (*self.request_bell, *self.response_bell):
+            os.close(fd)
+
+
+def encode_texts(texts: List[str]) -> List[np.ndarray]:
+    """int64 offsets followed by the concatenated UTF-8 bytes"""
+    encoded = [text.encode("utf-8") for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return [offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)]
+
+
+def encoded_size(byte_lengths: List[int]) -> int:
+    return 8 * (len(byte_lengths) + 1) + sum(byte_lengths)
+
+
+def decode_texts(payload: np.ndarray, n_items: int) -> List[str]:
+    offsets = payload[:8 * (n_items + 1)].view(np.int64)
+    data = payload[8 * (n_items + 1):]
+    return [data[offsets[i]:offsets[i + 1]].tobytes().decode("utf-8") for i in range(n_items)]
+
+
+def encode_tokens(rows: List[Sequence[int]]) -> List[np.ndarray]:
+    """int32 row lengths followed by the concatenated int32 token ids"""
+    lengths = np.array([len(row) for row in rows], dtype=np.int32)
+    ids = np.concatenate([np.asarray(row, dtype=np.int32) for row in rows]) if rows else lengths[:0]
+    return [lengths, ids]
+
+
+def encoded_tokens_size(lengths: List[int]) -> int:
+    return 4 * (len(lengths) + sum(lengths))
+
+
+def decode_tokens(payload: np.ndarray, n_items: int) -> List[np.ndarray]:
+    """One 1-D id array per item, copied out of the slot so it outlives advance()"""
+    lengths = payload[:4 * n_items].view(np.int32)
+    ids = payload[4 * n_items:].view(np.int32).copy()
+    return np.split(ids, np.cumsum(lengths)[:-1])
+
+
+def max_prediction_items(payload_bytes: int) -> int:
+    """Items per record whose probabilities fit a response slot, for up to MAX_RESPONSE_CLASSES classes"""
+    return max(1, (payload_bytes - LABEL_TABLE_BYTES) // (4 * MAX_RESPONSE_CLASSES))
+
+
+def encode_predictions(probs: np.ndarray, label_map: LabelMap) -> List[np.ndarray]:
+    """Class count, the float32 probability matrix, then the label map as UTF-8 JSON"""
+    table = np.frombuffer(json.dumps(label_map.to_dict()).encode("utf-8"), dtype=np.uint8)
+    return [np.array([probs.shape[1]], dtype=np.int32), probs.astype(np.float32, copy=False), table]
+
+
+def decode_predictions(payload: np.ndarray, n_items: int) -> List[dict]:
+    """Result items rebuilt on the worker side, so only probabilities cross the ring"""
+    num_classes = int(payload[:4].view(np.int32)[0])
+    end = 4 + 4 * n_items * num_classes
+    probs = payload[4:end].view(np.float32).reshape(n_items, num_classes)
+    table = json.loads(payload[end:].tobytes().decode("utf-8"))
+    return postprocess(probs, LabelMap(table["labels"], table["classes"]))
@@ -0,0 +1,106 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.core.metrics import PREDICTIONS_COALESCED
+from app.services.deadlines import Deadline, DeadlineExceeded
+import structlog
+
+logger = structlog.get_logger()
+
+
+class _Flight:
+    __slots__ = ("future", "deadline")
+
+    def __init__(self, future: asyncio.Future, deadline: Deadline):
+        self.future = future
+        self.deadline = deadline
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight predictions keyed on
+    (model version, text), with the text normalized by the caller-supplied
+    function if any. It must only merge texts the model cannot tell apart
+    (the cache key space's normalizer). The first caller for a key leads and
+    computes it; concurrent callers with the same key, including duplicates
+    inside one request, wait for the leader's result. A flight's deadline is
+    the latest of its callers' deadlines.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple[str, str], _Flight] = {}
+        # Leader tasks, referenced until done so they are not garbage collected mid-flight
+        self._leads: Set[asyncio.Task] = set()
+
+    async def run(self, model_version: str, texts: List[str],
+                  compute: Callable[[List[str], List[Deadline]], Awaitable[List[Any]]],
+                  deadline: Optional[Deadline] = None,
+                  normalize: Optional[Callable[[str], str]] = None) -> List[Any]:
+        """
+        Resolve one value per text. compute is called once with the texts this
+        call leads and their flight deadlines, and must return their values in
+        order. Failed items are returned as exception instances; items still
+        running when this caller's deadline passes come back as DeadlineExceeded.
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        owned: Dict[Tuple[str, str], asyncio.Future] = {}
+        lead_texts = []
+        lead_deadlines = []
+        coalesced = 0
+
+        for text in texts:
+            key = (model_version, normalize(text) if normalize is not None else text)
+            flight = self._in_flight.get(key)
+            if flight is None:
+                flight = _Flight(loop.create_future(), Deadline(deadline.at if deadline else None))
+                self._in_flight[key] = flight
+                owned[key] = flight.future
+                lead_texts.append(text)
+                lead_deadlines.append(flight.deadline)
+            else:
+                flight.deadline.extend(deadline)
+                coalesced += 1
+            futures.append(flight.future)
+
+        if coalesced:
+            PREDICTIONS_COALESCED.labels(model_version=model_version).inc(coalesced)
+
+        if owned:
+            # Run as its own task so followers still get a result if this caller is cancelled
+            task = loop.create_task(self._lead(owned, lead_texts, lead_deadlines, compute))
+            self._leads.add(task)
+            task.add_done_callback(self._leads.discard)
+
+        # asyncio.wait never cancels the shared futures on our own cancellation
+        # or timeout, so other callers still get them
+        await asyncio.wait(set(futures), timeout=deadline.remaining() if deadline else None)
+        return [
+            DeadlineExceeded() if not f.done()
+            else f.exception() if f.exception() is not None
+            else f.result()
+            for f in futures
+        ]
+
+    async def _lead(self, owned: Dict[Tuple[str, str], asyncio.Future], texts: List[str],
+                    deadlines: List[Deadline],
+                    compute: Callable[[List[str], List[Deadline]], Awaitable[List[Any]]]):
+        try:
+            values = await compute(texts, deadlines)
+            for future, value in zip(owned.values(), values):
+                if not future.done():
+                    future.set_result(value)
+        except Exception as e:
+            logger.error("single_flight_compute_failed", error=str(e))
+            for future in owned.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for key, future in owned.items():
+                flight = self._in_flight.get(key)
+                if flight is not None and flight.future is future:
+                    del self._in_flight[key]
+                if not future.done():
+                    future.set_exception(RuntimeError("prediction was not computed"))
+
+
+single_flight = SingleFlight()
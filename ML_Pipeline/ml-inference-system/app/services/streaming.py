@@ -0,0 +1,136 @@
+import asyncio
+import json
+from typing import AsyncIterator, List, Optional
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from app.core.config import settings
+from app.core.metrics import STREAM_ITEMS, STREAM_INFLIGHT_CHUNKS
+from app.services.inference_engine import inference_engine
+from app.services.admission import Overloaded
+from app.services.postprocessing import select_fields
+import structlog
+
+logger = structlog.get_logger()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that streams while the request body is still being read.
+    The stock class listens for disconnect on receive() concurrently, which
+    swallows body messages on ASGI servers older than spec 2.4; here the body
+    iterator owns receive() and sees disconnects through request.stream().
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a chunked request body into lines without buffering all of it"""
+    pending = b""
+    async for chunk in body:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+def parse_line(line: bytes) -> str:
+    """An NDJSON input line is either a JSON string or an object with a "text" field"""
+    value = json.loads(line)
+    if isinstance(value, dict):
+        value = value.get("text")
+    if not isinstance(value, str):
+        raise ValueError("expected a JSON string or an object with a \"text\" field")
+    return value
+
+
+async def stream_predictions(body: AsyncIterator[bytes], served_version: str,
+                             return_probabilities: bool = False, top_k: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Read NDJSON texts from body and yield one NDJSON result line per input,
+    in input order, as soon as each chunk completes. At most
+    STREAM_MAX_INFLIGHT_CHUNKS chunks are in flight; when they are, reading
+    the body pauses, which pushes back on the client.
+
+    Chunks are admitted as batch traffic, so interactive requests go first.
+    A shed chunk backs off and retries (which also pauses reading); after
+    STREAM_OVERLOAD_RETRIES its items get an error entry.
+    """
+    in_flight: asyncio.Queue = asyncio.Queue(maxsize=settings.STREAM_MAX_INFLIGHT_CHUNKS)
+
+    async def predict_chunk(texts: List[str]) -> List[dict]:
+        attempt = 0
+        while True:
+            try:
+                return (await inference_engine.predict_texts(served_version, texts, priority="batch"))[0]
+            except Overloaded as e:
+                if attempt >= settings.STREAM_OVERLOAD_RETRIES:
+                    raise
+                await asyncio.sleep(min(max(e.retry_after, 0.05 * 2 ** attempt), 1.0))
+                attempt += 1
+
+    async def run_chunk(start: int, texts: List[Optional[str]], errors: List[Optional[str]]):
+        valid = [text for text in texts if text is not None]
+        try:
+            predictions = await predict_chunk(valid) if valid else []
+        except Overloaded as e:
+            errors = [error if text is None else str(e) for text, error in zip(texts, errors)]
+            predictions = []
+        results = iter(select_fields(predictions, return_probabilities=return_probabilities, top_k=top_k))
+        lines = []
+        for offset, (text, error) in enumerate(zip(texts, errors)):
+            item = {"index": start + offset}
+            if error is not None:
+                item["error"] = error
+            else:
+                item.update(next(results))
+            lines.append(json.dumps(item).encode() + b"\n")
+        return b"".join(lines)
+
+    async def read_body():
+        index = 0
+        texts: List[Optional[str]] = []
+        errors: List[Optional[str]] = []
+        try:
+            async for line in iter_lines(body):
+                if not line.strip():
+                    continue
+                try:
+                    texts.append(parse_line(line))
+                    errors.append(None)
+                except ValueError as e:
+                    texts.append(None)
+                    errors.append(f"invalid input line: {e}")
+                if len(texts) >= settings.STREAM_CHUNK_SIZE:
+                    await in_flight.put(asyncio.ensure_future(run_chunk(index, texts, errors)))
+                    index += len(texts)
+                    texts, errors = [], []
+            if texts:
+                await in_flight.put(asyncio.ensure_future(run_chunk(index, texts, errors)))
+        finally:
+            await in_flight.put(None)
+
+    reader = asyncio.ensure_future(read_body())
+    try:
+        while True:
+            chunk = await in_flight.get()
+            STREAM_INFLIGHT_CHUNKS.set(in_flight.qsize())
+            if chunk is None:
+                break
+            payload = await chunk
+            STREAM_ITEMS.labels(model_version=served_version).inc(payload.count(b"\n"))
+            yield payload
+        # Surface body read errors (e.g. client disconnect) after flushing results
+        await reader
+    finally:
+        reader.cancel()
+        while not in_flight.empty():
+            pending = in_flight.get_nowait()
+            if pending is not None:
+                pending.cancel()
+        STREAM_INFLIGHT_CHUNKS.set(0)
@@ -0,0 +1,99 @@
+"""
+Decoding of pre-tokenized prediction requests.
+
+The body is a msgpack map with the request fields of TokenPredictionRequest
+plus the arrays, each sent as a raw little-endian buffer:
+
+    {"id": "req-1", "model_version": "tiny", "vocab": "<fingerprint>",
+     "input_ids":      {"dtype": "int32", "shape": [n, L], "data": <bytes>},
+     "attention_mask": {"dtype": "int8",  "shape": [n, L], "data": <bytes>}}
+
+input_ids are right-padded rows as produced by the model's tokenizer,
+special tokens included. Without attention_mask every row is L tokens long.
+Arrays are wrapped with np.frombuffer and rows are handed on as views, so no
+per-token Python objects are created.
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+from pydantic import ValidationError
+from app.schemas import TokenPredictionRequest
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ID_DTYPES = {"int32": "<i4", "int64": "<i8"}
+MASK_DTYPES = {"int8": "<i1", "uint8": "u1", "bool": "?", "int32": "<i4", "int64": "<i8"}
+
+
+class TokenInputError(ValueError):
+    """Malformed or inconsistent token payload; answered with 422"""
+
+
+def _decode_array(field, name: str, dtypes: dict) -> np.ndarray:
+    if not isinstance(field, dict):
+        raise TokenInputError(f"{name} must be a map with dtype, shape and data")
+    dtype = dtypes.get(field.get("dtype"))
+    if dtype is None:
+        raise TokenInputError(f"{name}.dtype must be one of {sorted(dtypes)}")
+    shape = field.get("shape")
+    if not (isinstance(shape, list) and len(shape) == 2 and all(isinstance(d, int) and d > 0 for d in shape)):
+        raise TokenInputError(f"{name}.shape must be [rows, length]")
+    data = field.get("data")
+    if not isinstance(data, bytes):
+        raise TokenInputError(f"{name}.data must be binary")
+    dtype = np.dtype(dtype)
+    if len(data) != shape[0] * shape[1] * dtype.itemsize:
+        raise TokenInputError(f"{name}.data has {len(data)} bytes, expected {shape[0] * shape[1] * dtype.itemsize}")
+    return np.frombuffer(data, dtype=dtype).reshape(shape)
+
+
+def parse_token_request(body: bytes) -> Tuple[TokenPredictionRequest, np.ndarray, Optional[np.ndarray]]:
+    """Split a msgpack body into the request fields, input_ids and attention_mask"""
+    if msgpack is None:
+        raise TokenInputError("msgpack is not installed")
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise TokenInputError(f"invalid msgpack body: {e}")
+    if not isinstance(payload, dict):
+        raise TokenInputError("body must be a msgpack map")
+
+    input_ids = _decode_array(payload.pop("input_ids", None), "input_ids", ID_DTYPES)
+    attention_mask = payload.pop("attention_mask", None)
+    if attention_mask is not None:
+        attention_mask = _decode_array(attention_mask, "attention_mask", MASK_DTYPES)
+        if attention_mask.shape != input_ids.shape:
+            raise TokenInputError("attention_mask must have the same shape as input_ids")
+    try:
+        request = TokenPredictionRequest.model_validate(payload)
+    except ValidationError as e:
+        raise TokenInputError(str(e))
+    return request, input_ids, attention_mask
+
+
+def split_rows(input_ids: np.ndarray, attention_mask: Optional[np.ndarray],
+               vocab_size: int, max_length: int) -> List[np.ndarray]:
+    """
+    Validate the arrays against the model and cut each row to its length.
+    Checks are vectorized over the whole batch.
+    """
+    rows, width = input_ids.shape
+    if attention_mask is None:
+        lengths = np.full(rows, width)
+    else:
+        mask = attention_mask != 0
+        lengths = mask.sum(axis=1)
+        # Right padding only: each row's mask is a run of ones then zeros
+        if not np.array_equal(mask, np.arange(width) < lengths[:, None]):
+            raise TokenInputError("attention_mask must be right-padded (ones, then zeros)")
+        if (lengths == 0).any():
+            raise TokenInputError("every row needs at least one token")
+    if lengths.max() > max_length:
+        raise TokenInputError(f"rows may be at most {max_length} tokens for this model")
+
+    valid = input_ids if attention_mask is None else input_ids[mask]
+    if valid.min() < 0 or valid.max() >= vocab_size:
+        raise TokenInputError(f"token ids must be in [0, {vocab_size})")
+    return [input_ids[i, :length] for i, length in enumerate(lengths.tolist())]
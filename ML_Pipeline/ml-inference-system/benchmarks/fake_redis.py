@@ -0,0 +1,84 @@
+"""
+In-memory stand-in for the subset of redis.asyncio used by CacheService,
+so benchmarks run without a Redis server. An optional per-round-trip delay
+approximates network latency.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._ops: List[Tuple[str, str, Optional[int]]] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._ops.clear()
+
+    def set(self, key: str, value: str, ex: Optional[int] = None):
+        self._ops.append((key, value, ex))
+        return self
+
+    async def execute(self):
+        await self._redis._round_trip()
+        for key, value, ex in self._ops:
+            self._redis._set(key, value, ex)
+        results = [True] * len(self._ops)
+        self._ops.clear()
+        return results
+
+
+class FakeRedis:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    async def _round_trip(self):
+        # Always yield, like a real socket round trip would
+        await asyncio.sleep(self.latency)
+
+    def _set(self, key: str, value: str, ex: Optional[int]):
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    def _get(self, key: str) -> Optional[str]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def ping(self):
+        await self._round_trip()
+        return True
+
+    async def get(self, key: str):
+        await self._round_trip()
+        return self._get(key)
+
+    async def set(self, key: str, value: str, ex: Optional[int] = None):
+        await self._round_trip()
+        self._set(key, value, ex)
+        return True
+
+    async def incr(self, key: str):
+        await self._round_trip()
+        value = int(self._get(key) or 0) + 1
+        self._set(key, value, None)
+        return value
+
+    async def mget(self, keys: List[str]):
+        await self._round_trip()
+        return [self._get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    def flush(self):
+        self._data.clear()
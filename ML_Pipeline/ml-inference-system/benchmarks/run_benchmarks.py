@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+In-process benchmarks for the inference path, without HTTP.
+
+Each layer is measured separately so a regression can be pinned down:
+    tokenize  tokenizer only (tokenized models)
+    backend   backend.predict_batch: tokenization, bucketing and forward passes
+    cache     CacheService lookups and writes against an in-memory Redis stand-in
+    engine    InferenceEngine.predict_texts: cache, single-flight, batcher, executor
+
+Scenarios sweep one dimension at a time (batch size, text length,
+concurrency, cache-hit ratio) around a base scenario, for every model
+version. Results are written as JSON and can be compared with a stored
+baseline; the exit code is 1 when any scenario regresses by more than the
+threshold.
+
+Usage (from the project root, after scripts/create_dummy_model.py):
+    python benchmarks/run_benchmarks.py --versions tiny,v1-dummy --output results.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.15
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --update-baseline
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+from app.core.logging import setup_logging
+
+setup_logging()
+
+from app.core.config import settings
+from app.services.cache_service import cache_service
+from app.services.inference_engine import inference_engine, acquire_backend, release_backend
+from fake_redis import FakeRedis
+
+WORDS = (
+    "great terrible love hate product service quality price delivery support "
+    "fast slow broken perfect awful recommend never again amazing disappointing "
+    "the a and but very really not quite just it this was is would could"
+).split()
+
+
+class Scenario(NamedTuple):
+    layer: str
+    version: str
+    batch_size: int
+    text_words: int
+    concurrency: int = 1
+    hit_ratio: float = 0.0
+
+    @property
+    def name(self) -> str:
+        return (f"{self.layer}/{self.version}/batch={self.batch_size}/words={self.text_words}"
+                f"/concurrency={self.concurrency}/hit={self.hit_ratio:g}")
+
+
+class TextSource:
+    """Random texts of a given length; fresh texts are unique so they always miss"""
+
+    def __init__(self, words: int, seed: int = 0):
+        self.words = words
+        self.random = random.Random(seed)
+        self._unique = itertools.count()
+
+    def fresh(self) -> str:
+        body = " ".join(self.random.choices(WORDS, k=max(1, self.words - 1)))
+        return f"{body} u{next(self._unique)}"
+
+    def batch(self, size: int, hot: List[str], hit_ratio: float) -> List[str]:
+        return [
+            self.random.choice(hot) if hot and self.random.random() < hit_ratio else self.fresh()
+            for _ in range(size)
+        ]
+
+
+def summarize(latencies: List[float], texts: int, requests: int, elapsed: float) -> dict:
+    ms = np.array(latencies) * 1000
+    return {
+        "requests": requests,
+        "texts": texts,
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(requests / elapsed, 2),
+        "throughput_texts_per_s": round(texts / elapsed, 2),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def run_sync(call: Callable[[], None], requests: int, warmup: int, batch_size: int) -> dict:
+    for _ in range(warmup):
+        call()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, requests * batch_size, requests, time.perf_counter() - start)
+
+
+async def run_async(call: Callable[[], "asyncio.Future"], requests: int, warmup: int,
+                    batch_size: int, concurrency: int) -> dict:
+    for _ in range(warmup):
+        await call()
+    latencies = []
+    remaining = itertools.count()
+
+    async def worker():
+        while next(remaining) < requests:
+            t0 = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, requests * batch_size, requests, time.perf_counter() - start)
+
+
+def reset_cache(redis_latency_ms: float):
+    cache_service.redis = FakeRedis(latency_ms=redis_latency_ms)
+    if cache_service.local is not None:
+        cache_service.local.clear()
+
+
+async def run_scenario(scenario: Scenario, args) -> Optional[dict]:
+    texts = TextSource(scenario.text_words, seed=args.seed)
+    hot = [texts.fresh() for _ in range(max(8, scenario.batch_size * 4))]
+
+    if scenario.layer in ("tokenize", "backend"):
+        served_version, backend = acquire_backend(scenario.version)
+        try:
+            if scenario.layer == "tokenize":
+                if backend.tokenizer is None:
+                    return None
+                call = lambda: backend.tokenizer(texts.batch(scenario.batch_size, [], 0.0),
+                                                 truncation=True, max_length=backend.max_length)
+            else:
+                call = lambda: backend.predict_batch(texts.batch(scenario.batch_size, [], 0.0))
+            return run_sync(call, args.requests, args.warmup, scenario.batch_size)
+        finally:
+            release_backend(served_version)
+
+    reset_cache(args.redis_latency_ms)
+    # Lookups skip the cache until the version's key space is built
+    await cache_service.key_space(scenario.version)
+    if scenario.layer == "cache":
+        result = {"label": 1, "confidence": 0.9, "class": "positive", "raw_label": "POSITIVE"}
+        await cache_service.set_predictions(scenario.version, [(text, result) for text in hot])
+
+        async def call():
+            batch = texts.batch(scenario.batch_size, hot, scenario.hit_ratio)
+            found = await cache_service.get_predictions(scenario.version, batch)
+            await cache_service.set_predictions(
+                scenario.version, [(text, result) for text, hit in zip(batch, found) if hit is None]
+            )
+    else:
+        # Put the hot texts in the cache through the normal path
+        await inference_engine.predict_texts(scenario.version, hot)
+
+        async def call():
+            await inference_engine.predict_texts(
+                scenario.version, texts.batch(scenario.batch_size, hot, scenario.hit_ratio)
+            )
+
+    return await run_async(call, args.requests, args.warmup, scenario.batch_size, scenario.concurrency)
+
+
+def build_scenarios(args) -> List[Scenario]:
+    base_batch, base_words = args.batch_sizes[len(args.batch_sizes) // 2], args.text_words[len(args.text_words) // 2]
+    base_concurrency = args.concurrency[len(args.concurrency) // 2]
+    scenarios: List[Scenario] = []
+    for version in args.versions:
+        for layer in ("tokenize", "backend"):
+            scenarios += [Scenario(layer, version, b, base_words) for b in args.batch_sizes]
+            scenarios += [Scenario(layer, version, base_batch, w) for w in args.text_words]
+        base = Scenario("engine", version, base_batch, base_words, base_concurrency, 0.0)
+        scenarios += [base._replace(batch_size=b) for b in args.batch_sizes]
+        scenarios += [base._replace(text_words=w) for w in args.text_words]
+        scenarios += [base._replace(concurrency=c) for c in args.concurrency]
+        scenarios += [base._replace(hit_ratio=h) for h in args.hit_ratios]
+    cache_version = args.versions[0]
+    scenarios += [Scenario("cache", cache_version, b, base_words, base_concurrency, 0.5) for b in args.batch_sizes]
+    scenarios += [Scenario("cache", cache_version, base_batch, base_words, base_concurrency, h) for h in args.hit_ratios]
+    # Keep the first occurrence of each scenario, in order
+    return list(dict.fromkeys(scenarios))
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Scenarios whose p95 grew or throughput dropped by more than threshold"""
+    regressions = []
+    print(f"\n{'scenario':<72} {'p95 ms':>17} {'texts/s':>19}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        p95_change = (current["p95_ms"] - previous["p95_ms"]) / max(previous["p95_ms"], 1e-9)
+        tput_change = (current["throughput_texts_per_s"] - previous["throughput_texts_per_s"]) / max(
+            previous["throughput_texts_per_s"], 1e-9)
+        regressed = p95_change > threshold or tput_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<72} {current['p95_ms']:>8.2f} ({p95_change:+6.1%}) "
+              f"{current['throughput_texts_per_s']:>9.0f} ({tput_change:+6.1%}){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def metadata() -> dict:
+    import onnxruntime
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "onnxruntime": onnxruntime.__version__,
+        "settings": {
+            key: getattr(settings, key) for key in (
+                "MAX_BATCH_SIZE", "MAX_BATCH_WAIT_MS", "INFERENCE_EXECUTOR", "INFERENCE_THREAD_WORKERS",
+                "MAX_BATCH_TOKENS", "ONNX_INTRA_OP_THREADS", "L1_CACHE_ENABLED",
+            )
+        },
+    }
+
+
+async def main_async(args) -> int:
+    results: Dict[str, dict] = {}
+    skipped = []
+    for version in list(args.versions):
+        try:
+            served, _ = acquire_backend(version)
+            release_backend(served)
+            if served != version:
+                raise RuntimeError(f"fell back to {served}")
+        except Exception as e:
+            print(f"Skipping {version}: cannot load locally ({e})")
+            args.versions.remove(version)
+            skipped.append(version)
+    if not args.versions:
+        print("No model versions could be loaded; run scripts/create_dummy_model.py first")
+        return 2
+
+    for scenario in build_scenarios(args):
+        result = await run_scenario(scenario, args)
+        if result is None:
+            continue
+        results[scenario.name] = result
+        print(f"{scenario.name:<72} p50 {result['p50_ms']:8.2f}ms  p95 {result['p95_ms']:8.2f}ms  "
+              f"p99 {result['p99_ms']:8.2f}ms  {result['throughput_texts_per_s']:9.0f} texts/s")
+
+    report = {"meta": {**metadata(), "skipped_versions": skipped}, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {len(results)} scenarios to {args.output}")
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Updated baseline {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} scenario(s) regressed by more than {args.threshold:.0%}")
+            return 1
+        print(f"\nNo regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def _floats(value: str) -> List[float]:
+    return [float(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process inference benchmarks")
+    parser.add_argument("--versions", type=lambda v: v.split(","), default=["tiny", "v1-dummy"])
+    parser.add_argument("--batch-sizes", type=_ints, default=[1, 8, 32], help="Texts per request")
+    parser.add_argument("--text-words", type=_ints, default=[8, 32, 128], help="Words per text")
+    parser.add_argument("--concurrency", type=_ints, default=[1, 4, 16], help="Concurrent callers (engine)")
+    parser.add_argument("--hit-ratios", type=_floats, default=[0.0, 0.5, 0.9], help="Cache-hit ratios")
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per scenario")
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0, help="Simulated Redis round trip")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true", help="Write results as the new baseline")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Response encoding benchmark for /api/v1/predict, without a model or HTTP.
+
+Compares the previous path (validate PredictionResponse, then stdlib JSON)
+with the fast path (model_construct, then orjson or msgpack), with and
+without echoing input texts. Reports bytes per response and encode time.
+
+Usage (from the project root):
+    python benchmarks/serialization_benchmark.py
+    python benchmarks/serialization_benchmark.py --batch-sizes 1,32,512 --text-words 24 --output serialization.json
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from app.schemas import PredictionResponse
+from app.services.serialization import JSON, MSGPACK, encode_prediction
+
+WORDS = (
+    "great terrible love hate product service quality price delivery support "
+    "fast slow broken perfect awful recommend never again amazing disappointing "
+    "the a and but very really not quite just it this was is would could"
+).split()
+
+
+def make_results(batch_size: int, text_words: int, echo_text: bool, rng: random.Random) -> List[dict]:
+    """Result items shaped like InferenceEngine output"""
+    results = []
+    for _ in range(batch_size):
+        label = rng.randint(0, 1)
+        result = {
+            "text": " ".join(rng.choices(WORDS, k=text_words)),
+            "label": label,
+            "confidence": rng.random(),
+            "class": "positive" if label else "negative",
+            "raw_label": "POSITIVE" if label else "NEGATIVE",
+            "cached": rng.random() < 0.5,
+        }
+        if not echo_text:
+            del result["text"]
+        results.append(result)
+    return results
+
+
+def fields(results: List[dict]) -> dict:
+    return dict(request_id="bench", model_version="v1", results=results, latency_ms=12.5, cached=False, partial=False)
+
+
+def validated_json(results: List[dict]) -> bytes:
+    # Previous path: response_model validation of every item, then stdlib JSON
+    response = PredictionResponse(**fields(results))
+    return json.dumps(response.model_dump(), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def fast_json(results: List[dict]) -> bytes:
+    return encode_prediction(PredictionResponse.model_construct(**fields(results)), JSON)
+
+
+def fast_msgpack(results: List[dict]) -> bytes:
+    return encode_prediction(PredictionResponse.model_construct(**fields(results)), MSGPACK)
+
+
+ENCODERS = {
+    "validated+json": validated_json,
+    "orjson": fast_json,
+    "msgpack": fast_msgpack,
+}
+
+
+def measure(encode: Callable[[List[dict]], bytes], results: List[dict], repeat: int) -> dict:
+    timings = []
+    size = 0
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        size = len(encode(results))
+        timings.append(time.perf_counter() - start_time)
+    return {
+        "bytes": size,
+        "encode_us_p50": round(statistics.median(timings) * 1e6, 2),
+        "encode_us_min": round(min(timings) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prediction response encoding benchmark")
+    parser.add_argument("--batch-sizes", default="1,32,512")
+    parser.add_argument("--text-words", type=int, default=24, help="Words per echoed text")
+    parser.add_argument("--repeat", type=int, default=0, help="Encodes per case (default: scaled to batch size)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+    print(f"{'case':<40} {'bytes':>10} {'bytes/item':>11} {'p50 us':>10} {'vs validated':>13}")
+    for batch_size in [int(v) for v in args.batch_sizes.split(",")]:
+        repeat = args.repeat or max(20, 20000 // batch_size)
+        for echo_text in (True, False):
+            results = make_results(batch_size, args.text_words, echo_text, rng)
+            reference = None
+            for name, encode in ENCODERS.items():
+                row = {"encoder": name, "batch_size": batch_size, "echo_text": echo_text,
+                       **measure(encode, results, repeat)}
+                reference = reference or row
+                speedup = reference["encode_us_p50"] / max(row["encode_us_p50"], 1e-9)
+                rows.append(row)
+                case = f"{name}/batch={batch_size}/echo_text={str(echo_text).lower()}"
+                print(f"{case:<40} {row['bytes']:>10} {row['bytes'] / batch_size:>11.1f} "
+                      f"{row['encode_us_p50']:>10.1f} {speedup:>12.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print(f"\nSaved {len(rows)} cases to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator for /api/v1/predict.
+
+Unlike the locust file, requests are sent on an arrival schedule that does
+not wait for earlier responses: Poisson arrivals at a target rate, or
+bursty arrivals that alternate between a high and a low rate. Batch size,
+text length, model version and cache-hit ratio are drawn from configurable
+distributions.
+
+Latency is recorded in an HDR-style log-linear histogram twice: from the
+moment a request was actually sent, and from the moment it was scheduled to
+be sent. The second is corrected for coordinated omission: if the server
+(or this client) falls behind, the delay counts against latency instead of
+silently lowering the offered load.
+
+Requires httpx (pip install httpx).
+
+Usage:
+    python load_tests/open_loop.py --rps 200 --duration 60
+    python load_tests/open_loop.py --arrivals bursty --rps 100 --burst-factor 5 \\
+        --batch-sizes 1:0.7,8:0.2,32:0.1 --text-words 8:0.5,64:0.4,400:0.1 \\
+        --models v1:0.8,v2:0.2 --hit-ratio 0.3 --output results.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import httpx
+
+WORDS = (
+    "great terrible love hate product service quality price delivery support "
+    "fast slow broken perfect awful recommend never again amazing disappointing "
+    "the a and but very really not quite just it this was is would could"
+).split()
+
+PERCENTILES = [50, 75, 90, 95, 99, 99.9, 99.99]
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram in the spirit of HdrHistogram: values are bucketed by
+    power of two, each split into sub_buckets linear steps, so every recorded
+    value keeps roughly 1 / sub_buckets relative precision from 1us to hours.
+    """
+
+    def __init__(self, sub_buckets: int = 128):
+        self.sub_buckets = sub_buckets
+        self.counts: Dict[int, int] = Counter()
+        self.total = 0
+        self.max_us = 0
+
+    def _index(self, us: int) -> int:
+        if us < self.sub_buckets:
+            return us
+        exponent = us.bit_length() - self.sub_buckets.bit_length()
+        return (exponent + 1) * self.sub_buckets + (us >> exponent) - self.sub_buckets
+
+    def _value(self, index: int) -> int:
+        """Upper bound of a bucket, in microseconds"""
+        if index < self.sub_buckets:
+            return index
+        exponent = index // self.sub_buckets - 1
+        return ((index % self.sub_buckets + self.sub_buckets + 1) << exponent) - 1
+
+    def record(self, seconds: float):
+        us = max(0, int(seconds * 1_000_000))
+        self.counts[self._index(us)] += 1
+        self.total += 1
+        self.max_us = max(self.max_us, us)
+
+    def percentile(self, p: float) -> float:
+        """Value at percentile p, in milliseconds"""
+        if not self.total:
+            return 0.0
+        target = max(1, math.ceil(self.total * p / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max_us) / 1000
+        return self.max_us / 1000
+
+    def summary(self) -> Dict[str, float]:
+        result = {f"p{p:g}": round(self.percentile(p), 3) for p in PERCENTILES}
+        result["max"] = round(self.max_us / 1000, 3)
+        result["count"] = self.total
+        return result
+
+
+def parse_distribution(spec: str, cast=float) -> Tuple[list, List[float]]:
+    """'value:weight,value:weight' -> (values, weights)"""
+    values, weights = [], []
+    for part in spec.split(","):
+        value, _, weight = part.partition(":")
+        values.append(cast(value))
+        weights.append(float(weight or 1))
+    return values, weights
+
+
+class Workload:
+    def __init__(self, args, rng: random.Random):
+        self.rng = rng
+        self.batch_sizes = parse_distribution(args.batch_sizes, int)
+        self.text_words = parse_distribution(args.text_words, int)
+        self.models = parse_distribution(args.models, str)
+        self.hit_ratio = args.hit_ratio
+        self._unique = itertools.count()
+        # Texts that repeat across requests and so should be served from cache
+        self.hot = [self._text(self._draw(self.text_words)) for _ in range(args.hot_texts)]
+
+    def _draw(self, distribution):
+        values, weights = distribution
+        return self.rng.choices(values, weights)[0]
+
+    def _text(self, words: int) -> str:
+        body = " ".join(self.rng.choices(WORDS, k=max(1, words - 1)))
+        return f"{body} {next(self._unique)}"
+
+    def request(self, request_id: str) -> dict:
+        texts = [
+            self.rng.choice(self.hot) if self.rng.random() < self.hit_ratio else self._text(self._draw(self.text_words))
+            for _ in range(self._draw(self.batch_sizes))
+        ]
+        return {"id": request_id, "texts": texts, "model_version": self._draw(self.models)}
+
+
+def arrival_times(args, rng: random.Random):
+    """Yield scheduled send offsets (seconds from start) for the whole run"""
+    t = 0.0
+    burst_end = 0.0
+    in_burst = False
+    while t < args.duration:
+        if args.arrivals == "constant":
+            rate = args.rps
+        elif args.arrivals == "bursty":
+            # Alternate exponential on/off periods: bursts run at burst_factor x rps,
+            # quiet periods at rps / 2, sized so the long-run mean is still rps
+            if t >= burst_end:
+                in_burst = not in_burst
+                period = args.burst_seconds if in_burst else args.burst_seconds * 2 * (args.burst_factor - 1)
+                burst_end = t + rng.expovariate(1 / max(period, 1e-3))
+            rate = args.rps * args.burst_factor if in_burst else args.rps / 2
+        else:
+            rate = args.rps
+        yield t
+        t += 1 / rate if args.arrivals == "constant" else rng.expovariate(rate)
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    workload = Workload(args, rng)
+    service = LatencyHistogram()
+    corrected = LatencyHistogram()
+    statuses: Counter = Counter()
+    lag = LatencyHistogram()
+    inflight = asyncio.Semaphore(args.max_inflight)
+    tasks = []
+
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(base_url=args.host, timeout=args.timeout, limits=limits,
+                                 headers={"X-Token": args.token}) as client:
+
+        async def fire(scheduled: float, payload: dict):
+            async with inflight:
+                sent = time.perf_counter()
+                lag.record(sent - scheduled)
+                try:
+                    response = await client.post("/api/v1/predict", json=payload)
+                    statuses[response.status_code] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                done = time.perf_counter()
+            service.record(done - sent)
+            corrected.record(done - scheduled)
+
+        start = time.perf_counter()
+        for n, offset in enumerate(arrival_times(args, rng)):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            # Never wait for responses here: that would make the load closed-loop
+            tasks.append(asyncio.create_task(fire(scheduled, workload.request(f"load-{n}"))))
+        sending_done = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    sent = len(tasks)
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "requests": sent,
+        "offered_rps": round(sent / max(sending_done - start, 1e-9), 2),
+        "achieved_rps": round(sent / elapsed, 2),
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "latency_ms": service.summary(),
+        "latency_corrected_ms": corrected.summary(),
+        "send_lag_ms": lag.summary(),
+    }
+
+
+def print_report(report: dict):
+    print(f"\nRequests: {report['requests']}  offered {report['offered_rps']} rps  "
+          f"achieved {report['achieved_rps']} rps")
+    print("Statuses: " + ", ".join(f"{k}={v}" for k, v in report["statuses"].items()))
+    print(f"\n{'percentile':>12} {'service ms':>12} {'corrected ms':>14}")
+    for key in [f"p{p:g}" for p in PERCENTILES] + ["max"]:
+        print(f"{key:>12} {report['latency_ms'][key]:>12.2f} {report['latency_corrected_ms'][key]:>14.2f}")
+    print(f"\nClient send lag p99: {report['send_lag_ms']['p99']:.2f} ms "
+          "(large values mean this generator could not keep up)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load generator with coordinated-omission correction")
+    parser.add_argument("--host", default="http://localhost:8000")
+    parser.add_argument("--token", default="secret-token")
+    parser.add_argument("--rps", type=float, default=50.0, help="Target mean arrival rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals")
+    parser.add_argument("--arrivals", choices=["poisson", "bursty", "constant"], default="poisson")
+    parser.add_argument("--burst-factor", type=float, default=4.0, help="Bursty: peak rate relative to --rps")
+    parser.add_argument("--burst-seconds", type=float, default=2.0, help="Bursty: mean burst length")
+    parser.add_argument("--batch-sizes", default="1:0.7,4:0.2,16:0.1", help="texts per request as value:weight")
+    parser.add_argument("--text-words", default="8:0.5,32:0.3,128:0.15,400:0.05", help="words per text as value:weight")
+    parser.add_argument("--models", default="v1:1", help="model versions as version:weight")
+    parser.add_argument("--hit-ratio", type=float, default=0.0, help="Fraction of texts drawn from a hot set")
+    parser.add_argument("--hot-texts", type=int, default=200, help="Size of the hot text set")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="Client-side concurrency cap")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the report as JSON")
+    args = parser.parse_args()
+    if args.arrivals == "bursty" and args.burst_factor <= 1:
+        parser.error("--burst-factor must be greater than 1")
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,13 @@ sys.path.insert(0, script_dir)
 if __name__ == "__main__":
     try:
         import uvicorn
+        from app.core.config import settings
+        
+        if settings.SERVER_WORKERS > 1:
+            # Load models once and fork workers that share them
+            from app.prefork import serve
+            serve(host="127.0.0.1", port=8001, workers=settings.SERVER_WORKERS)
+            sys.exit(0)
         
         # Run the application
         uvicorn.run(
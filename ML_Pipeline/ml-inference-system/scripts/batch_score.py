@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Offline bulk scoring for large JSONL/CSV datasets.
+
+Loads models in worker processes through the same registry, backends and
+postprocessing as the API, so no HTTP or per-request JSON is involved.
+Input is read incrementally (JSONL through mmap), sharded across a process
+pool, and results are written in input order as JSONL. Progress is
+checkpointed after every shard so an interrupted run can be resumed.
+
+Usage (from the project root):
+    python scripts/batch_score.py data.jsonl scores.jsonl --model-version tiny
+    python scripts/batch_score.py data.csv scores.jsonl --text-field review --resume
+"""
+import argparse
+import csv
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Set per worker process by _init_worker
+_backend = None
+_build_result = None
+
+
+def _init_worker(model_version: str, threads_per_worker: int):
+    """Load the model once per worker process"""
+    global _backend, _build_result
+    # Several workers share the cores; keep each session from spawning one thread per core
+    os.environ.setdefault("ONNX_INTRA_OP_THREADS", str(threads_per_worker))
+    os.environ.setdefault("ONNX_INTER_OP_THREADS", "1")
+    sys.path.insert(0, PROJECT_ROOT)
+
+    from app.services.model_registry import model_registry
+    from app.services.backends import create_backend
+    from app.services.inference_engine import build_result
+
+    model_version = model_registry.resolve(model_version)
+    spec = model_registry.get(model_version)
+    _backend = create_backend(model_version, spec, model_registry.backend_for(model_version))
+    _build_result = build_result
+
+
+def parse_row(row, text_field: str, id_field: Optional[str]) -> Tuple[Optional[str], Optional[str], object]:
+    """Return (text, error, row_id) for one raw JSONL line or CSV dict"""
+    try:
+        if isinstance(row, bytes):
+            row = json.loads(row)
+        row_id = row.get(id_field) if id_field and isinstance(row, dict) else None
+        text = row.get(text_field) if isinstance(row, dict) else row
+        if not isinstance(text, str):
+            return None, f"missing text field {text_field!r}", row_id
+        return text, None, row_id
+    except ValueError as e:
+        return None, f"invalid input row: {e}", None
+
+
+def score_shard(start: int, rows: list, text_field: str, id_field: Optional[str]) -> bytes:
+    """Score one shard in a worker; returns its JSONL output"""
+    parsed = [parse_row(row, text_field, id_field) for row in rows]
+    texts = [text for text, _, _ in parsed if text is not None]
+    predictions = iter(_backend.predict_batch(texts) if texts else [])
+
+    lines = []
+    for offset, (text, error, row_id) in enumerate(parsed):
+        item = {"index": start + offset}
+        if row_id is not None:
+            item["id"] = row_id
+        if error is not None:
+            item["error"] = error
+        else:
+            item.update(_build_result(text, next(predictions)))
+        lines.append(json.dumps(item, ensure_ascii=False))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def read_jsonl(path: str, offset: int) -> Iterator[Tuple[list, int]]:
+    """Yield (line, end_offset) pairs from a memory-mapped JSONL file"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.seek(offset)
+            while True:
+                line = mm.readline()
+                if not line:
+                    break
+                if line.strip():
+                    yield line, mm.tell()
+
+
+def read_csv(path: str, skip_rows: int) -> Iterator[Tuple[dict, int]]:
+    """Yield (row, rows_read) pairs; CSV fields may contain newlines so rows are counted, not offsets"""
+    with open(path, newline="", encoding="utf-8") as f:
+        for n, row in enumerate(csv.DictReader(f), start=1):
+            if n > skip_rows:
+                yield row, n
+
+
+def iter_shards(rows: Iterator[Tuple[object, int]], shard_size: int) -> Iterator[Tuple[list, int]]:
+    """Group rows into shards; each carries the input position after its last row"""
+    shard, position = [], None
+    for row, position in rows:
+        shard.append(row)
+        if len(shard) >= shard_size:
+            yield shard, position
+            shard = []
+    if shard:
+        yield shard, position
+
+
+def load_checkpoint(path: str, args) -> dict:
+    if not os.path.exists(path):
+        return {"rows_done": 0, "input_position": 0, "output_bytes": 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("input") != os.path.abspath(args.input) or checkpoint.get("model_version") != args.model_version:
+        raise SystemExit(f"Checkpoint {path} belongs to a different input or model version")
+    return checkpoint
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def run(args):
+    input_format = args.format
+    if input_format == "auto":
+        input_format = "csv" if args.input.lower().endswith(".csv") else "jsonl"
+    checkpoint_path = args.checkpoint or args.output + ".ckpt"
+
+    checkpoint = {"rows_done": 0, "input_position": 0, "output_bytes": 0}
+    if args.resume:
+        checkpoint = load_checkpoint(checkpoint_path, args)
+    checkpoint.update(input=os.path.abspath(args.input), model_version=args.model_version)
+
+    if input_format == "csv":
+        rows = read_csv(args.input, checkpoint["input_position"])
+    else:
+        rows = read_jsonl(args.input, checkpoint["input_position"])
+
+    workers = args.workers or os.cpu_count() or 1
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    rows_done = checkpoint["rows_done"]
+    if rows_done:
+        print(f"Resuming after {rows_done} rows")
+
+    # Open without truncating, then drop anything written after the last checkpoint
+    mode = "r+b" if args.resume and os.path.exists(args.output) else "wb"
+    with open(args.output, mode) as out, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(args.model_version, threads_per_worker)
+    ) as pool:
+        out.truncate(checkpoint["output_bytes"])
+        out.seek(checkpoint["output_bytes"])
+
+        start_time = time.time()
+        scored = 0
+        last_report = start_time
+        # Bounded window of in-flight shards, written back in submission order
+        window: List[Tuple[object, int, int]] = []
+        shards = iter_shards(rows, args.shard_size)
+        next_index = rows_done
+
+        def submit_next() -> bool:
+            nonlocal next_index
+            try:
+                shard, position = next(shards)
+            except StopIteration:
+                return False
+            future = pool.submit(score_shard, next_index, shard, args.text_field, args.id_field)
+            window.append((future, position, len(shard)))
+            next_index += len(shard)
+            return True
+
+        while len(window) < workers * 2 and submit_next():
+            pass
+
+        while window:
+            future, position, count = window.pop(0)
+            out.write(future.result())
+            out.flush()
+            rows_done += count
+            scored += count
+            checkpoint.update(rows_done=rows_done, input_position=position, output_bytes=out.tell())
+            save_checkpoint(checkpoint_path, checkpoint)
+            submit_next()
+
+            now = time.time()
+            if now - last_report >= args.report_every:
+                print(f"  {rows_done} rows, {scored / (now - start_time):.1f} rows/sec")
+                last_report = now
+
+    elapsed = time.time() - start_time
+    rate = scored / elapsed if elapsed > 0 else 0.0
+    print(f"Scored {scored} rows in {elapsed:.2f}s ({rate:.1f} rows/sec) with {workers} workers -> {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a JSONL/CSV dataset offline with a registry model")
+    parser.add_argument("input", help="Input .jsonl (strings or objects) or .csv file")
+    parser.add_argument("output", help="Output .jsonl file, one result per input row")
+    parser.add_argument("--model-version", default="v1", help="Registry version to score with")
+    parser.add_argument("--format", choices=["auto", "jsonl", "csv"], default="auto")
+    parser.add_argument("--text-field", default="text", help="Field holding the text")
+    parser.add_argument("--id-field", default=None, help="Field copied to the output as \"id\"")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: all cores)")
+    parser.add_argument("--shard-size", type=int, default=1024, help="Rows per worker task")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: OUTPUT.ckpt)")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint")
+    parser.add_argument("--report-every", type=float, default=5.0, help="Seconds between progress lines")
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 import os
+import json
 import numpy as np
 import pickle
 from sklearn.linear_model import LogisticRegression
@@ -8,10 +9,17 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from skl2onnx import convert_sklearn
 from skl2onnx.common.data_types import StringTensorType
 import onnxmltools
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+from tokenizers import Tokenizer, models as tok_models, normalizers, pre_tokenizers
+from transformers import PreTrainedTokenizerFast
 
 # Create directories
-os.makedirs("models/sentiment_v1", exist_ok=True)
-os.makedirs("models/sentiment_v2", exist_ok=True)
+# Served as their own registry versions (v1-dummy, v2-dummy); models/sentiment_v{1,2}
+# hold the transformer exports from scripts/download_pretrained_models.py
+os.makedirs("models/dummy_v1", exist_ok=True)
+os.makedirs("models/dummy_v2", exist_ok=True)
+os.makedirs("models/sentiment_tiny", exist_ok=True)
 
 # Fake data
 corpus = [
@@ -34,11 +42,18 @@ pipeline_v1.fit(corpus, labels)
 
 # Convert to ONNX
 initial_type = [('input', StringTensorType([None, 1]))]
-onnx_model_v1 = convert_sklearn(pipeline_v1, initial_types=initial_type, target_opset=12)
+# "C" locale so the StringNormalizer works on images without en_US locales;
+# plain probability tensors instead of ZipMap dicts
+convert_options = {
+    TfidfVectorizer: {"locale": "C"},
+    LogisticRegression: {"zipmap": False},
+    RandomForestClassifier: {"zipmap": False},
+}
+onnx_model_v1 = convert_sklearn(pipeline_v1, initial_types=initial_type, target_opset=12, options=convert_options)
 
-with open("models/sentiment_v1/model.onnx", "wb") as f:
+with open("models/dummy_v1/model.onnx", "wb") as f:
     f.write(onnx_model_v1.SerializeToString())
-print("Saved models/sentiment_v1/model.onnx")
+print("Saved models/dummy_v1/model.onnx")
 
 # --- Model V2: Random Forest ---
 print("Training Model V2 (Random Forest)...")
@@ -49,10 +64,81 @@ pipeline_v2 = Pipeline([
 pipeline_v2.fit(corpus, labels)
 
 # Convert to ONNX
-onnx_model_v2 = convert_sklearn(pipeline_v2, initial_types=initial_type, target_opset=12)
+onnx_model_v2 = convert_sklearn(pipeline_v2, initial_types=initial_type, target_opset=12, options=convert_options)
 
-with open("models/sentiment_v2/model.onnx", "wb") as f:
+with open("models/dummy_v2/model.onnx", "wb") as f:
     f.write(onnx_model_v2.SerializeToString())
-print("Saved models/sentiment_v2/model.onnx")
+print("Saved models/dummy_v2/model.onnx")
+
+# --- Model Tiny: tokenized embedding-bag classifier ---
+# Same input/output contract as a transformer export (input_ids, attention_mask -> logits)
+# so the tokenized ONNX path can be exercised offline.
+print("Building Model Tiny (token embedding classifier)...")
+positive_words = ["love", "great", "highly", "recommended", "good", "amazing", "excellent"]
+negative_words = ["terrible", "worst", "not", "bad", "awful", "hate", "poor"]
+words = sorted({w.lower() for text in corpus for w in text.split()} | set(positive_words) | set(negative_words))
+vocab = {"[PAD]": 0, "[UNK]": 1}
+for w in words:
+    vocab[w] = len(vocab)
+
+rng = np.random.default_rng(0)
+hidden = 16
+embeddings = rng.normal(0, 0.1, size=(len(vocab), hidden)).astype(np.float32)
+for w in positive_words:
+    embeddings[vocab[w], 0] = 1.0
+for w in negative_words:
+    embeddings[vocab[w], 0] = -1.0
+classifier = rng.normal(0, 0.1, size=(hidden, 2)).astype(np.float32)
+classifier[0] = [-4.0, 4.0]
+bias = np.zeros(2, dtype=np.float32)
+
+nodes = [
+    helper.make_node("Gather", ["embeddings", "input_ids"], ["token_vectors"]),
+    helper.make_node("Cast", ["attention_mask"], ["mask_float"], to=TensorProto.FLOAT),
+    helper.make_node("Unsqueeze", ["mask_float", "axis_2"], ["mask_3d"]),
+    helper.make_node("Mul", ["token_vectors", "mask_3d"], ["masked_vectors"]),
+    helper.make_node("ReduceSum", ["masked_vectors", "axis_1"], ["summed"], keepdims=0),
+    helper.make_node("ReduceSum", ["mask_float", "axis_1"], ["token_count"], keepdims=1),
+    helper.make_node("Max", ["token_count", "one"], ["safe_count"]),
+    helper.make_node("Div", ["summed", "safe_count"], ["pooled"]),
+    helper.make_node("MatMul", ["pooled", "classifier"], ["projected"]),
+    helper.make_node("Add", ["projected", "bias"], ["logits"]),
+]
+graph = helper.make_graph(
+    nodes,
+    "sentiment_tiny",
+    inputs=[
+        helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "sequence"]),
+        helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "sequence"]),
+    ],
+    outputs=[helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 2])],
+    initializer=[
+        numpy_helper.from_array(embeddings, "embeddings"),
+        numpy_helper.from_array(classifier, "classifier"),
+        numpy_helper.from_array(bias, "bias"),
+        numpy_helper.from_array(np.array([1], dtype=np.int64), "axis_1"),
+        numpy_helper.from_array(np.array([2], dtype=np.int64), "axis_2"),
+        numpy_helper.from_array(np.array([1.0], dtype=np.float32), "one"),
+    ],
+)
+onnx_model_tiny = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+onnx_model_tiny.ir_version = 8
+onnx.checker.check_model(onnx_model_tiny)
+onnx.save(onnx_model_tiny, "models/sentiment_tiny/model.onnx")
+
+tokenizer = Tokenizer(tok_models.WordLevel(vocab, unk_token="[UNK]"))
+tokenizer.normalizer = normalizers.Sequence([normalizers.NFKC(), normalizers.Lowercase()])
+tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+PreTrainedTokenizerFast(
+    tokenizer_object=tokenizer,
+    pad_token="[PAD]",
+    unk_token="[UNK]",
+    model_max_length=128,
+    model_input_names=["input_ids", "attention_mask"],
+).save_pretrained("models/sentiment_tiny")
+
+with open("models/sentiment_tiny/config.json", "w") as f:
+    json.dump({"id2label": {"0": "NEGATIVE", "1": "POSITIVE"}, "label2id": {"NEGATIVE": 0, "POSITIVE": 1}}, f, indent=2)
+print("Saved models/sentiment_tiny/model.onnx")
 
 print("Dummy models generated successfully.")
@@ -1,5 +1,6 @@
 from optimum.onnxruntime import ORTModelForSequenceClassification
 from transformers import AutoTokenizer
+import json
 import os
 
 def export_model(model_id, output_path):
@@ -9,6 +10,9 @@ def export_model(model_id, output_path):
     
     model.save_pretrained(output_path)
     tokenizer.save_pretrained(output_path)
+    # Lets the server check the artifact matches the registry's model_id
+    with open(os.path.join(output_path, "export.json"), "w") as f:
+        json.dump({"model_id": model_id}, f, indent=2)
     print(f"Model saved to {output_path}")
 
 if __name__ == "__main__":